@@ -0,0 +1,30 @@
+"""add asic miner identity
+
+Create Date: 2026-10-18 07:02:11.418204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "4eadb0156c5a"
+down_revision: Union[str, None] = "dde465bb185a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("asics", sa.Column("miner_class", sa.String(length=80), nullable=True))
+    op.add_column("asics", sa.Column("miner_model", sa.String(length=40), nullable=True))
+    op.add_column(
+        "asics", sa.Column("miner_firmware", sa.String(length=80), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("asics", "miner_firmware")
+    op.drop_column("asics", "miner_model")
+    op.drop_column("asics", "miner_class")
@@ -0,0 +1,39 @@
+"""add profile sample cadence
+
+Create Date: 2026-10-18 09:12:37.520114
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "7c1f3b9e2a64"
+down_revision: Union[str, None] = "4eadb0156c5a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "asic_profiles",
+        sa.Column("sample_secs_transitioning", sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        "asic_profiles", sa.Column("sample_secs_hashing", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "asic_profiles", sa.Column("sample_secs_paused", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "asic_profiles", sa.Column("sample_secs_offline", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("asic_profiles", "sample_secs_offline")
+    op.drop_column("asic_profiles", "sample_secs_paused")
+    op.drop_column("asic_profiles", "sample_secs_hashing")
+    op.drop_column("asic_profiles", "sample_secs_transitioning")
@@ -0,0 +1,124 @@
+"""partition performance_samples by month
+
+Create Date: 2026-10-18 14:05:42.517390
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "a4d7e2c95b31"
+down_revision: Union[str, None] = "f81b6d3e9c20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions are created this far ahead here; after that, by PartitionService
+MONTHS_AHEAD = 3
+
+INDEXES = """
+    CREATE INDEX ix_performance_samples_asic_id
+        ON performance_samples (asic_id);
+    CREATE INDEX ix_performance_samples_timestamp
+        ON performance_samples ("timestamp");
+    CREATE INDEX ix_performance_samples_hashing_interval_id
+        ON performance_samples (hashing_interval_id);
+    CREATE INDEX ix_performance_samples_asic_id_timestamp
+        ON performance_samples (asic_id, "timestamp" DESC);
+"""
+
+FOREIGN_KEYS = """
+    ALTER TABLE performance_samples
+        ADD CONSTRAINT performance_samples_asic_id_fkey
+        FOREIGN KEY (asic_id) REFERENCES asics (id);
+    ALTER TABLE performance_samples
+        ADD CONSTRAINT fk_performance_samples_hashing_intervals
+        FOREIGN KEY (hashing_interval_id) REFERENCES hashing_intervals (id);
+"""
+
+
+def upgrade() -> None:
+    # Move the existing table out of the way (its pkey index name included)
+    op.execute(
+        """
+        ALTER TABLE performance_samples RENAME TO performance_samples_old;
+        ALTER TABLE performance_samples_old
+            RENAME CONSTRAINT performance_samples_pkey TO performance_samples_old_pkey;
+        """
+    )
+
+    # Same columns, and the same id sequence. The partition key has to be part
+    # of the primary key; ids still come from the sequence, so stay unique.
+    op.execute(
+        """
+        CREATE TABLE performance_samples (
+            LIKE performance_samples_old INCLUDING DEFAULTS
+        ) PARTITION BY RANGE ("timestamp");
+        ALTER TABLE performance_samples
+            ADD CONSTRAINT performance_samples_pkey PRIMARY KEY (id, "timestamp");
+        """
+    )
+    op.execute(FOREIGN_KEYS)
+
+    # A partition for every month there are samples for, and a few ahead
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month date;
+            last_month date := date_trunc('month', now())
+                + interval '{MONTHS_AHEAD} months';
+        BEGIN
+            SELECT date_trunc('month', coalesce(min("timestamp"), now()))
+                INTO month FROM performance_samples_old;
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF performance_samples
+                        FOR VALUES FROM (%L) TO (%L)',
+                    'performance_samples_' || to_char(month, '"y"YYYY"m"MM'),
+                    month,
+                    month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$;
+        """
+    )
+
+    op.execute("INSERT INTO performance_samples SELECT * FROM performance_samples_old")
+
+    # Indexes on the parent are created on every partition, present and future
+    op.execute(
+        """
+        ALTER SEQUENCE performance_samples_id_seq OWNED BY performance_samples.id;
+        DROP TABLE performance_samples_old;
+        """
+    )
+    op.execute(INDEXES)
+    op.execute("ANALYZE performance_samples")
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE performance_samples RENAME TO performance_samples_old;
+        ALTER TABLE performance_samples_old
+            RENAME CONSTRAINT performance_samples_pkey TO performance_samples_old_pkey;
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE performance_samples (
+            LIKE performance_samples_old INCLUDING DEFAULTS
+        );
+        INSERT INTO performance_samples SELECT * FROM performance_samples_old;
+        ALTER TABLE performance_samples
+            ADD CONSTRAINT performance_samples_pkey PRIMARY KEY (id);
+        ALTER SEQUENCE performance_samples_id_seq OWNED BY performance_samples.id;
+        """
+    )
+    op.execute(FOREIGN_KEYS)
+
+    # Dropping the parent drops every partition with it
+    op.execute("DROP TABLE performance_samples_old")
+    op.execute(INDEXES)
@@ -0,0 +1,43 @@
+"""add asic rollups
+
+Create Date: 2026-10-18 14:48:10.362954
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "b6e3f0a1d84c"
+down_revision: Union[str, None] = "a4d7e2c95b31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in from the existing samples by scripts/backfill_rollups.py
+    op.create_table(
+        "asic_rollups",
+        sa.Column("asic_id", sa.Integer(), nullable=False),
+        sa.Column("period", sa.String(length=10), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("samples", sa.Integer(), nullable=False),
+        sa.Column("sampled_secs", sa.Integer(), nullable=False),
+        sa.Column("hashing_secs", sa.Integer(), nullable=False),
+        sa.Column("paused_secs", sa.Integer(), nullable=False),
+        sa.Column("offline_secs", sa.Integer(), nullable=False),
+        sa.Column("energy_wh", sa.Numeric(scale=3, precision=14), nullable=False),
+        sa.Column("cost", sa.Numeric(scale=6, precision=14), nullable=False),
+        sa.Column("hash_rate_secs", sa.BigInteger(), nullable=False),
+        sa.Column("hash_rate_max", sa.Integer(), nullable=False),
+        sa.Column("temp_secs", sa.BigInteger(), nullable=False),
+        sa.Column("env_temp_secs", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["asic_id"], ["asics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("asic_id", "period", "period_start"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("asic_rollups")
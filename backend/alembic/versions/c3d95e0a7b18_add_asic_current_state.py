@@ -0,0 +1,65 @@
+"""add asic current state
+
+Create Date: 2026-10-18 10:41:06.293358
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "c3d95e0a7b18"
+down_revision: Union[str, None] = "7c1f3b9e2a64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "asic_current_state",
+        sa.Column("asic_id", sa.Integer(), nullable=False),
+        sa.Column("sampled_at", sa.DateTime(), nullable=False),
+        sa.Column("hash_rate", sa.Integer(), nullable=False),
+        sa.Column("power", sa.Integer(), nullable=False),
+        sa.Column("power_limit", sa.Integer(), nullable=False),
+        sa.Column("power_per_th", sa.Integer(), nullable=False),
+        sa.Column("temp", sa.Integer(), nullable=False),
+        sa.Column("env_temp", sa.Integer(), nullable=False),
+        sa.Column("price_per_kwh", sa.Numeric(scale=3, precision=6), nullable=True),
+        sa.Column("hashing_interval_id", sa.Integer(), nullable=True),
+        sa.Column("interval_started_at", sa.DateTime(), nullable=True),
+        sa.Column("interval_until", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["asic_id"], ["asics.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["hashing_interval_id"], ["hashing_intervals.id"], ondelete="SET NULL"
+        ),
+        sa.PrimaryKeyConstraint("asic_id"),
+    )
+
+    # Start from each asic's latest sample; interval_until is filled in by the
+    # next sampling cycle
+    op.execute(
+        """
+        INSERT INTO asic_current_state (
+            asic_id, sampled_at, hash_rate, power, power_limit, power_per_th,
+            temp, env_temp, price_per_kwh, hashing_interval_id, interval_started_at
+        )
+        SELECT DISTINCT ON (s.asic_id)
+            s.asic_id, s.timestamp, s.hash_rate, s.power, s.power_limit,
+            s.power_per_th, s.temp, s.env_temp, s.price_per_kwh,
+            s.hashing_interval_id,
+            (
+                SELECT max(p.timestamp) FROM performance_samples p
+                WHERE p.asic_id = s.asic_id
+                AND p.hashing_interval_id != s.hashing_interval_id
+            )
+        FROM performance_samples s
+        ORDER BY s.asic_id, s.timestamp DESC
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("asic_current_state")
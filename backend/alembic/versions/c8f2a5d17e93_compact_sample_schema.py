@@ -0,0 +1,134 @@
+"""compact sample schema
+
+Create Date: 2026-10-18 15:31:27.840116
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "c8f2a5d17e93"
+down_revision: Union[str, None] = "b6e3f0a1d84c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SMALL_COLUMNS = [
+    "interval_secs",
+    "hash_rate",
+    "power",
+    "power_limit",
+    "power_per_th",
+    "temp",
+    "env_temp",
+]
+
+SMALLINT_MIN = -32768
+SMALLINT_MAX = 32767
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tariffs",
+        sa.Column("id", sa.SmallInteger(), nullable=False),
+        sa.Column("price_micro_per_kwh", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("price_micro_per_kwh"),
+    )
+    op.execute(
+        """
+        INSERT INTO tariffs (price_micro_per_kwh)
+        SELECT DISTINCT round(price_per_kwh * 1000000)
+        FROM performance_samples
+        WHERE price_per_kwh IS NOT NULL
+        """
+    )
+
+    op.add_column(
+        "performance_samples", sa.Column("tariff_id", sa.SmallInteger(), nullable=True)
+    )
+    op.create_foreign_key(
+        "fk_performance_samples_tariffs",
+        "performance_samples",
+        "tariffs",
+        ["tariff_id"],
+        ["id"],
+    )
+    op.execute(
+        """
+        UPDATE performance_samples s SET tariff_id = t.id
+        FROM tariffs t
+        WHERE t.price_micro_per_kwh = round(s.price_per_kwh * 1000000)
+        """
+    )
+    op.drop_column("performance_samples", "price_per_kwh")
+
+    # Anything out of range would fail the type change; clamp it the way the
+    # sampler now does, rewriting only the rows that need it
+    clamped = ", ".join(
+        f"{name} = LEAST(GREATEST({name}, {SMALLINT_MIN}), {SMALLINT_MAX})"
+        for name in SMALL_COLUMNS
+    )
+    out_of_range = " OR ".join(
+        f"{name} NOT BETWEEN {SMALLINT_MIN} AND {SMALLINT_MAX}" for name in SMALL_COLUMNS
+    )
+    op.execute(f"UPDATE performance_samples SET {clamped} WHERE {out_of_range}")
+    for name in SMALL_COLUMNS:
+        op.alter_column(
+            "performance_samples",
+            name,
+            existing_type=sa.Integer(),
+            type_=sa.SmallInteger(),
+            existing_nullable=False,
+        )
+
+    op.add_column(
+        "asic_rollups",
+        sa.Column("cost_micro", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.execute("UPDATE asic_rollups SET cost_micro = round(cost * 1000000)")
+    op.alter_column("asic_rollups", "cost_micro", server_default=None)
+    op.drop_column("asic_rollups", "cost")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "asic_rollups",
+        sa.Column(
+            "cost",
+            sa.Numeric(scale=6, precision=14),
+            nullable=False,
+            server_default="0",
+        ),
+    )
+    op.execute("UPDATE asic_rollups SET cost = cost_micro / 1000000.0")
+    op.alter_column("asic_rollups", "cost", server_default=None)
+    op.drop_column("asic_rollups", "cost_micro")
+
+    for name in SMALL_COLUMNS:
+        op.alter_column(
+            "performance_samples",
+            name,
+            existing_type=sa.SmallInteger(),
+            type_=sa.Integer(),
+            existing_nullable=False,
+        )
+
+    op.add_column(
+        "performance_samples",
+        sa.Column("price_per_kwh", sa.Numeric(scale=3, precision=6), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE performance_samples s SET price_per_kwh = t.price_micro_per_kwh / 1000000.0
+        FROM tariffs t
+        WHERE t.id = s.tariff_id
+        """
+    )
+    op.drop_constraint(
+        "fk_performance_samples_tariffs", "performance_samples", type_="foreignkey"
+    )
+    op.drop_column("performance_samples", "tariff_id")
+    op.drop_table("tariffs")
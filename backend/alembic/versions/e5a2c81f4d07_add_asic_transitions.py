@@ -0,0 +1,102 @@
+"""add asic transitions
+
+Create Date: 2026-10-18 11:58:44.107215
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "e5a2c81f4d07"
+down_revision: Union[str, None] = "c3d95e0a7b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "asic_transitions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("asic_id", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("prev_status", sa.String(length=20), nullable=True),
+        sa.Column("hashing_interval_id", sa.Integer(), nullable=True),
+        sa.Column("prev_hashing_interval_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["asic_id"], ["asics.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["hashing_interval_id"], ["hashing_intervals.id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(
+            ["prev_hashing_interval_id"], ["hashing_intervals.id"], ondelete="SET NULL"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_asic_transitions_asic_id_kind_timestamp",
+        "asic_transitions",
+        ["asic_id", "kind", "timestamp"],
+        unique=False,
+    )
+
+    # Interval transitions from the sample history, one pass over it
+    op.execute(
+        """
+        INSERT INTO asic_transitions (
+            asic_id, timestamp, kind, hashing_interval_id, prev_hashing_interval_id
+        )
+        SELECT asic_id, timestamp, 'interval', hashing_interval_id, prev_interval_id
+        FROM (
+            SELECT
+                asic_id, timestamp, hashing_interval_id,
+                lag(hashing_interval_id) OVER w AS prev_interval_id,
+                row_number() OVER w AS n
+            FROM performance_samples
+            WINDOW w AS (PARTITION BY asic_id ORDER BY timestamp)
+        ) s
+        WHERE n = 1 OR hashing_interval_id IS DISTINCT FROM prev_interval_id
+        """
+    )
+
+    # The current status, since the last recorded change
+    op.execute(
+        """
+        INSERT INTO asic_transitions (asic_id, timestamp, kind, status)
+        SELECT id, changed_at, 'status',
+            CASE
+                WHEN is_hashing AND is_stable THEN 'hashing'
+                WHEN is_hashing THEN 'transitioning'
+                WHEN is_online THEN 'paused'
+                ELSE 'offline'
+            END
+        FROM asics
+        WHERE changed_at IS NOT NULL
+        """
+    )
+
+    # interval_started_at now means the first sample in the interval
+    op.execute(
+        """
+        UPDATE asic_current_state c
+        SET interval_started_at = t.timestamp
+        FROM (
+            SELECT DISTINCT ON (asic_id) asic_id, timestamp, hashing_interval_id
+            FROM asic_transitions
+            WHERE kind = 'interval'
+            ORDER BY asic_id, timestamp DESC
+        ) t
+        WHERE t.asic_id = c.asic_id
+        AND t.hashing_interval_id IS NOT DISTINCT FROM c.hashing_interval_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_asic_transitions_asic_id_kind_timestamp", table_name="asic_transitions"
+    )
+    op.drop_table("asic_transitions")
@@ -0,0 +1,53 @@
+"""add latest sample index and pointer
+
+Create Date: 2026-10-18 13:20:15.884021
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "f81b6d3e9c20"
+down_revision: Union[str, None] = "e5a2c81f4d07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("asics", sa.Column("latest_sample_id", sa.Integer(), nullable=True))
+
+    # Built without locking out the sampler; that can't be done in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_performance_samples_asic_id_timestamp",
+            "performance_samples",
+            ["asic_id", sa.text("timestamp DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    op.execute(
+        """
+        UPDATE asics SET latest_sample_id = (
+            SELECT id FROM performance_samples
+            WHERE performance_samples.asic_id = asics.id
+            ORDER BY timestamp DESC
+            LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_performance_samples_asic_id_timestamp",
+            table_name="performance_samples",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("asics", "latest_sample_id")
@@ -1,3 +1,7 @@
 from flask import Flask
 
 APP = Flask(__name__)
+
+# Tunables can be supplied as HFH_<NAME> environment variables, e.g.
+# HFH_POLL_CONCURRENCY=32 ends up as APP.config["POLL_CONCURRENCY"]
+APP.config.from_prefixed_env("HFH")
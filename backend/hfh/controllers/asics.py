@@ -1,9 +1,21 @@
-import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
 from flask import request
+import pydantic
 import structlog
 
 from ..app import APP
-from ..dtos.asics import AsicsListDto, AsicSummaryDto, OverrideDto
+from ..dtos.asics import (
+    AsicsListDto,
+    AsicsSummaryDto,
+    AsicSummaryDto,
+    OverrideDto,
+    ScheduledChangeDto,
+    TimelineDto,
+)
+from ..dtos.simulations import SimulationDto, SimulationRequestDto, SimulationResultDto
+from ..event_loop import LOOP
 from ..models.asic import Asic
 from ..services.asic_service import (
     get_asic_data,
@@ -14,44 +26,66 @@ from ..services.asic_service import (
     set_power_limit,
 )
 from ..services.auth_service import AuthService
+from ..services.fetch_cache import RAW_CACHE, Cached
+from ..services.fleet_config import FLEET
+from ..services.schedule_service import ScheduleService
+from ..services.simulation_service import SimulationService
 
 from ..utils.data import deep_dict
-from ..utils.validate_pydantic_response import validate_pydantic_response
+from ..utils.validate_pydantic_response import (
+    get_validation_errors,
+    validate_pydantic_response,
+)
 
 
 LOGGER = structlog.get_logger(__name__)
 
 
+def _cached_raw(
+    asic: Asic, kind: str, fetch: Callable[[], Awaitable[Any]]
+) -> Cached[Any]:
+    """What the miner reports, shared with concurrent callers and cached briefly"""
+    return LOOP.run(RAW_CACHE.get((kind, asic.address), fetch))
+
+
+def _age_header(cached: Cached[Any]) -> dict[str, str]:
+    return {"Age": str(int(cached.age))}
+
+
 @APP.route("/api/asic/<name>/raw", methods=["GET"])
-def get_asic_raw(name: str) -> dict:
+def get_asic_raw(name: str) -> tuple[dict, dict[str, str]]:
     asic = Asic.with_name(name)
-    data = asyncio.run(get_asic_data(asic))
-    raw = deep_dict(data.asdict())
-    return raw
+    cached = _cached_raw(asic, "raw", lambda: get_asic_data(asic))
+    raw = deep_dict(cached.value.asdict())
+    return raw, _age_header(cached)
 
 
 @APP.route("/api/asic/<name>/raw/extended", methods=["GET"])
-def get_asic_raw_extended(name: str) -> dict:
+def get_asic_raw_extended(name: str) -> tuple[dict, dict[str, str]]:
     asic = Asic.with_name(name)
-    data = asyncio.run(get_asic_data_extended(asic))
-    raw = deep_dict(data)
-    return raw
+    cached = _cached_raw(asic, "extended", lambda: get_asic_data_extended(asic))
+    raw = deep_dict(cached.value)
+    return raw, _age_header(cached)
 
 
 @APP.route("/api/asic/<name>/raw/errors", methods=["GET"])
-def get_asic_raw_errors(name: str) -> dict:
+def get_asic_raw_errors(name: str) -> tuple[list, dict[str, str]]:
     asic = Asic.with_name(name)
-    data = asyncio.run(get_asic_errors(asic))
-    raw = [deep_dict(d) for d in data]
-    return raw
+    cached = _cached_raw(asic, "errors", lambda: get_asic_errors(asic))
+    raw = [deep_dict(d) for d in cached.value]
+    return raw, _age_header(cached)
 
 
 @APP.route("/api/asic/active", methods=["GET"])
 def get_asic_list_active() -> dict:
-    active = Asic.all_active()
+    with validate_pydantic_response():
+        return AsicsListDto(asics=FLEET.current().names).model_dump()
+
 
+@APP.route("/api/asic/summary", methods=["GET"])
+def get_asics_summary() -> dict:
     with validate_pydantic_response():
-        return AsicsListDto(asics=[asic.name for asic in active]).model_dump()
+        return AsicsSummaryDto.for_all_active().model_dump()
 
 
 @APP.route("/api/asic/<name>/summary", methods=["GET"])
@@ -62,6 +96,43 @@ def get_asic_summary(name: str) -> dict:
         return AsicSummaryDto.from_asic(asic).model_dump()
 
 
+@APP.route("/api/asic/<name>/timeline", methods=["GET"])
+def get_asic_timeline(name: str) -> dict:
+    """
+    The asic's scheduled changes over [since, until) (ISO 8601, defaulting to
+    the next week), e.g. for a planning view
+    """
+    asic = Asic.with_name(name)
+
+    try:
+        since = asic.local_time(
+            datetime.fromisoformat(request.args["since"])
+            if "since" in request.args
+            else None
+        )
+        until = (
+            asic.local_time(datetime.fromisoformat(request.args["until"]))
+            if "until" in request.args
+            else since + timedelta(days=7)
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    max_days = int(APP.config.get("TIMELINE_MAX_DAYS", 92))
+    if not since < until <= since + timedelta(days=max_days):
+        return {"error": f"until must be after since, by up to {max_days} days"}, 400
+
+    changes = ScheduleService().timeline(asic, since, until)
+
+    with validate_pydantic_response():
+        return TimelineDto(
+            asic=asic.name,
+            since=since,
+            until=until,
+            changes=[ScheduledChangeDto.from_change(c) for c in changes],
+        ).model_dump()
+
+
 @APP.route("/api/asic/<name>/set-override", methods=["POST"])
 def post_override(name: str) -> dict:
     user = AuthService.get_current_user()
@@ -82,7 +153,7 @@ def post_override(name: str) -> dict:
     override = OverrideDto.model_validate(data)
     asic = Asic.with_name(name)
 
-    asyncio.run(
+    LOOP.run(
         set_override(
             asic,
             hashing=override.hashing,
@@ -100,12 +171,49 @@ def post_override(name: str) -> dict:
     return {}
 
 
+@APP.route("/api/asic/<name>/simulate", methods=["POST"])
+def post_simulate(name: str) -> dict:
+    """Compare what candidate schedules would have done over the asic's history"""
+    user = AuthService.get_current_user()
+    if not user:
+        return {"error": "Not authenticated"}, 401
+
+    data = request.get_json()
+    if not data:
+        return {"error": "Request body must be JSON"}, 400
+
+    try:
+        simulation = SimulationRequestDto.model_validate(data)
+    except pydantic.ValidationError as e:
+        return {"error": "Invalid simulation", "errors": get_validation_errors(e)}, 400
+    asic = Asic.with_name(name)
+
+    schedules = []
+    for candidate in simulation.schedules:
+        schedule = candidate.to_schedule()
+        if schedule is None:
+            return {"error": f"No schedule with id {candidate.schedule_id}"}, 404
+        schedules.append((candidate.name, schedule))
+
+    results = SimulationService().compare(
+        asic, simulation.since, simulation.until, schedules
+    )
+
+    with validate_pydantic_response():
+        return SimulationDto(
+            asic=asic.name,
+            since=simulation.since,
+            until=simulation.until,
+            results=[SimulationResultDto.from_result(r) for r in results],
+        ).model_dump()
+
+
 @APP.route("/api/asic/<name>/set-hashing/<state>", methods=["PUT", "PATCH"])
 def set_asic_hashing(name: str, state: str) -> dict:
     asic = Asic.with_name(name)
 
     hashing = state.lower() in ["true", "1", "yes"]
-    asyncio.run(set_hashing(asic, hashing))
+    LOOP.run(set_hashing(asic, hashing))
 
     return AsicSummaryDto.from_asic(asic).model_dump()
 
@@ -114,6 +222,6 @@ def set_asic_hashing(name: str, state: str) -> dict:
 def set_asic_power_limit(name: str, power_limit: int) -> dict:
     asic = Asic.with_name(name)
 
-    asyncio.run(set_power_limit(asic, power_limit))
+    LOOP.run(set_power_limit(asic, power_limit))
 
     return AsicSummaryDto.from_asic(asic).model_dump()
@@ -1,12 +1,18 @@
 from sched import scheduler
+from datetime import datetime
 from typing import Optional, Self
 
 from pydantic import AwareDatetime, BaseModel
 
+from ..services.circuit_breaker import BREAKERS
 from ..services.sampling_service import SamplingService
 
 from ..models.asic import Asic, AsicStatus
-from ..services.schedule_service import ScheduleService
+from ..models.asic_current_state import AsicCurrentState
+from ..models.asic_transition import AsicTransition
+from ..models.hashing_interval import HashingInterval
+from ..models.performance_sample import PerformanceSample
+from ..services.schedule_service import ScheduledChange, ScheduleService
 
 
 class AsicSummaryDto(BaseModel):
@@ -24,27 +30,82 @@ class AsicSummaryDto(BaseModel):
     power_per_th: Optional[int]
     temp: Optional[int]
     env_temp: Optional[int]
+    breaker_state: str
+    breaker_retry_in: Optional[int]  # secs
 
     @classmethod
     def from_asic(cls, asic: Asic) -> Self:
+        if state := asic.current_state:
+            return cls.from_state(asic, state)
+
         sample = asic.latest_sample
+        interval = cls.interval_for(asic, sample)
 
-        updated_at = asic.local_time(asic.updated_at)
-        changed_at = asic.local_time((asic.changed_at or asic.updated_at))
-        sampled_at = asic.local_time(sample.timestamp) if sample else None
+        sampler = SamplingService()
+        interval_changed_at = sampler.get_time_for_interval(asic, interval)
 
-        moment = asic.local_time()
-        interval = sample.hashing_interval
+        return cls.from_values(asic, sample, interval, interval_changed_at)
+
+    @classmethod
+    def from_state(cls, asic: Asic, state: AsicCurrentState) -> Self:
+        """Build the summary from the state kept up to date by the sampling cycle"""
+        interval = state.hashing_interval
+        if interval is None:
+            return cls.from_values(
+                asic, state, cls.interval_for(asic, None), None, state.sampled_at
+            )
+
+        return cls.from_values(
+            asic,
+            state,
+            interval,
+            asic.local_time(state.interval_started_at)
+            if state.interval_started_at
+            else None,
+            state.sampled_at,
+            asic.local_time(state.interval_until) if state.interval_until else None,
+        )
+
+    @staticmethod
+    def interval_for(
+        asic: Asic, sample: Optional[PerformanceSample]
+    ) -> Optional[HashingInterval]:
+        """The interval the asic was last sampled under, else the current one"""
+        interval = sample.hashing_interval if sample else None
         if interval is None:
             scheduler = ScheduleService()
             interval = scheduler.get_current_interval(
-                asic, moment=moment, temp=sample.env_temp if sample else None
+                asic,
+                moment=asic.local_time(),
+                temp=sample.env_temp if sample else None,
             )
+        return interval
 
-        sampler = SamplingService()
-        interval_changed_at = sampler.get_time_for_interval(asic, interval)
+    @classmethod
+    def from_values(
+        cls,
+        asic: Asic,
+        sample: Optional[PerformanceSample | AsicCurrentState],
+        interval: Optional[HashingInterval],
+        interval_changed_at: Optional[datetime],
+        sampled_at: Optional[datetime] = None,
+        interval_until: Optional[datetime] = None,
+    ) -> Self:
+        """Build the summary from values already loaded, without further queries"""
+        updated_at = asic.local_time(asic.updated_at)
+        changed_at = asic.local_time((asic.changed_at or asic.updated_at))
+        if sampled_at is None and isinstance(sample, PerformanceSample):
+            sampled_at = sample.timestamp
+        sampled_at = asic.local_time(sampled_at) if sampled_at else None
 
-        return AsicSummaryDto(
+        moment = asic.local_time()
+        if interval_until is None and interval:
+            interval_until = interval.next_end_time(moment)
+
+        breaker = BREAKERS.get(asic.address)
+        retry_in = breaker.retry_in
+
+        return cls(
             name=asic.name,
             status=AsicStatus.for_asic(asic),
             updated_at=updated_at,
@@ -52,19 +113,59 @@ class AsicSummaryDto(BaseModel):
             sampled_at=sampled_at,
             interval_name=(interval.name or "null") if interval else None,
             interval_changed_at=interval_changed_at,
-            interval_until=interval.next_end_time(moment) if interval else None,
+            interval_until=interval_until,
             hash_rate=sample.hash_rate if sample else None,
             power=sample.power if sample else None,
             power_limit=sample.power_limit if sample else None,
             power_per_th=sample.power_per_th if sample else None,
             temp=sample.temp if sample else None,
             env_temp=sample.env_temp if sample else None,
+            breaker_state=breaker.state,
+            breaker_retry_in=round(retry_in) if retry_in is not None else None,
         )
 
 
 class AsicsSummaryDto(BaseModel):
     asics: list[AsicSummaryDto]
 
+    @classmethod
+    def for_all_active(cls) -> Self:
+        """
+        The summary of the whole fleet, with a fixed number of queries however
+        many asics there are.
+        """
+        asics = Asic.all_active_with_schedules()
+        summaries = {
+            asic.id: AsicSummaryDto.from_state(asic, asic.current_state)
+            for asic in asics
+            if asic.current_state
+        }
+
+        # Asics not sampled since the current state was introduced
+        unsampled = [asic for asic in asics if asic.id not in summaries]
+        samples = PerformanceSample.latest_for_each(a.id for a in unsampled)
+
+        intervals = {
+            asic.id: interval
+            for asic in unsampled
+            if (interval := AsicSummaryDto.interval_for(asic, samples.get(asic.id)))
+        }
+        started_at = AsicTransition.intervals_started_at(intervals)
+
+        def interval_changed_at(asic: Asic) -> Optional[datetime]:
+            when = started_at.get(asic.id)
+            return asic.local_time(when) if when else None
+
+        for asic in unsampled:
+            summaries[asic.id] = AsicSummaryDto.from_values(
+                asic,
+                samples.get(asic.id),
+                intervals.get(asic.id),
+                interval_changed_at(asic),
+            )
+
+        return cls(asics=[summaries[asic.id] for asic in asics])
+
 
 class AsicsListDto(BaseModel):
     asics: list[str]
@@ -73,3 +174,33 @@ class AsicsListDto(BaseModel):
 class OverrideDto(BaseModel):
     hashing: bool
     hours: int
+
+
+class ScheduledChangeDto(BaseModel):
+    at: AwareDatetime
+    interval_name: Optional[str]
+    is_override: bool
+    hashing: Optional[bool]  # None --> left as it is
+    power_limit: Optional[int]
+    price_per_kwh: Optional[float]
+
+    @classmethod
+    def from_change(cls, change: ScheduledChange) -> Self:
+        interval = change.interval
+        return cls(
+            at=change.at,
+            interval_name=(interval.name or "null") if interval else None,
+            is_override=change.is_override,
+            hashing=change.hashing,
+            power_limit=change.power_limit,
+            price_per_kwh=(
+                float(change.price_per_kwh) if change.price_per_kwh is not None else None
+            ),
+        )
+
+
+class TimelineDto(BaseModel):
+    asic: str
+    since: AwareDatetime
+    until: AwareDatetime
+    changes: list[ScheduledChangeDto]
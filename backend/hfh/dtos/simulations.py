@@ -0,0 +1,115 @@
+import re
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Self
+
+from pydantic import AwareDatetime, BaseModel, field_validator
+
+from ..models.hashing_interval import HashingInterval
+from ..models.hashing_schedule import HashingSchedule
+from ..models.performance_limit import PerformanceLimit
+from ..services.simulation_service import SimulationResult
+
+HHMM = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+# "*" (or nothing) for every day, else the days' names run together, e.g. "MoWeFr"
+WEEKDAYS = re.compile(rf"\*|({'|'.join(HashingInterval.WEEKDAY_NAME)})*")
+
+
+class CandidateIntervalDto(BaseModel):
+    daytime_start_hhmm: str
+    daytime_end_hhmm: str
+    date_start_mmdd: str = "01/01"
+    date_end_mmdd: str = "01/01"  # Same as the start --> all year
+    weekdays_active: str = "*"
+    hashing_enabled: bool
+    price_per_kwh: Optional[Decimal] = None
+    temp_min: Optional[int] = None
+    temp_max: Optional[int] = None
+    power_limit: Optional[int] = None
+
+    @field_validator("daytime_start_hhmm", "daytime_end_hhmm")
+    @classmethod
+    def is_a_time(cls, hhmm: str) -> str:
+        if not HHMM.fullmatch(hhmm):
+            raise ValueError(f"{hhmm} is not a time of day, as HH:MM")
+        return hhmm
+
+    @field_validator("date_start_mmdd", "date_end_mmdd")
+    @classmethod
+    def is_a_date(cls, mmdd: str) -> str:
+        # In a leap year, so that 02/29 is one
+        try:
+            datetime.strptime(f"2000/{mmdd}", "%Y/%m/%d")
+        except ValueError:
+            raise ValueError(f"{mmdd} is not a day of the year, as MM/DD")
+        return mmdd
+
+    @field_validator("weekdays_active")
+    @classmethod
+    def are_weekdays(cls, weekdays: str) -> str:
+        if not WEEKDAYS.fullmatch(weekdays):
+            raise ValueError(f"{weekdays} is not * or days run together, e.g. MoWeFr")
+        return weekdays
+
+
+class CandidateScheduleDto(BaseModel):
+    """Either an existing schedule, or intervals (in order) making one up"""
+
+    name: str
+    schedule_id: Optional[int] = None
+    intervals: list[CandidateIntervalDto] = []
+
+    def to_schedule(self) -> Optional[HashingSchedule]:
+        """The schedule to simulate; one made up is never added to the session"""
+        if self.schedule_id is not None:
+            return HashingSchedule.with_id(self.schedule_id)
+
+        schedule = HashingSchedule(name=self.name)
+        for order, interval in enumerate(self.intervals):
+            HashingInterval(
+                schedule=schedule,
+                order=order,
+                is_active=True,
+                performance_limit=(
+                    PerformanceLimit(power_limit=interval.power_limit)
+                    if interval.power_limit is not None
+                    else None
+                ),
+                **interval.model_dump(exclude={"power_limit"}),
+            )
+        return schedule
+
+
+class SimulationRequestDto(BaseModel):
+    since: AwareDatetime
+    until: AwareDatetime
+    schedules: list[CandidateScheduleDto]
+
+
+class SimulationResultDto(BaseModel):
+    name: str
+    samples: int
+    sampled_hours: float
+    hashing_hours: float
+    energy_kwh: float
+    cost: float
+    hash_output_th: float
+
+    @classmethod
+    def from_result(cls, result: SimulationResult) -> Self:
+        return cls(
+            name=result.name,
+            samples=result.samples,
+            sampled_hours=result.sampled_hours,
+            hashing_hours=result.hashing_hours,
+            energy_kwh=result.energy_kwh,
+            cost=float(result.cost),
+            hash_output_th=result.hash_output_th,
+        )
+
+
+class SimulationDto(BaseModel):
+    asic: str
+    since: AwareDatetime
+    until: AwareDatetime
+    results: list[SimulationResultDto]  # What actually happened first
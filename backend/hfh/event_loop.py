@@ -0,0 +1,131 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional, TypeVar
+
+import structlog
+
+from .app import APP
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - uvloop is optional
+    uvloop = None
+
+LOGGER = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """
+    A single long-lived asyncio event loop, running in its own thread, that owns
+    all the miner I/O for the process.
+
+    Flask handlers and scheduled jobs hand coroutines to it with `run` (and wait
+    for the result) or `submit` (and don't). The coroutine runs in a copy of the
+    caller's context, so it sees the caller's Flask app context and therefore the
+    same `DB.session`.
+
+    Because the loop outlives any one call, whatever pyasic and the services keep
+    around between calls (drivers, in-flight fetches, caches) stays usable.
+    uvloop is used when installed, unless HFH_USE_UVLOOP is false.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._start()
+            assert self._loop is not None
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run the coroutine on the loop and wait for its result"""
+        if self._thread is threading.current_thread():
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run called from the loop itself")
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        """Schedule the coroutine on the loop without waiting for it"""
+        loop = self.loop
+        context = contextvars.copy_context()
+        future: Future[T] = Future()
+
+        def start() -> None:
+            if future.cancelled():
+                coro.close()
+                return
+            task = loop.create_task(coro, context=context)
+            task.add_done_callback(lambda t: _copy_result(t, future))
+            future.add_done_callback(lambda f: _cancel_task(f, task, loop))
+
+        loop.call_soon_threadsafe(start)
+        return future
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread:
+                self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+
+    def _start(self) -> None:
+        if uvloop is not None and APP.config.get("USE_UVLOOP", True):
+            loop = uvloop.new_event_loop()
+        else:
+            loop = asyncio.new_event_loop()
+
+        ready = threading.Event()
+
+        def run_forever() -> None:
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            try:
+                loop.run_forever()
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=run_forever, name="hfh-loop", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+        LOGGER.info("started background event loop", loop=type(loop).__name__)
+
+
+def _cancel_task(
+    future: "Future[T]", task: "asyncio.Task[T]", loop: asyncio.AbstractEventLoop
+) -> None:
+    if future.cancelled() and not task.done():
+        loop.call_soon_threadsafe(task.cancel)
+
+
+def _copy_result(task: "asyncio.Task[T]", future: "Future[T]") -> None:
+    if task.cancelled():
+        future.cancel()
+        return
+    if not future.set_running_or_notify_cancel():
+        return
+    if (ex := task.exception()) is not None:
+        future.set_exception(ex)
+    else:
+        future.set_result(task.result())
+
+
+LOOP = BackgroundLoop()
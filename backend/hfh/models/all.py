@@ -1,9 +1,13 @@
 from .asic import Asic, AsicStatus
+from .asic_current_state import AsicCurrentState
 from .asic_profile import AsicProfile
+from .asic_rollup import AsicRollup, RollupPeriod
+from .asic_transition import AsicTransition, TransitionKind
 from .hashing_interval import HashingInterval
 from .hashing_schedule import HashingSchedule
 from .performance_limit import PerformanceLimit
 from .performance_sample import PerformanceSample
 from .scenario import Scenario
 from .session import Session
+from .tariff import Tariff
 from .user import User
@@ -5,8 +5,9 @@ from typing import TYPE_CHECKING, Optional, Self
 
 import pyasic
 import structlog
-from sqlalchemy import select
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from pyasic.miners.unknown import UnknownMiner
+from sqlalchemy import event, select
+from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
 
 from ..db import DB, DbSession
 from .mixins import PKId, UniquelyNamed
@@ -14,6 +15,7 @@ from .mixins import PKId, UniquelyNamed
 LOGGER = structlog.get_logger(__name__)
 
 if TYPE_CHECKING:
+    from .asic_current_state import AsicCurrentState
     from .asic_profile import AsicProfile
     from .hashing_interval import HashingInterval
     from .performance_sample import PerformanceSample
@@ -25,6 +27,12 @@ class Asic(DB.Model, PKId, UniquelyNamed):
     address: Mapped[str] = mapped_column(DB.String(40), nullable=False, index=True)
     password: Mapped[str] = mapped_column(DB.String(40), nullable=False)
 
+    # What the driver discovery last identified this miner as, so the driver can be
+    # built directly next time instead of probing the miner
+    miner_class: Mapped[Optional[str]] = mapped_column(DB.String(80), nullable=True)
+    miner_model: Mapped[Optional[str]] = mapped_column(DB.String(40), nullable=True)
+    miner_firmware: Mapped[Optional[str]] = mapped_column(DB.String(80), nullable=True)
+
     is_active: Mapped[bool] = mapped_column(
         DB.Boolean, nullable=False, server_default="true", index=True
     )
@@ -51,10 +59,18 @@ class Asic(DB.Model, PKId, UniquelyNamed):
     )
 
     updated_at: Mapped[datetime] = mapped_column(
-        DB.DateTime, nullable=True, onupdate=datetime.now(tz=UTC)
+        DB.DateTime, nullable=True, onupdate=lambda: datetime.now(tz=UTC)
     )
     changed_at: Mapped[datetime] = mapped_column(DB.DateTime, nullable=True)
 
+    # Kept up to date by the sampling cycle. Deliberately not a foreign key, so
+    # samples can be inserted (and later partitioned or pruned) independently
+    latest_sample_id: Mapped[Optional[int]] = mapped_column(DB.Integer, nullable=True)
+
+    current_state: Mapped[Optional["AsicCurrentState"]] = relationship(
+        "AsicCurrentState", back_populates="asic", uselist=False, passive_deletes=True
+    )
+
     samples: Mapped[list["PerformanceSample"]] = relationship(
         "PerformanceSample",
         back_populates="asic",
@@ -77,43 +93,113 @@ class Asic(DB.Model, PKId, UniquelyNamed):
         return UTC  # TODO: should have a global config?
 
     async def get_miner(self: Self) -> pyasic.AnyMiner:
+        from ..services.miner_registry import MINERS
+
         LOGGER.debug(
             "get_miner",
             id=self.id,
             name=self.name,
             address=self.address,
         )
-        try:
-            if self._miner:
-                return self._miner
-        except AttributeError:
-            setattr(self, "_miner", None)
-
-        self._miner = await pyasic.get_miner(self.address)
-        if self._miner and self.password:
-            self._miner.pwd = self.password
-        return self._miner
+        miner = await MINERS.get(self.address, self.password, self.miner_class)
+        if miner is not None and not isinstance(miner, UnknownMiner):
+            self.identify(miner)
+        return miner
+
+    def identify(self, miner: pyasic.AnyMiner, firmware: Optional[str] = None) -> None:
+        """Remember what kind of miner this is, for building its driver next time"""
+        from ..services.miner_registry import miner_class_name
+
+        miner_class = miner_class_name(type(miner))
+        miner_model = miner.model or self.miner_model
+        miner_firmware = firmware or miner.fw_ver or self.miner_firmware
+
+        if (miner_class, miner_model, miner_firmware) != (
+            self.miner_class,
+            self.miner_model,
+            self.miner_firmware,
+        ):
+            LOGGER.info(
+                "identified miner",
+                asic=self.name,
+                miner_class=miner_class,
+                miner_model=miner_model,
+                miner_firmware=miner_firmware,
+            )
+            self.miner_class = miner_class
+            self.miner_model = miner_model
+            self.miner_firmware = miner_firmware
 
     @property
     def latest_sample(self) -> Optional["PerformanceSample"]:
         from .performance_sample import PerformanceSample
 
+        if self.latest_sample_id is not None:
+            # From the session's identity map after the first time
+            sample = DB.session.get(PerformanceSample, self.latest_sample_id)
+            if sample is not None:
+                return sample
+
         return PerformanceSample.latest_for(self)
 
-    def latest_sample_before_interval(
-        self, interval: "HashingInterval"
-    ) -> Optional["PerformanceSample"]:
-        from .performance_sample import PerformanceSample
+    @classmethod
+    def with_name(
+        cls, name: str, db_session: Optional[DbSession] = None
+    ) -> Optional[Self]:
+        """By id through the fleet's configuration, so usually from the identity map"""
+        from ..services.fleet_config import FLEET
 
-        return PerformanceSample.latest_for(
-            self,
-            before_interval=interval,
-        )
+        db_session = db_session or DB.session
+        if (config := FLEET.current().asics.get(name)) is not None:
+            asic = db_session.get(cls, config.id)
+            if asic is not None and asic.name == name:
+                return asic
+        return super().with_name(name, db_session)
 
     @classmethod
     def all_active(cls, db_session: Optional[DbSession] = None) -> list[Self]:
         db_session = db_session or DB.session
-        stmt = select(cls).order_by(cls.name).filter_by(is_active=True)
+        stmt = (
+            select(cls)
+            .order_by(cls.name)
+            .filter_by(is_active=True)
+            .options(selectinload(cls.current_state))
+        )
+        return [a for a in db_session.scalars(stmt)]
+
+    @classmethod
+    def all_active_with_schedules(
+        cls, db_session: Optional[DbSession] = None
+    ) -> list[Self]:
+        """
+        All active asics, with everything the control loop looks at loaded: the
+        profile, schedule, intervals and their performance limits, the override
+        (and its limit), and the current state. A fixed number of queries, however
+        many asics there are.
+        """
+        from .asic_current_state import AsicCurrentState
+        from .asic_profile import AsicProfile
+        from .hashing_interval import HashingInterval
+        from .hashing_schedule import HashingSchedule
+
+        db_session = db_session or DB.session
+        stmt = (
+            select(cls)
+            .order_by(cls.name)
+            .filter_by(is_active=True)
+            .options(
+                selectinload(cls.profile)
+                .selectinload(AsicProfile.schedule)
+                .selectinload(HashingSchedule.intervals)
+                .selectinload(HashingInterval.performance_limit),
+                selectinload(cls.override_interval).selectinload(
+                    HashingInterval.performance_limit
+                ),
+                selectinload(cls.current_state).joinedload(
+                    AsicCurrentState.hashing_interval
+                ),
+            )
+        )
         return [a for a in db_session.scalars(stmt)]
 
 
@@ -126,13 +212,28 @@ class AsicStatus(str, Enum):
 
     @staticmethod
     def for_asic(asic: Asic) -> Self:
-        if asic.is_hashing:
-            if asic.is_stable:
+        return AsicStatus.for_flags(asic.is_online, asic.is_hashing, asic.is_stable)
+
+    @staticmethod
+    def for_flags(is_online: bool, is_hashing: bool, is_stable: bool) -> Self:
+        if is_hashing:
+            if is_stable:
                 return AsicStatus.hashing
             else:
                 return AsicStatus.transitioning
         else:
-            if asic.is_online:
+            if is_online:
                 return AsicStatus.paused
             else:
                 return AsicStatus.offline
+
+
+@event.listens_for(Asic.address, "set")
+def _address_changed(
+    target: Asic, value: str, oldvalue: object, initiator: object
+) -> None:
+    """Drop the driver for the old address as soon as an asic is re-addressed"""
+    if isinstance(oldvalue, str) and oldvalue != value:
+        from ..services.miner_registry import MINERS
+
+        MINERS.invalidate(oldvalue)
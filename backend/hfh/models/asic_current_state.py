@@ -0,0 +1,53 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Optional
+
+import structlog
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from ..db import DB
+
+LOGGER = structlog.get_logger(__name__)
+
+if TYPE_CHECKING:
+    from .asic import Asic
+    from .hashing_interval import HashingInterval
+
+
+class AsicCurrentState(DB.Model):
+    """
+    The latest reading of an asic, and where it is in its schedule, kept up to
+    date by the sampling cycle whenever it writes a sample; so that showing the
+    current state of an asic is a single lookup.
+    """
+
+    __tablename__ = "asic_current_state"
+
+    asic_id: Mapped[int] = mapped_column(
+        DB.Integer, DB.ForeignKey("asics.id", ondelete="CASCADE"), primary_key=True
+    )
+    asic: Mapped["Asic"] = relationship("Asic", back_populates="current_state")
+
+    sampled_at: Mapped[datetime] = mapped_column(DB.DateTime, nullable=False)
+    hash_rate: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    power: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    power_limit: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    power_per_th: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    temp: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    env_temp: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    price_per_kwh: Mapped[Decimal] = mapped_column(DB.Numeric(scale=3, precision=6))
+
+    hashing_interval_id: Mapped[Optional[int]] = mapped_column(
+        DB.Integer,
+        DB.ForeignKey("hashing_intervals.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    hashing_interval: Mapped[Optional["HashingInterval"]] = relationship(
+        "HashingInterval"
+    )
+    # When the asic was last sampled under a different interval, i.e. about when
+    # the current one started
+    interval_started_at: Mapped[Optional[datetime]] = mapped_column(
+        DB.DateTime, nullable=True
+    )
+    interval_until: Mapped[Optional[datetime]] = mapped_column(DB.DateTime, nullable=True)
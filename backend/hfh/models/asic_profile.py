@@ -19,3 +19,12 @@ class AsicProfile(DB.Model, PKId, UniquelyNamed):
         DB.Integer, DB.ForeignKey("hashing_schedules.id"), nullable=True
     )
     schedule: Mapped[Optional["HashingSchedule"]] = relationship("HashingSchedule")
+
+    # How often to sample asics with this profile, by status; None uses the
+    # app-wide default (see CadenceService)
+    sample_secs_transitioning: Mapped[Optional[int]] = mapped_column(
+        DB.Integer, nullable=True
+    )
+    sample_secs_hashing: Mapped[Optional[int]] = mapped_column(DB.Integer, nullable=True)
+    sample_secs_paused: Mapped[Optional[int]] = mapped_column(DB.Integer, nullable=True)
+    sample_secs_offline: Mapped[Optional[int]] = mapped_column(DB.Integer, nullable=True)
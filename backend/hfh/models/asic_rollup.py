@@ -0,0 +1,103 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import TYPE_CHECKING, Optional, Self
+
+import structlog
+from sqlalchemy import select
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from ..db import DB, DbSession
+from .tariff import MICRO
+
+LOGGER = structlog.get_logger(__name__)
+
+if TYPE_CHECKING:
+    from .asic import Asic
+
+
+class RollupPeriod(str, Enum):
+    hour = "hour"
+    day = "day"
+
+    def start_of(self, moment: datetime) -> datetime:
+        """The start of the period the moment falls in"""
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+        if self == RollupPeriod.day:
+            moment = moment.replace(hour=0)
+        return moment
+
+
+class AsicRollup(DB.Model):
+    """
+    Totals of an asic's samples over an hour or a day, so that history and cost
+    over weeks or months doesn't mean going through every sample.
+
+    Kept up to date as samples are written (see RollupService), and can be
+    re-derived from the samples. Each sample counts towards the period its
+    timestamp falls in. Only totals are stored, so that adding to a period is a
+    plain sum; the averages are derived from them.
+    """
+
+    __tablename__ = "asic_rollups"
+
+    asic_id: Mapped[int] = mapped_column(
+        DB.Integer, DB.ForeignKey("asics.id", ondelete="CASCADE"), primary_key=True
+    )
+    asic: Mapped["Asic"] = relationship("Asic")
+    period: Mapped[str] = mapped_column(DB.String(10), primary_key=True)
+    period_start: Mapped[datetime] = mapped_column(DB.DateTime, primary_key=True)
+
+    samples: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+
+    # Secs covered by samples (i.e. online), and how they were spent
+    sampled_secs: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+    hashing_secs: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+    paused_secs: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+    # Only known from the sampling cycle, as offline asics aren't sampled
+    offline_secs: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+
+    energy_wh: Mapped[Decimal] = mapped_column(
+        DB.Numeric(scale=3, precision=14), nullable=False, default=0
+    )
+    cost_micro: Mapped[int] = mapped_column(DB.BigInteger, nullable=False, default=0)
+
+    # Values weighted by secs, e.g. hash_rate_secs / sampled_secs is the average
+    hash_rate_secs: Mapped[int] = mapped_column(DB.BigInteger, nullable=False, default=0)
+    hash_rate_max: Mapped[int] = mapped_column(DB.Integer, nullable=False, default=0)
+    temp_secs: Mapped[int] = mapped_column(DB.BigInteger, nullable=False, default=0)
+    env_temp_secs: Mapped[int] = mapped_column(DB.BigInteger, nullable=False, default=0)
+
+    @property
+    def cost(self) -> Decimal:
+        return Decimal(self.cost_micro) / MICRO
+
+    @property
+    def avg_hash_rate(self) -> float:
+        return self.hash_rate_secs / self.sampled_secs if self.sampled_secs else 0.0
+
+    @property
+    def avg_temp(self) -> float:
+        return self.temp_secs / self.sampled_secs if self.sampled_secs else 0.0
+
+    @property
+    def avg_env_temp(self) -> float:
+        return self.env_temp_secs / self.sampled_secs if self.sampled_secs else 0.0
+
+    @classmethod
+    def for_asic(
+        cls,
+        asic: "Asic",
+        period: RollupPeriod,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        db_session: Optional[DbSession] = None,
+    ) -> list[Self]:
+        """The asic's rollups for the periods starting in [since, until), oldest first"""
+        db_session = db_session or DB.session
+        stmt = select(cls).filter(cls.asic_id == asic.id, cls.period == period.value)
+        if since is not None:
+            stmt = stmt.filter(cls.period_start >= since)
+        if until is not None:
+            stmt = stmt.filter(cls.period_start < until)
+        return list(db_session.scalars(stmt.order_by(cls.period_start)))
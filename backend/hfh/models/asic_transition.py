@@ -0,0 +1,124 @@
+from datetime import datetime
+from enum import Enum
+from typing import TYPE_CHECKING, Optional, Self
+
+import structlog
+from sqlalchemy import func, select
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from ..db import DB, DbSession
+from .mixins import PKId
+
+LOGGER = structlog.get_logger(__name__)
+
+if TYPE_CHECKING:
+    from .asic import Asic
+    from .hashing_interval import HashingInterval
+
+
+class TransitionKind(str, Enum):
+    status = "status"  # The asic's status changed
+    interval = "interval"  # The asic started sampling under another interval
+
+
+class AsicTransition(DB.Model, PKId):
+    """
+    Append-only record of an asic changing status, or moving to another interval
+    of its schedule, so that "since when" is the latest row of its kind rather
+    than a scan back through the samples.
+    """
+
+    __tablename__ = "asic_transitions"
+    __table_args__ = (
+        DB.Index(
+            "ix_asic_transitions_asic_id_kind_timestamp", "asic_id", "kind", "timestamp"
+        ),
+    )
+
+    asic_id: Mapped[int] = mapped_column(
+        DB.Integer, DB.ForeignKey("asics.id", ondelete="CASCADE"), nullable=False
+    )
+    asic: Mapped["Asic"] = relationship("Asic")
+
+    timestamp: Mapped[datetime] = mapped_column(DB.DateTime, nullable=False)
+    kind: Mapped[str] = mapped_column(DB.String(20), nullable=False)
+
+    # For status transitions
+    status: Mapped[Optional[str]] = mapped_column(DB.String(20), nullable=True)
+    prev_status: Mapped[Optional[str]] = mapped_column(DB.String(20), nullable=True)
+
+    # For interval transitions
+    hashing_interval_id: Mapped[Optional[int]] = mapped_column(
+        DB.Integer,
+        DB.ForeignKey("hashing_intervals.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    hashing_interval: Mapped[Optional["HashingInterval"]] = relationship(
+        "HashingInterval", foreign_keys=[hashing_interval_id]
+    )
+    prev_hashing_interval_id: Mapped[Optional[int]] = mapped_column(
+        DB.Integer,
+        DB.ForeignKey("hashing_intervals.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+
+    @classmethod
+    def latest_for(
+        cls,
+        asic: "Asic",
+        kind: TransitionKind,
+        db_session: Optional[DbSession] = None,
+    ) -> Optional[Self]:
+        db_session = db_session or DB.session
+        stmt = (
+            select(cls)
+            .filter(cls.asic_id == asic.id, cls.kind == kind.value)
+            .order_by(cls.timestamp.desc())
+            .limit(1)
+        )
+        return db_session.scalars(stmt).first()
+
+    @classmethod
+    def interval_started_at(
+        cls, asic: "Asic", interval: "HashingInterval"
+    ) -> Optional[datetime]:
+        """When the asic started on the interval, if that's the one it is on"""
+        latest = cls.latest_for(asic, TransitionKind.interval)
+        if latest is None or latest.hashing_interval_id != interval.id:
+            return None
+        return latest.timestamp
+
+    @classmethod
+    def intervals_started_at(
+        cls,
+        intervals: dict[int, "HashingInterval"],
+        db_session: Optional[DbSession] = None,
+    ) -> dict[int, datetime]:
+        """`interval_started_at` for many asics (by id) at once, in one query"""
+        db_session = db_session or DB.session
+        if not intervals:
+            return {}
+
+        ranked = (
+            select(
+                cls.asic_id,
+                cls.hashing_interval_id,
+                cls.timestamp,
+                func.row_number()
+                .over(partition_by=cls.asic_id, order_by=cls.timestamp.desc())
+                .label("rank"),
+            )
+            .filter(
+                cls.asic_id.in_(list(intervals)),
+                cls.kind == TransitionKind.interval.value,
+            )
+            .subquery()
+        )
+        stmt = select(
+            ranked.c.asic_id, ranked.c.hashing_interval_id, ranked.c.timestamp
+        ).filter(ranked.c.rank == 1)
+        return {
+            asic_id: timestamp
+            for asic_id, interval_id, timestamp in db_session.execute(stmt)
+            if interval_id == intervals[asic_id].id
+        }
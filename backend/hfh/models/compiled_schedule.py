@@ -0,0 +1,171 @@
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, NamedTuple, Optional, Sequence
+
+if TYPE_CHECKING:
+    from .hashing_interval import HashingInterval
+
+# Days of the year are those of a leap year, so that 02/29 has its own
+LEAP_YEAR = 2000
+DAY_MICROS = 24 * 60 * 60 * 1_000_000
+ALL_WEEKDAYS = 0b1111111
+
+
+def day_of_year(month: int, day: int) -> int:
+    return date(LEAP_YEAR, month, day).timetuple().tm_yday
+
+
+def mmdd_day(mmdd: str) -> int:
+    month, day = mmdd.split("/", 2)
+    return day_of_year(int(month), int(day))
+
+
+def time_micros(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+class IntervalWindows(NamedTuple):
+    """When an interval is in effect, parsed"""
+
+    interval: "HashingInterval"
+    days: tuple[int, int]  # [first, last + 1) day of the year; may wrap around
+    times: tuple[int, int]  # [start, end) micros of the day; may wrap around
+    weekdays: int  # bit n set --> active on weekday n (Monday is 0)
+    temp_min: Optional[int]
+    temp_max: Optional[int]
+
+    @classmethod
+    def of(cls, interval: "HashingInterval") -> "IntervalWindows":
+        weekdays = ALL_WEEKDAYS
+        if interval.weekdays_active not in ("", "*"):
+            weekdays = 0
+            for n, name in enumerate(interval.WEEKDAY_NAME):
+                if name in interval.weekdays_active:
+                    weekdays |= 1 << n
+        return cls(
+            interval=interval,
+            days=_day_window(interval),
+            times=_time_window(interval),
+            weekdays=weekdays,
+            temp_min=interval.temp_min,
+            temp_max=interval.temp_max,
+        )
+
+    def matches(self, weekday: int, temp: Optional[int]) -> bool:
+        if not self.weekdays & (1 << weekday):
+            return False
+        if temp is None:
+            return True
+        if self.temp_min is not None and temp < self.temp_min:
+            return False
+        if self.temp_max is not None and temp > self.temp_max:
+            return False
+        return True
+
+
+class _DaySegment(NamedTuple):
+    """The intervals whose dates cover a run of days, split up by time of day"""
+
+    starts: list[int]  # micros of the day each time segment starts at
+    candidates: list[list[IntervalWindows]]  # for each time segment, in schedule order
+
+
+class CompiledSchedule:
+    """
+    A schedule's (active) intervals, parsed once and indexed by day of the year
+    and time of day, to find the interval in effect at a moment with a couple
+    of binary searches rather than by checking each interval in turn.
+
+    The year is split into runs of days over which the same intervals' date
+    windows apply, and each of those into the times of day over which the same
+    intervals' time windows apply; what's left to check at a moment is the
+    weekday and the temperature of those candidates, in schedule order. Gives
+    the same answers as the first of the intervals that `is_active_under` the
+    scenario.
+    """
+
+    def __init__(self, intervals: Sequence["HashingInterval"]) -> None:
+        self.windows = [IntervalWindows.of(i) for i in intervals if i.is_active]
+
+        day_starts = sorted(
+            {1} | {d for windows in self.windows for d in windows.days} - {367}
+        )
+        self._day_starts = day_starts
+        self._days: list[_DaySegment] = []
+        for day in day_starts:
+            on_day = [w for w in self.windows if in_window(day, w.days)]
+            time_starts = sorted(
+                {0} | {t for w in on_day for t in w.times} - {DAY_MICROS}
+            )
+            self._days.append(
+                _DaySegment(
+                    starts=time_starts,
+                    candidates=[
+                        [w for w in on_day if in_window(t, w.times)] for t in time_starts
+                    ],
+                )
+            )
+
+    def candidates_at(self, moment: datetime) -> list[IntervalWindows]:
+        segment = self._day_segment(moment)
+        t = time_micros(moment.time())
+        return segment.candidates[bisect_right(segment.starts, t) - 1]
+
+    def interval_at(
+        self, moment: datetime, temp: Optional[int] = None
+    ) -> Optional["HashingInterval"]:
+        """The interval in effect at the moment (and temp, if given), if any"""
+        weekday = moment.weekday()
+        for windows in self.candidates_at(moment):
+            if windows.matches(weekday, temp):
+                return windows.interval
+        return None
+
+    def next_change(self, moment: datetime) -> datetime:
+        """
+        The next moment after this one at which a different interval could be
+        in effect (whatever the temperature): the next start or end of a time
+        window that day, or else midnight, when the date and weekday change.
+        """
+        segment = self._day_segment(moment)
+        t = time_micros(moment.time())
+        i = bisect_right(segment.starts, t)
+        midnight = datetime.combine(
+            moment.date() + timedelta(days=1), time(), tzinfo=moment.tzinfo
+        )
+        if i == len(segment.starts):
+            return midnight
+        return midnight - timedelta(microseconds=DAY_MICROS - segment.starts[i])
+
+    def _day_segment(self, moment: datetime) -> _DaySegment:
+        day = day_of_year(moment.month, moment.day)
+        return self._days[bisect_right(self._day_starts, day) - 1]
+
+
+def _day_window(interval: "HashingInterval") -> tuple[int, int]:
+    """[first, last + 1) day of the year, wrapping around the end of the year"""
+    first = mmdd_day(interval.date_start_mmdd)
+    last = mmdd_day(interval.date_end_mmdd)
+    if first == last:
+        return (1, 367)  # All year
+    return (first, last + 1)
+
+
+def _time_window(interval: "HashingInterval") -> tuple[int, int]:
+    """[start, end) micros of the day, wrapping around midnight"""
+    start = time_micros(interval.daytime_start)
+    # An end of 00:00 is midnight (rather than the last microsecond of the day)
+    end = (
+        time_micros(interval.daytime_end)
+        if interval.daytime_end_hhmm != "00:00"
+        else DAY_MICROS
+    )
+    return (start, end)
+
+
+def in_window(at: int, window: tuple[int, int]) -> bool:
+    start, end = window
+    if start < end:
+        return start <= at < end
+    # Wraps around, or (start == end) covers everything
+    return at >= start or at < end
@@ -7,6 +7,7 @@ import structlog
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..db import DB
+from .compiled_schedule import CompiledSchedule
 from .mixins import OptionallyNamed, PKId
 from .scenario import Scenario
 
@@ -72,6 +73,11 @@ class HashingInterval(DB.Model, PKId, OptionallyNamed):
             hr, mn = self.daytime_end_hhmm.split(":", 2)
             return time(int(hr), int(mn))
 
+    @cached_property
+    def compiled(self) -> "CompiledSchedule":
+        """The interval on its own (e.g. as an override), compiled"""
+        return CompiledSchedule([self])
+
     @cached_property
     def is_all_day(self) -> bool:
         return self.daytime_start_hhmm == "00:00" and self.daytime_end_hhmm == "00:00"
@@ -89,7 +95,8 @@ class HashingInterval(DB.Model, PKId, OptionallyNamed):
 
     def date_end(self, moment: datetime) -> date:
         tz = moment.tzinfo or (self.schedule.timezone if self.schedule else None)
-        year = moment.year
+        # The end that follows the start, which may be in the previous year
+        year = self.date_start(moment).year
         dt = datetime.strptime(f"{year}/{self.date_end_mmdd}", "%Y/%m/%d")
         if tz:
             dt = dt.replace(tzinfo=tz)
@@ -6,6 +6,7 @@ import structlog
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..db import DB
+from .compiled_schedule import CompiledSchedule
 from .mixins import OptionallyNamed, PKId
 
 LOGGER = structlog.get_logger(__name__)
@@ -32,6 +33,11 @@ class HashingSchedule(DB.Model, PKId, OptionallyNamed):
         "HashingInterval.hashing_enabled",
     )
 
+    @cached_property
+    def compiled(self) -> CompiledSchedule:
+        """The intervals, compiled for looking up the one in effect at a moment"""
+        return CompiledSchedule(self.intervals)
+
     @cached_property
     def timezone(self) -> ZoneInfo:
         return ZoneInfo(self.timezone_name) if self.timezone_name else ZoneInfo("UTC")
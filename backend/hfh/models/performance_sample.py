@@ -1,23 +1,29 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import TYPE_CHECKING, Optional, Self
+from typing import TYPE_CHECKING, Iterable, Optional, Self
 
 import structlog
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import func, select
+from sqlalchemy.orm import Mapped, joinedload, mapped_column, relationship
 
-from ..db import DB
+from ..db import DB, DbSession
 from .mixins import PKId
+from .tariff import MICRO
 
 LOGGER = structlog.get_logger(__name__)
 
 if TYPE_CHECKING:
     from .asic import Asic
     from .hashing_interval import HashingInterval
+    from .tariff import Tariff
 
 
 class PerformanceSample(DB.Model, PKId):
     """Records the performance characteristics of an asic at a specific time"""
 
+    # On postgres the table is partitioned by month of timestamp, with (id,
+    # timestamp) as its primary key; ids are still unique. The partitions are
+    # managed by the migrations and PartitionService, not by the model.
     __tablename__ = "performance_samples"
 
     hashing_interval_id: Mapped[int | None] = mapped_column(
@@ -31,28 +37,48 @@ class PerformanceSample(DB.Model, PKId):
     )
 
     timestamp: Mapped[datetime] = mapped_column(DB.DateTime, nullable=False, index=True)
-    interval_secs: Mapped[int] = mapped_column(DB.Integer, nullable=False)
+    interval_secs: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)
 
     is_online: Mapped[bool] = mapped_column(DB.Boolean, nullable=False)
     is_hashing: Mapped[bool] = mapped_column(DB.Boolean, nullable=False)
     is_stable: Mapped[bool] = mapped_column(DB.Boolean, nullable=False)
-    hash_rate: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    power: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    power_limit: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    power_per_th: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    temp: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    env_temp: Mapped[int] = mapped_column(DB.Integer, nullable=False)
-    price_per_kwh: Mapped[Decimal] = mapped_column(DB.Numeric(scale=3, precision=6))
-
-    # With this scaling factor:
-    # - convert power in W to kW  --> 0.001
-    # - convert price_per_kwh in $/kwh to $/kws --> 1/3600
-    HASH_COST_SCALE = Decimal("0.001") / Decimal(3600)
+    hash_rate: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # TH/s
+    power: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # W
+    power_limit: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # W
+    power_per_th: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # J/TH
+    temp: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # deg C
+    env_temp: Mapped[int] = mapped_column(DB.SmallInteger, nullable=False)  # deg C
+
+    tariff_id: Mapped[Optional[int]] = mapped_column(
+        DB.SmallInteger, DB.ForeignKey("tariffs.id"), nullable=True
+    )
+    tariff: Mapped[Optional["Tariff"]] = relationship("Tariff", lazy="joined")
+
+    # Costs are worked out in integer micro-dollars:
+    # W * secs * micro-$/kWh / (W * secs per kWh) --> micro-$
+    WATT_SECS_PER_KWH = 3_600_000
+
+    @property
+    def price_micro_per_kwh(self) -> int:
+        return self.tariff.price_micro_per_kwh if self.tariff else 0
+
+    @property
+    def price_per_kwh(self) -> Decimal:
+        return Decimal(self.price_micro_per_kwh) / MICRO
+
+    @property
+    def hash_cost_micro(self) -> int:
+        """Cost for the sample period, in micro-dollars"""
+        return (
+            self.power * self.interval_secs * self.price_micro_per_kwh
+        ) // self.WATT_SECS_PER_KWH
 
     @property
     def cost_per_sec(self) -> Decimal:
         """Cost per second in $ / s"""
-        return self.power * self.price_per_kwh * self.HASH_COST_SCALE
+        return Decimal(self.power * self.price_micro_per_kwh) / (
+            self.WATT_SECS_PER_KWH * MICRO
+        )
 
     @property
     def cost_per_hr(self) -> Decimal:
@@ -66,7 +92,7 @@ class PerformanceSample(DB.Model, PKId):
     @property
     def hash_cost(self) -> Decimal:
         """Cost for the sample period"""
-        return self.cost_per_sec * Decimal(self.interval_secs)
+        return Decimal(self.hash_cost_micro) / MICRO
 
     asic_id: Mapped[int] = mapped_column(
         DB.Integer, DB.ForeignKey("asics.id"), nullable=False, index=True
@@ -74,13 +100,42 @@ class PerformanceSample(DB.Model, PKId):
     asic: Mapped["Asic"] = relationship("Asic", back_populates="samples")
 
     @classmethod
-    def latest_for(
-        cls,
-        asic: "Asic",
-        *,
-        before_interval: Optional["HashingInterval"] = None,
-    ) -> Optional[Self]:
+    def latest_for(cls, asic: "Asic") -> Optional[Self]:
         query = cls.query.filter(cls.asic_id == asic.id)
-        if before_interval:
-            query = query.filter(cls.hashing_interval_id != before_interval.id)
         return query.order_by(cls.timestamp.desc()).first()
+
+    @classmethod
+    def latest_for_each(
+        cls, asic_ids: Iterable[int], db_session: Optional[DbSession] = None
+    ) -> dict[int, Self]:
+        """The latest sample of each of the asics, by asic id, in one query"""
+        db_session = db_session or DB.session
+        asic_ids = list(asic_ids)
+        if not asic_ids:
+            return {}
+
+        ranked = (
+            select(
+                cls.id,
+                func.row_number()
+                .over(partition_by=cls.asic_id, order_by=cls.timestamp.desc())
+                .label("rank"),
+            )
+            .filter(cls.asic_id.in_(asic_ids))
+            .subquery()
+        )
+        stmt = (
+            select(cls)
+            .join(ranked, ranked.c.id == cls.id)
+            .filter(ranked.c.rank == 1)
+            .options(joinedload(cls.hashing_interval))
+        )
+        return {sample.asic_id: sample for sample in db_session.scalars(stmt)}
+
+
+# For the latest sample(s) of an asic
+DB.Index(
+    "ix_performance_samples_asic_id_timestamp",
+    PerformanceSample.asic_id,
+    PerformanceSample.timestamp.desc(),
+)
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from typing import Iterable, Optional
+
+import structlog
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..db import DB, DbSession
+
+LOGGER = structlog.get_logger(__name__)
+
+MICRO = 1_000_000
+
+
+class Tariff(DB.Model):
+    """
+    A price of electricity, in micro-dollars per kWh. Samples refer to one
+    rather than each carrying a copy of the price; there are only ever a few.
+    """
+
+    __tablename__ = "tariffs"
+
+    # (sqlite only autoincrements an INTEGER primary key)
+    id: Mapped[int] = mapped_column(
+        DB.SmallInteger().with_variant(DB.Integer, "sqlite"), primary_key=True
+    )
+    price_micro_per_kwh: Mapped[int] = mapped_column(
+        DB.Integer, nullable=False, unique=True
+    )
+
+    @property
+    def price_per_kwh(self) -> Decimal:
+        return Decimal(self.price_micro_per_kwh) / MICRO
+
+    @staticmethod
+    def to_micro(price_per_kwh: Optional[Decimal]) -> int:
+        return round((price_per_kwh or Decimal(0)) * MICRO)
+
+    @classmethod
+    def ids_for(
+        cls, prices_micro: Iterable[int], db_session: Optional[DbSession] = None
+    ) -> dict[int, int]:
+        """
+        The ids of the tariffs with the prices (in micro-dollars per kWh), adding
+        any that don't exist yet. Does not commit.
+        """
+        db_session = db_session or DB.session
+        prices_micro = set(prices_micro)
+        if not prices_micro:
+            return {}
+
+        stmt = select(cls.price_micro_per_kwh, cls.id).filter(
+            cls.price_micro_per_kwh.in_(prices_micro)
+        )
+        ids = {price: id for price, id in db_session.execute(stmt)}
+
+        missing = prices_micro - ids.keys()
+        if missing:
+            LOGGER.info("adding tariffs", prices_micro=sorted(missing))
+            added = db_session.execute(
+                insert(cls).returning(cls.price_micro_per_kwh, cls.id),
+                [dict(price_micro_per_kwh=p) for p in missing],
+            )
+            ids.update((price, id) for price, id in added)
+        return ids
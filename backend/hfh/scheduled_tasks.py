@@ -1,9 +1,8 @@
-import asyncio
-
 import structlog
 from flask_apscheduler import APScheduler
 
 from .app import APP
+from .event_loop import LOOP
 
 LOGGER = structlog.get_logger(__name__)
 
@@ -11,17 +10,54 @@ SCHEDULER = APScheduler()
 SCHEDULER.init_app(APP)
 
 
-@SCHEDULER.task("interval", id="periodically_sample", seconds=60)
+# Each asic is sampled at its own cadence; this just checks who is due and starts
+# sampling them, in the background
+@SCHEDULER.task(
+    "interval",
+    id="periodically_sample",
+    seconds=int(APP.config.get("SAMPLE_TICK_SECS", 5)),
+)
 def periodically_sample() -> None:
     from .services.sampling_service import SamplingService
 
     with APP.app_context():
-        asyncio.run(SamplingService().sample_all_active(interval=60))
+        LOOP.run(SamplingService().sample_due())
 
 
-@SCHEDULER.task("interval", id="periodically_update_schedule", seconds=60)
+# Transitions are run as they come due (see TransitionService); this is a safety
+# net, and re-plans the transitions
+@SCHEDULER.task(
+    "interval",
+    id="periodically_update_schedule",
+    seconds=int(APP.config.get("SCHEDULE_SAFETY_NET_SECS", 600)),
+)
 def periodically_update_schedule() -> None:
     from .services.schedule_service import ScheduleService
+    from .services.transition_service import TRANSITIONS
+
+    with APP.app_context():
+        LOOP.run(ScheduleService().update_all_active())
+        TRANSITIONS.plan()
+
+
+# The transition plan can't foresee the temperature, so the asics whose schedule
+# depends on it still get the schedule pass every minute
+@SCHEDULER.task(
+    "interval",
+    id="periodically_update_temp_dependent",
+    seconds=int(APP.config.get("SCHEDULE_TEMP_SECS", 60)),
+)
+def periodically_update_temp_dependent() -> None:
+    from .services.schedule_service import ScheduleService
+
+    with APP.app_context():
+        LOOP.run(ScheduleService().update_temp_dependent())
+
+
+# Keep partitions ahead of the samples, and drop those past retention
+@SCHEDULER.task("cron", id="maintain_sample_partitions", hour=0, minute=15)
+def maintain_sample_partitions() -> None:
+    from .services.partition_service import PartitionService
 
     with APP.app_context():
-        asyncio.run(ScheduleService().update_all_active())
+        PartitionService().maintain()
@@ -1,6 +1,9 @@
+import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime, time, timedelta
 from decimal import Decimal
-from typing import Optional
+from time import monotonic
+from typing import Any, Optional
 
 import structlog
 from pyasic import AnyMiner
@@ -9,73 +12,245 @@ from pyasic.data.error_codes import MinerErrorData
 
 from ..db import DB
 from ..models.asic import Asic, AsicStatus
+from ..models.asic_transition import AsicTransition, TransitionKind
 from ..models.hashing_interval import HashingInterval
 from ..models.performance_limit import PerformanceLimit
 from ..utils.data import getitem
+from .circuit_breaker import BREAKERS, CircuitOpenError
+from .miner_registry import MINERS
+from .polling_service import PollingService
 
 LOGGER = structlog.get_logger(__name__)
 
 
 async def get_asic_data(asic: Asic) -> MinerData:
-    m: AnyMiner = await asic.get_miner()
-    d: MinerData = await m.get_data()
+    async with BREAKERS.guard(asic.address):
+        m: AnyMiner = await asic.get_miner()
+        d: MinerData = await m.get_data()
     return d
 
 
+@dataclass
+class MinerSnapshot:
+    """
+    Everything read from a miner in one cycle: the pyasic data, plus the raw
+    summary response when the miner is hashing (needed to tell if it's stable).
+
+    `data` is None when the miner could not be reached.
+    """
+
+    data: Optional[MinerData]
+    summary: Optional[dict[str, Any]] = None
+    fetched_at: float = field(default_factory=monotonic)
+
+    @property
+    def is_online(self) -> bool:
+        return self.data is not None
+
+    @property
+    def is_hashing(self) -> bool:
+        return bool(self.data and self.data.is_mining)
+
+    @property
+    def age(self) -> float:
+        return monotonic() - self.fetched_at
+
+    def is_stable(self, asic: Asic) -> bool:
+        if not (self.is_hashing and self.summary):
+            return False
+
+        try:
+            upfreq_complete = getitem(self.summary, ("SUMMARY", [0], "Upfreq Complete"))
+        except KeyError as ex:
+            LOGGER.debug("can't get Upfreq Complete", asic=asic.name, ex=ex)
+            upfreq_complete = None
+
+        if upfreq_complete is not None:
+            return bool(upfreq_complete == 1)
+
+        try:
+            hashing_stable = getitem(self.summary, ("SUMMARY", [0], "Hash Stable"))
+        except KeyError as ex:
+            LOGGER.debug("can't get Hash Stable", asic=asic.name, ex=ex)
+            hashing_stable = None
+
+        return bool(hashing_stable)
+
+
+# The most recent snapshot of each asic (by id), so that the schedule pass can
+# reuse what the sampling pass just fetched instead of asking the miner again
+_SNAPSHOTS: dict[int, MinerSnapshot] = {}
+
+
+async def get_asic_snapshot(asic: Asic) -> MinerSnapshot:
+    """
+    Fetch everything needed for one sampling cycle from the miner, exactly once.
+    Never raises; an unreachable miner yields an offline snapshot, without even
+    trying while its circuit breaker is open.
+    """
+    try:
+        async with BREAKERS.guard(asic.address):
+            m: AnyMiner = await asic.get_miner()
+            data: MinerData = await m.get_data()
+    except CircuitOpenError as ex:
+        LOGGER.debug("skipping unreachable asic", asic=asic.name, retry_in=ex.retry_in)
+        snapshot = MinerSnapshot(data=None)
+    except Exception as ex:
+        LOGGER.info("asic appears to be offline", asic=asic.name, ex=ex)
+        MINERS.invalidate(asic.address)
+        snapshot = MinerSnapshot(data=None)
+    else:
+        if data.model and asic.miner_model and data.model != asic.miner_model:
+            # The stored identity no longer matches; rediscover next time
+            LOGGER.warning(
+                "miner model changed",
+                asic=asic.name,
+                expected=asic.miner_model,
+                actual=data.model,
+            )
+            MINERS.invalidate(asic.address, distrust_hint=True)
+            asic.miner_class = None
+        else:
+            asic.identify(m, firmware=data.fw_ver)
+
+        summary: Optional[dict[str, Any]] = None
+        if data.is_mining:
+            try:
+                summary = await m.api.summary()
+            except Exception as ex:
+                LOGGER.info("can't get summary", asic=asic.name, ex=ex)
+        snapshot = MinerSnapshot(data=data, summary=summary)
+
+    _SNAPSHOTS[asic.id] = snapshot
+    return snapshot
+
+
+def recent_snapshot(asic: Asic, max_age: float) -> Optional[MinerSnapshot]:
+    """The last snapshot taken of the asic, if it is no older than `max_age` secs"""
+    snapshot = _SNAPSHOTS.get(asic.id)
+    if snapshot is None or snapshot.age > max_age:
+        return None
+    return snapshot
+
+
 async def get_asic_errors(asic: Asic) -> MinerErrorData:
-    m: AnyMiner = await asic.get_miner()
-    d: MinerErrorData = await m.get_errors()
+    async with BREAKERS.guard(asic.address):
+        m: AnyMiner = await asic.get_miner()
+        d: MinerErrorData = await m.get_errors()
     return d
 
 
 async def get_asic_data_extended(asic: Asic) -> MinerData:
+    async with BREAKERS.guard(asic.address):
+        return await _get_asic_data_extended(asic)
+
+
+# Commands for the extended data, in the order they are reported
+EXTENDED_COMMANDS = [
+    "status",
+    "summary",
+    "get_psu",
+    "get_miner_info",
+    "devdetails",
+    "devs",
+    "get_error_code",
+]
+
+
+def _is_joinable(cmd: str) -> bool:
+    """
+    Whether the command can be joined with others into one "cmd1+cmd2" request.
+    That works for the plain cgminer-style read commands; the btminer JSON-style
+    ones ("status", "get_*") have to be sent on their own.
+    """
+    return cmd != "status" and not cmd.startswith("get_")
+
+
+async def _get_asic_data_extended(asic: Asic) -> MinerData:
     m: AnyMiner = await asic.get_miner()
     api = m.api
 
-    d = {}
-
-    for cmd in [
-        "status",
-        "summary",
-        "get_psu",
-        "get_miner_info",
-        "devdetails",
-        "devs",
-        "get_error_code",
-    ]:
-        try:
-            func = getattr(api, cmd)
-            result = await func()
-            d[cmd] = result
-        except Exception as ex:
-            d[cmd] = {"error": str(ex)}
-            LOGGER.exception(
-                "command failed",
-                asic=asic.name,
-                cmd=cmd,
-                ex=ex,
-            )
+    available = set(api.get_commands())
+    joinable = [c for c in EXTENDED_COMMANDS if c in available and _is_joinable(c)]
+    separate = [c for c in EXTENDED_COMMANDS if c not in joinable]
 
-    return d
+    # One round trip for everything that can be joined, concurrently with the rest
+    results = await asyncio.gather(
+        _send_joined(asic, api, joinable),
+        *(_send_command(asic, api, cmd) for cmd in separate),
+        return_exceptions=True,
+    )
+    for result in results:
+        # Only being unreachable gets this far; let the circuit breaker know
+        if isinstance(result, BaseException):
+            raise result
+
+    joined, *rest = results
+    d = {**joined, **dict(zip(separate, rest, strict=True))}
+    return {cmd: d[cmd] for cmd in EXTENDED_COMMANDS}
+
+
+async def _send_joined(asic: Asic, api: Any, cmds: list[str]) -> dict[str, Any]:
+    if len(cmds) < 2:
+        return {cmd: await _send_command(asic, api, cmd) for cmd in cmds}
+
+    # pyasic drops the commands the miner rejects (or all of them, if it can't
+    # join commands at all), leaving those without an answer
+    try:
+        data = await api.multicommand(*cmds)
+    except (OSError, TimeoutError):
+        raise
+    except Exception as ex:
+        LOGGER.info("joined command failed", asic=asic.name, cmds=cmds, ex=ex)
+        data = {}
+
+    answered = {cmd: answer[0] for cmd in cmds if (answer := data.get(cmd)) and answer[0]}
+    unanswered = [cmd for cmd in cmds if cmd not in answered]
+    if unanswered:
+        # Sent one by one instead
+        LOGGER.info("joined command unanswered", asic=asic.name, cmds=unanswered)
+        results = await asyncio.gather(
+            *(_send_command(asic, api, cmd) for cmd in unanswered)
+        )
+        answered.update(zip(unanswered, results, strict=True))
+    return answered
+
+
+async def _send_command(asic: Asic, api: Any, cmd: str) -> Any:
+    """Send one command, reporting a failure as its result"""
+    try:
+        func = getattr(api, cmd)
+        return await func()
+    except (OSError, TimeoutError):
+        raise
+    except Exception as ex:
+        LOGGER.exception(
+            "command failed",
+            asic=asic.name,
+            cmd=cmd,
+            ex=ex,
+        )
+        return {"error": str(ex)}
 
 
 async def set_hashing(asic: Asic, hashing: bool, hours: Optional[int] = None) -> None:
     LOGGER.info("set_hashing", asic=asic.name, hashing=hashing)
-    miner: AnyMiner = await asic.get_miner()
-    if hashing:
-        resumed = await miner.resume_mining()
-        if not resumed:
-            LOGGER.warning(
-                "resume_mining failed",
-                asic=asic.name,
-            )
-    else:
-        stopped = await miner.stop_mining()
-        if not stopped:
-            LOGGER.warning(
-                "stop_mining failed",
-                asic=asic.name,
-            )
+    async with BREAKERS.guard(asic.address):
+        miner: AnyMiner = await asic.get_miner()
+        if hashing:
+            resumed = await miner.resume_mining()
+            if not resumed:
+                LOGGER.warning(
+                    "resume_mining failed",
+                    asic=asic.name,
+                )
+        else:
+            stopped = await miner.stop_mining()
+            if not stopped:
+                LOGGER.warning(
+                    "stop_mining failed",
+                    asic=asic.name,
+                )
 
     if hours is not None:
         await set_override(asic, hashing=hashing, hours=hours)
@@ -162,52 +337,34 @@ async def set_override(
 
 async def set_power_limit(asic: Asic, power_limit: int) -> None:
     LOGGER.info("set_power_limit", asic=asic.name, power_limit=power_limit)
-    miner: AnyMiner = await asic.get_miner()
-    await miner.api.adjust_power_limit(power_limit)
+    async with BREAKERS.guard(asic.address):
+        miner: AnyMiner = await asic.get_miner()
+        await miner.api.adjust_power_limit(power_limit)
 
     await update_status(asic)
 
 
-async def update_status(asic: Asic) -> AsicStatus:
+async def update_status(
+    asic: Asic, snapshot: Optional[MinerSnapshot] = None
+) -> AsicStatus:
+    """
+    Refresh the online/hashing/stable flags of the asic.
+
+    When a `snapshot` is given it is used as-is instead of going back to the
+    miner; pass the result of `get_asic_snapshot` to share one fetch between the
+    status update and the sample.
+    """
     prev_status = AsicStatus.for_asic(asic)
     LOGGER.debug("updating status", asic=asic.name, status=prev_status)
 
-    asic.is_online = False
-    asic.is_hashing = False
-    asic.is_stable = False
-
-    try:
-        d = await get_asic_data(asic)
-        asic.is_online = True
-        asic.is_hashing = d.is_mining
-        if asic.is_hashing:
-            miner: AnyMiner = await asic.get_miner()
-            summary_response = await miner.api.summary()
-
-            try:
-                upfreq_complete = getitem(
-                    summary_response, ("SUMMARY", [0], "Upfreq Complete")
-                )
-            except KeyError as ex:
-                LOGGER.debug("can't get Upfreq Complete", asic=asic.name, ex=ex)
-                upfreq_complete = None
-
-            if upfreq_complete is not None:
-                asic.is_stable = upfreq_complete == 1
-            else:
-                try:
-                    hashing_stable = getitem(
-                        summary_response, ("SUMMARY", [0], "Hash Stable")
-                    )
-                except KeyError as ex:
-                    LOGGER.debug("can't get Hash Stable", asic=asic.name, ex=ex)
-                    hashing_stable = None
-                if hashing_stable is not None:
-                    asic.is_stable = hashing_stable
-
-    except Exception as ex:
-        LOGGER.info("asic appears to be offline", asic=asic.name, ex=ex)
+    if snapshot is None:
+        snapshot = await get_asic_snapshot(asic)
 
+    # Everything is fetched before touching the asic, so that a concurrent poll
+    # committing in the meantime never sees a half-updated status
+    asic.is_online = snapshot.is_online
+    asic.is_hashing = snapshot.is_hashing
+    asic.is_stable = snapshot.is_stable(asic)
     asic.updated_at = asic.local_time()
 
     status = AsicStatus.for_asic(asic)
@@ -217,6 +374,15 @@ async def update_status(asic: Asic) -> AsicStatus:
             "updated status", asic=asic.name, status=status, prev_status=prev_status
         )
         asic.changed_at = asic.updated_at
+        DB.session.add(
+            AsicTransition(
+                asic_id=asic.id,
+                timestamp=asic.changed_at,
+                kind=TransitionKind.status.value,
+                status=status.value,
+                prev_status=prev_status.value,
+            )
+        )
 
     return status
 
@@ -224,6 +390,12 @@ async def update_status(asic: Asic) -> AsicStatus:
 async def update_status_of_all_active() -> None:
     all_active = Asic.all_active()
     LOGGER.info("Updating status of all active", count=len(all_active))
-    for asic in all_active:
-        await update_status(asic)
+    await PollingService().poll(all_active, update_status)
     DB.session.commit()
+
+
+async def warm_up_miners() -> None:
+    """Discover the drivers of all active asics up front, in parallel"""
+    await MINERS.warm_up(
+        (asic.address, asic.password, asic.miner_class) for asic in Asic.all_active()
+    )
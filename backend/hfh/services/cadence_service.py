@@ -0,0 +1,171 @@
+import threading
+from datetime import UTC, datetime, timedelta
+from time import monotonic
+from typing import Iterable, NamedTuple, Optional
+
+import structlog
+
+from ..app import APP
+from ..models.asic import Asic, AsicStatus
+from .fleet_config import FLEET, AsicConfig, SampleSecs
+
+LOGGER = structlog.get_logger(__name__)
+
+# Default seconds between samples, by status; overridable per AsicProfile
+DEFAULT_SAMPLE_SECS = {
+    AsicStatus.transitioning: 5,
+    AsicStatus.hashing: 60,
+    AsicStatus.paused: 300,
+    AsicStatus.offline: 300,
+    AsicStatus.error: 300,
+}
+
+# How far ahead to look for an asic's next change of interval
+LOOK_AHEAD = timedelta(days=8)
+
+
+class _NextChange(NamedTuple):
+    config: AsicConfig  # As it was worked out for
+    at: datetime  # The next change of interval, or as far ahead as was looked
+    is_change: bool
+
+
+class CadenceService:
+    """
+    Decides which asics are due to be sampled, so each can be sampled at its
+    own pace: every few seconds while it is ramping up or down, or when its
+    schedule is about to change (or just changed) what it should be doing, and
+    much less often while it is paused or offline.
+
+    Also remembers when each asic was last sampled, which is the actual interval
+    a sample covers.
+    """
+
+    def __init__(
+        self,
+        boundary_secs: Optional[int] = None,
+        boundary_window: Optional[int] = None,
+    ) -> None:
+        self.boundary_secs = boundary_secs or int(
+            APP.config.get("SAMPLE_SECS_NEAR_BOUNDARY", 5)
+        )
+        self.boundary_window = timedelta(
+            seconds=boundary_window or int(APP.config.get("SAMPLE_BOUNDARY_WINDOW", 120))
+        )
+        self._last_sampled: dict[int, float] = {}
+        self._next_changes: dict[int, _NextChange] = {}
+        self._in_flight: set[int] = set()
+        self._lock = threading.Lock()
+
+    def sample_secs(self, asic: Asic, moment: Optional[datetime] = None) -> int:
+        """How often the asic should be sampled right now"""
+        secs = self._status_secs(asic)
+        if secs > self.boundary_secs and self.is_near_boundary(asic, moment):
+            return self.boundary_secs
+        return secs
+
+    def is_near_boundary(self, asic: Asic, moment: Optional[datetime] = None) -> bool:
+        """
+        Whether the asic's schedule changes interval within the window (either
+        way). Worked out from the fleet's compiled schedules, and remembered
+        until that change has passed, so most ticks it's just a lookup.
+        """
+        config = FLEET.config_of(asic)
+        if config is None or (config.schedule is None and config.override is None):
+            return False
+
+        moment = (moment or datetime.now(UTC)).astimezone(config.timezone)
+        since = moment - self.boundary_window
+        until = moment + self.boundary_window
+        with self._lock:
+            change = self._next_changes.get(asic.id)
+        if (
+            change is None
+            or change.config is not config
+            or change.at <= (since if change.is_change else until)
+        ):
+            change = self._next_change(config, since)
+            with self._lock:
+                self._next_changes[asic.id] = change
+        return change.is_change and change.at <= until
+
+    def due(
+        self,
+        asics: Iterable[Asic],
+        now: Optional[float] = None,
+        moment: Optional[datetime] = None,
+    ) -> list[Asic]:
+        """The asics whose next sample is due, and that aren't being sampled already"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            last_sampled = dict(self._last_sampled)
+            in_flight = set(self._in_flight)
+
+        due = []
+        for asic in asics:
+            if asic.id in in_flight:
+                continue
+            last = last_sampled.get(asic.id)
+            # Allow for the tick not lining up exactly with the cadence
+            elapsed = now - last + 1.0 if last is not None else None
+            # The schedule is only looked at when the status' cadence isn't due
+            if (
+                elapsed is None
+                or elapsed >= self._status_secs(asic)
+                or (elapsed >= self.boundary_secs and self.is_near_boundary(asic, moment))
+            ):
+                due.append(asic)
+        return due
+
+    def start(self, asic_ids: Iterable[int]) -> None:
+        """Record that the asics are being sampled, so they aren't due meanwhile"""
+        with self._lock:
+            self._in_flight.update(asic_ids)
+
+    def finish(self, asic_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._in_flight.difference_update(asic_ids)
+
+    def mark_sampled(self, asic: Asic, now: Optional[float] = None) -> int:
+        """Record that the asic was just sampled, returning the secs since the last
+        time (or its current cadence, the first time)"""
+        now = monotonic() if now is None else now
+        with self._lock:
+            last = self._last_sampled.get(asic.id)
+            self._last_sampled[asic.id] = now
+
+        if last is None:
+            return self.sample_secs(asic)
+        return max(1, round(now - last))
+
+    def forget(self, asic: Asic) -> None:
+        with self._lock:
+            self._last_sampled.pop(asic.id, None)
+            self._next_changes.pop(asic.id, None)
+
+    def _status_secs(self, asic: Asic) -> int:
+        status = AsicStatus.for_asic(asic)
+        # The fleet's snapshot has the profile's cadence, unless the asic changed
+        config = FLEET.config_of(asic)
+        sample_secs = (
+            config.sample_secs if config is not None else SampleSecs.of(asic.profile)
+        )
+        secs = sample_secs.for_status(status) or APP.config.get(
+            f"SAMPLE_SECS_{status.name.upper()}", DEFAULT_SAMPLE_SECS[status]
+        )
+        return int(secs)
+
+    @staticmethod
+    def _next_change(config: AsicConfig, since: datetime) -> _NextChange:
+        """The first change of interval after `since`, looking so far ahead"""
+        horizon = since + LOOK_AHEAD
+        current = config.interval_id_at(since)
+        at = since
+        while (next_at := config.next_change(at)) is not None and next_at < horizon:
+            at = next_at
+            if config.interval_id_at(at) != current:
+                return _NextChange(config, at, True)
+        return _NextChange(config, horizon, False)
+
+
+CADENCE = CadenceService()
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import AsyncIterator, Optional
+
+import structlog
+
+from ..app import APP
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class BreakerState(str, Enum):
+    closed = "closed"  # Calls go through
+    open = "open"  # Calls fail fast until the retry time
+    half_open = "half_open"  # One probe call is let through
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of talking to a miner whose breaker is open"""
+
+    def __init__(self, address: str, retry_in: float) -> None:
+        super().__init__(f"{address} is unreachable; retrying in {retry_in:.0f}s")
+        self.address = address
+        self.retry_in = retry_in
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    The breaker for one miner.
+
+    After `threshold` consecutive failures it opens, and calls fail fast. Once
+    the backoff has passed, a single probe is let through (half-open): if it
+    succeeds the breaker closes again, otherwise it re-opens with the backoff
+    doubled, up to `max_backoff`.
+    """
+
+    address: str
+    threshold: int
+    min_backoff: float
+    max_backoff: float
+    state: BreakerState = BreakerState.closed
+    failures: int = 0
+    backoff: float = 0.0
+    retry_at: float = 0.0  # monotonic
+
+    @property
+    def retry_in(self) -> Optional[float]:
+        """Secs until the next probe, while open"""
+        if self.state != BreakerState.open:
+            return None
+        return max(0.0, self.retry_at - monotonic())
+
+    def allow(self) -> bool:
+        if self.state == BreakerState.closed:
+            return True
+        if self.state == BreakerState.open and monotonic() >= self.retry_at:
+            LOGGER.debug("probing miner", address=self.address)
+            self.state = BreakerState.half_open
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != BreakerState.closed:
+            LOGGER.info("miner reachable again", address=self.address)
+        self.state = BreakerState.closed
+        self.failures = 0
+        self.backoff = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == BreakerState.half_open:
+            self.backoff = min(self.max_backoff, self.backoff * 2)
+        elif self.failures >= self.threshold:
+            self.backoff = self.min_backoff
+        else:
+            return
+
+        if self.state != BreakerState.open:
+            LOGGER.info("miner unreachable", address=self.address, backoff=self.backoff)
+        self.state = BreakerState.open
+        self.retry_at = monotonic() + self.backoff
+
+
+class BreakerRegistry:
+    """
+    The circuit breakers of every miner, keyed by address.
+
+    All miner I/O goes through `guard`, so that a miner that has stopped
+    answering costs nothing (rather than a full timeout) on each cycle until it
+    is probed again.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[int] = None,
+        min_backoff: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+    ) -> None:
+        self.threshold = threshold or int(APP.config.get("BREAKER_THRESHOLD", 2))
+        self.min_backoff = min_backoff or float(APP.config.get("BREAKER_MIN_BACKOFF", 30))
+        self.max_backoff = max_backoff or float(
+            APP.config.get("BREAKER_MAX_BACKOFF", 900)
+        )
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, address: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(address)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    address=address,
+                    threshold=self.threshold,
+                    min_backoff=self.min_backoff,
+                    max_backoff=self.max_backoff,
+                )
+                self._breakers[address] = breaker
+            return breaker
+
+    def state(self, address: str) -> BreakerState:
+        with self._lock:
+            breaker = self._breakers.get(address)
+        return breaker.state if breaker else BreakerState.closed
+
+    def reset(self, address: str) -> None:
+        with self._lock:
+            self._breakers.pop(address, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+    @asynccontextmanager
+    async def guard(self, address: str) -> AsyncIterator[CircuitBreaker]:
+        """
+        Run the block against the miner, unless its breaker is open, in which
+        case CircuitOpenError is raised without running it. Any exception in the
+        block, including being cancelled by a timeout, counts as a failure.
+        """
+        breaker = self.get(address)
+        with self._lock:
+            allowed = breaker.allow()
+        if not allowed:
+            raise CircuitOpenError(address, breaker.retry_in or 0.0)
+
+        try:
+            yield breaker
+        except (Exception, asyncio.CancelledError):
+            with self._lock:
+                breaker.record_failure()
+            raise
+        else:
+            with self._lock:
+                breaker.record_success()
+
+
+BREAKERS = BreakerRegistry()
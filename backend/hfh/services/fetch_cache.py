@@ -0,0 +1,96 @@
+import asyncio
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any, Awaitable, Callable, Generic, Hashable, Optional, TypeVar
+
+import structlog
+
+from ..app import APP
+
+LOGGER = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Cached(Generic[T]):
+    value: T
+    fetched_at: float = field(default_factory=monotonic)
+
+    @property
+    def age(self) -> float:
+        return monotonic() - self.fetched_at
+
+
+class FetchCache:
+    """
+    Coalesces and briefly caches fetches from the miners, for the endpoints that
+    just show what a miner reports.
+
+    - Concurrent callers for the same key share a single in-flight fetch.
+    - A result younger than `ttl` secs is served as-is.
+    - A result younger than `max_stale` secs is served immediately, while a
+      fresh one is fetched in the background (stale-while-revalidate).
+    - Anything older is fetched again, and the callers wait for it.
+
+    Failures are not cached. Only to be used from the background event loop.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_stale: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(APP.config.get("RAW_CACHE_TTL", 5))
+        self.max_stale = (
+            max_stale
+            if max_stale is not None
+            else float(APP.config.get("RAW_CACHE_MAX_STALE", 60))
+        )
+        self._entries: dict[Hashable, Cached[Any]] = {}
+        self._pending: dict[Hashable, asyncio.Task[Cached[Any]]] = {}
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> Cached[T]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.age < self.ttl:
+                return entry
+            if entry.age < self.max_stale:
+                self._refresh(key, fetch)
+                return entry
+
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _refresh(
+        self, key: Hashable, fetch: Callable[[], Awaitable[T]]
+    ) -> "asyncio.Task[Cached[T]]":
+        """The in-flight fetch for the key, starting one if there isn't one"""
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            task.add_done_callback(_retrieve_exception)
+            self._pending[key] = task
+        return task
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> Cached[T]:
+        try:
+            value = await fetch()
+            entry = Cached(value, fetched_at=monotonic())
+            self._entries[key] = entry
+            return entry
+        except Exception as ex:
+            LOGGER.info("fetch failed", key=key, ex=ex)
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+
+def _retrieve_exception(task: "asyncio.Task[Any]") -> None:
+    # A background refresh may fail with nobody waiting for it; it is logged
+    if not task.cancelled():
+        task.exception()
+
+
+RAW_CACHE = FetchCache()
@@ -0,0 +1,303 @@
+import threading
+from dataclasses import dataclass
+from datetime import UTC, datetime, tzinfo
+from functools import cached_property
+from itertools import chain
+from time import monotonic
+from typing import Any, Mapping, NamedTuple, Optional, Self
+
+import structlog
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from ..app import APP
+from ..db import DB, DbSession
+from ..models.asic import Asic, AsicStatus
+from ..models.asic_profile import AsicProfile
+from ..models.compiled_schedule import CompiledSchedule
+from ..models.hashing_interval import HashingInterval
+from ..models.hashing_schedule import HashingSchedule
+from ..models.performance_limit import PerformanceLimit
+from .invalidation_bus import BUS
+
+LOGGER = structlog.get_logger(__name__)
+
+# Changes to these mean the fleet's configuration has to be loaded again
+CONFIGURED_BY = (AsicProfile, HashingSchedule, HashingInterval, PerformanceLimit)
+CONFIGURED_BY_ASIC = ("name", "is_active", "profile_id", "override_interval_id")
+TOPIC = "fleet_config"
+
+
+class SampleSecs(NamedTuple):
+    """A profile's seconds between samples, by status; None for the default"""
+
+    transitioning: Optional[int] = None
+    hashing: Optional[int] = None
+    paused: Optional[int] = None
+    offline: Optional[int] = None  # In error too
+
+    @classmethod
+    def of(cls, profile: Optional[AsicProfile]) -> Self:
+        if profile is None:
+            return cls()
+        return cls(
+            profile.sample_secs_transitioning,
+            profile.sample_secs_hashing,
+            profile.sample_secs_paused,
+            profile.sample_secs_offline,
+        )
+
+    def for_status(self, status: AsicStatus) -> Optional[int]:
+        if status == AsicStatus.transitioning:
+            return self.transitioning
+        if status == AsicStatus.hashing:
+            return self.hashing
+        if status == AsicStatus.paused:
+            return self.paused
+        return self.offline
+
+
+@dataclass(frozen=True)
+class AsicConfig:
+    """
+    How an active asic is configured. The intervals in the compiled schedules
+    are stand-ins, not in any session, that only carry the intervals' columns.
+    """
+
+    id: int
+    name: str
+    profile_id: Optional[int]
+    override_interval_id: Optional[int]
+    timezone: tzinfo
+    schedule: Optional[CompiledSchedule]
+    override: Optional[CompiledSchedule]
+    sample_secs: SampleSecs = SampleSecs()
+
+    def matches(self, asic: Asic) -> bool:
+        """If the asic (which may have uncommitted changes) is as configured here"""
+        return (asic.id, asic.name, asic.profile_id, asic.override_interval_id) == (
+            self.id,
+            self.name,
+            self.profile_id,
+            self.override_interval_id,
+        )
+
+    def interval_id_at(
+        self,
+        moment: datetime,
+        temp: Optional[int] = None,
+        ignore_override: Optional[bool] = False,
+    ) -> Optional[int]:
+        """The id of the interval in effect: the override's, else the schedule's"""
+        if self.override and not ignore_override:
+            if interval := self.override.interval_at(moment, temp):
+                return interval.id
+        if self.schedule:
+            if interval := self.schedule.interval_at(moment, temp):
+                return interval.id
+        return None
+
+    @cached_property
+    def depends_on_temp(self) -> bool:
+        """If which interval is in effect can depend on the temperature"""
+        return any(
+            w.temp_min is not None or w.temp_max is not None
+            for compiled in (self.override, self.schedule)
+            if compiled
+            for w in compiled.windows
+        )
+
+    def next_change(self, moment: datetime) -> Optional[datetime]:
+        """When the schedule or override next could change, if there's either"""
+        return min(
+            (c.next_change(moment) for c in (self.override, self.schedule) if c),
+            default=None,
+        )
+
+
+@dataclass(frozen=True)
+class FleetConfig:
+    """An immutable snapshot of the active asics' configuration"""
+
+    version: int
+    loaded_at: float  # monotonic
+    asics: Mapping[str, AsicConfig]  # By name, in name order
+
+    @cached_property
+    def names(self) -> list[str]:
+        return list(self.asics)
+
+    @cached_property
+    def by_id(self) -> Mapping[int, AsicConfig]:
+        return {config.id: config for config in self.asics.values()}
+
+    @cached_property
+    def temp_dependent_ids(self) -> frozenset[int]:
+        return frozenset(c.id for c in self.asics.values() if c.depends_on_temp)
+
+    @classmethod
+    def load(cls, version: int, db_session: Optional[DbSession] = None) -> Self:
+        """
+        Reads the configuration as plain rows (in two queries), so nothing in
+        the snapshot belongs to a session, nor is expired by a commit
+        """
+        db_session = db_session or DB.session
+        with db_session.no_autoflush:
+            return cls._load(version, db_session)
+
+    @classmethod
+    def _load(cls, version: int, db_session: DbSession) -> Self:
+        asics = db_session.execute(
+            select(
+                Asic.id,
+                Asic.name,
+                Asic.profile_id,
+                Asic.override_interval_id,
+                AsicProfile.schedule_id,
+                AsicProfile.sample_secs_transitioning,
+                AsicProfile.sample_secs_hashing,
+                AsicProfile.sample_secs_paused,
+                AsicProfile.sample_secs_offline,
+                HashingSchedule.timezone_name,
+            )
+            .outerjoin(AsicProfile, AsicProfile.id == Asic.profile_id)
+            .outerjoin(HashingSchedule, HashingSchedule.id == AsicProfile.schedule_id)
+            .filter(Asic.is_active)
+            .order_by(Asic.name)
+        ).all()
+
+        schedule_ids = {a.schedule_id for a in asics if a.schedule_id is not None}
+        override_ids = {
+            a.override_interval_id for a in asics if a.override_interval_id is not None
+        }
+        rows = db_session.execute(
+            select(HashingInterval.__table__)
+            .filter(
+                or_(
+                    HashingInterval.schedule_id.in_(schedule_ids),
+                    HashingInterval.id.in_(override_ids),
+                )
+            )
+            .order_by(*HashingSchedule.intervals.property.order_by)
+        ).all()
+        intervals = [HashingInterval(**row._mapping) for row in rows]
+
+        schedules = {
+            schedule_id: CompiledSchedule(
+                [i for i in intervals if i.schedule_id == schedule_id]
+            )
+            for schedule_id in schedule_ids
+        }
+        overrides = {
+            i.id: CompiledSchedule([i]) for i in intervals if i.id in override_ids
+        }
+        configs = {
+            a.name: AsicConfig(
+                id=a.id,
+                name=a.name,
+                profile_id=a.profile_id,
+                override_interval_id=a.override_interval_id,
+                timezone=(
+                    HashingSchedule(timezone_name=a.timezone_name).timezone
+                    if a.schedule_id is not None
+                    else UTC
+                ),
+                schedule=schedules.get(a.schedule_id),
+                override=overrides.get(a.override_interval_id),
+                sample_secs=SampleSecs(
+                    a.sample_secs_transitioning,
+                    a.sample_secs_hashing,
+                    a.sample_secs_paused,
+                    a.sample_secs_offline,
+                ),
+            )
+            for a in asics
+        }
+        LOGGER.debug("loaded fleet config", version=version, asics=len(configs))
+        return cls(version=version, loaded_at=monotonic(), asics=configs)
+
+
+class FleetConfigCache:
+    """
+    Keeps a snapshot of the fleet's configuration (asics, their compiled
+    schedules, timezones and overrides), which changes rarely, rather than
+    reading it all again for every pass and request.
+
+    Committing changes to the configuration bumps the version, and the next
+    reader loads a fresh snapshot, which replaces the old one whole; other
+    processes hear of it through the invalidation bus. Snapshots also go stale
+    after `ttl_secs`, in case that's missed.
+    """
+
+    def __init__(self, ttl_secs: Optional[float] = None) -> None:
+        self.ttl_secs = ttl_secs or float(APP.config.get("FLEET_CONFIG_TTL_SECS", 60))
+        self._version = 0
+        self._snapshot: Optional[FleetConfig] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def current(self) -> FleetConfig:
+        snapshot = self._snapshot
+        if snapshot is None or self._is_stale(snapshot):
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or self._is_stale(snapshot):
+                    snapshot = FleetConfig.load(self._version)
+                    self._snapshot = snapshot
+        return snapshot
+
+    def config_of(self, asic: Asic) -> Optional[AsicConfig]:
+        """The asic's configuration, if the snapshot has it as the asic is now"""
+        if asic.id is None:
+            return None
+        config = self.current().by_id.get(asic.id)
+        return config if config is not None and config.matches(asic) else None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+
+    def _is_stale(self, snapshot: FleetConfig) -> bool:
+        return (
+            snapshot.version != self._version
+            or monotonic() - snapshot.loaded_at > self.ttl_secs
+        )
+
+
+FLEET = FleetConfigCache()
+BUS.subscribe(TOPIC, FLEET.invalidate)
+
+
+def _changes_config(obj: Any) -> bool:
+    if isinstance(obj, CONFIGURED_BY):
+        return True
+    if isinstance(obj, Asic):
+        attrs = inspect(obj).attrs
+        return any(attrs[name].history.has_changes() for name in CONFIGURED_BY_ASIC)
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _note_config_changes(session: Session, flush_context: Any) -> None:
+    added_or_removed = chain(session.new, session.deleted)
+    if any(isinstance(obj, (Asic, *CONFIGURED_BY)) for obj in added_or_removed) or any(
+        _changes_config(obj) for obj in session.dirty
+    ):
+        session.info["fleet_config_changed"] = True
+        BUS.publish(session, TOPIC)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop("fleet_config_changed", False):
+        FLEET.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_after_rollback(session: Session) -> None:
+    # A snapshot loaded in the meantime may have seen the flushed changes
+    if session.info.pop("fleet_config_changed", False):
+        FLEET.invalidate()
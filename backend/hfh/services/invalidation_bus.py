@@ -0,0 +1,158 @@
+import json
+import select
+import threading
+from collections import defaultdict
+from typing import Callable, Optional
+from uuid import uuid4
+
+import structlog
+from sqlalchemy import Engine, event, text
+from sqlalchemy.orm import Session
+
+from ..app import APP
+from ..db import DB
+
+LOGGER = structlog.get_logger(__name__)
+
+Handler = Callable[[], None]
+
+
+class InvalidationBus:
+    """
+    Tells the other processes (API workers, the scheduler) sharing the
+    database that something they may have cached has changed, using postgres
+    LISTEN/NOTIFY, so there's nothing else to run.
+
+    A change is published on a topic (e.g. "fleet_config") from within the
+    transaction that makes it, so it is heard of only if and when that commits.
+    Each process listens in a thread of its own and calls the handlers
+    subscribed to the topic; its own changes are left to its own commit hooks.
+    Having (re)connected, every handler is called, as changes may have been
+    missed meanwhile.
+
+    Without postgres (e.g. sqlite in tests) publishing and listening do nothing.
+    """
+
+    def __init__(
+        self,
+        channel: Optional[str] = None,
+        poll_secs: Optional[float] = None,
+        reconnect_secs: Optional[float] = None,
+    ) -> None:
+        self.channel = channel or APP.config.get(
+            "INVALIDATION_CHANNEL", "hfh_invalidation"
+        )
+        self.poll_secs = poll_secs or float(APP.config.get("INVALIDATION_POLL_SECS", 5))
+        self.reconnect_secs = reconnect_secs or float(
+            APP.config.get("INVALIDATION_RECONNECT_SECS", 5)
+        )
+        self.origin = uuid4().hex
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers[topic].append(handler)
+
+    def publish(self, session: Session, topic: str) -> None:
+        """Publish the topic when (if) the session's transaction commits"""
+        if session.get_bind().dialect.name != "postgresql":
+            return
+
+        published = session.info.setdefault("published_topics", set())
+        if topic in published:
+            return
+        published.add(topic)
+
+        payload = json.dumps({"topic": topic, "origin": self.origin})
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": self.channel, "payload": payload},
+        )
+
+    def dispatch(self, payload: str) -> None:
+        """Call the handlers of a topic heard from another process"""
+        try:
+            message = json.loads(payload)
+            topic, origin = message["topic"], message["origin"]
+        except (ValueError, TypeError, KeyError):
+            LOGGER.warning("ignoring invalidation", payload=payload)
+            return
+
+        if origin == self.origin:
+            return
+        LOGGER.debug("heard invalidation", topic=topic)
+        self._call(self._handlers.get(topic, []))
+
+    def invalidate_all(self) -> None:
+        self._call([h for handlers in self._handlers.values() for h in handlers])
+
+    def start(self) -> bool:
+        """Start listening, in a thread, if the database is postgres"""
+        with APP.app_context():
+            engine = DB.engine
+        if engine.dialect.name != "postgresql":
+            LOGGER.info("not listening for invalidations", dialect=engine.dialect.name)
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return True
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(engine,), name="invalidation-bus", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_secs + 1)
+            self._thread = None
+
+    def _listen(self, engine: Engine) -> None:
+        from psycopg2.extensions import quote_ident
+
+        while not self._stop.is_set():
+            connection = None
+            try:
+                # Detached from the pool, as it's kept for as long as we listen
+                connection = engine.raw_connection()
+                connection.detach()
+                conn = connection.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {quote_ident(self.channel, conn)}")
+                LOGGER.info("listening for invalidations", channel=self.channel)
+                self.invalidate_all()
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_secs) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(conn.notifies.pop(0).payload)
+            except Exception as ex:
+                LOGGER.exception("invalidation listener failed", exception=ex)
+                self._stop.wait(self.reconnect_secs)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    @staticmethod
+    def _call(handlers: list[Handler]) -> None:
+        for handler in handlers:
+            try:
+                handler()
+            except Exception as ex:
+                LOGGER.exception("invalidation handler failed", exception=ex)
+
+
+BUS = InvalidationBus()
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_published(session: Session) -> None:
+    # Published again in the next transaction, as a rollback drops them
+    session.info.pop("published_topics", None)
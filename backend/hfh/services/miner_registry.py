@@ -0,0 +1,195 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Iterable, Optional
+
+import pyasic
+import structlog
+from pyasic.miners.miner_factory import MINER_CLASSES, miner_factory
+from pyasic.miners.unknown import UnknownMiner
+
+from ..app import APP
+
+LOGGER = structlog.get_logger(__name__)
+
+
+@dataclass
+class _Entry:
+    miner: pyasic.AnyMiner
+    password: Optional[str]
+    from_hint: bool = False
+    created_at: float = field(default_factory=monotonic)
+
+
+def miner_class_name(cls: type[pyasic.AnyMiner]) -> str:
+    """
+    The driver class's full name: pyasic has different classes by the same
+    name (e.g. two `BOSMinerS19jPro`s)
+    """
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _miner_classes() -> dict[str, type[pyasic.AnyMiner]]:
+    """Every concrete pyasic driver class, by `miner_class_name`"""
+    return {
+        miner_class_name(cls): cls
+        for classes in MINER_CLASSES.values()
+        for cls in classes.values()
+    }
+
+
+class MinerRegistry:
+    """
+    Process-wide registry of pyasic drivers, keyed by address.
+
+    Discovering the driver (`pyasic.get_miner`) is the slowest thing pyasic does,
+    so it is done once per address and the result shared by every request and
+    scheduled job, until either:
+
+    - the entry is older than `ttl` secs (so firmware changes are picked up)
+    - the address or password used to reach it changes
+    - it is explicitly invalidated, e.g. because the miner went offline
+
+    When the caller already knows the driver class (`miner_class`, as persisted
+    on the asic from an earlier discovery) the driver is built directly without
+    talking to the miner. If a driver built that way is later invalidated, the
+    hint is distrusted and the next lookup goes through discovery again.
+
+    pyasic keeps its own never-expiring cache of detected miners; it is cleared
+    along with ours so that a rediscovery really does go back to the miner.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = ttl
+        self._entries: dict[str, _Entry] = {}
+        self._pending: dict[str, asyncio.Task[Optional[pyasic.AnyMiner]]] = {}
+        self._distrusted: set[str] = set()
+        self._classes: Optional[dict[str, type[pyasic.AnyMiner]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _ttl(self) -> float:
+        if self.ttl is not None:
+            return self.ttl
+        return float(APP.config.get("MINER_DRIVER_TTL", 3600))
+
+    async def get(
+        self,
+        address: str,
+        password: Optional[str] = None,
+        miner_class: Optional[str] = None,
+    ) -> Optional[pyasic.AnyMiner]:
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry and monotonic() - entry.created_at > self._ttl:
+                LOGGER.debug("miner driver expired", address=address)
+                entry = None
+                self._forget(address)
+
+        if entry is None:
+            entry = self._from_hint(address, miner_class)
+
+        if entry is None:
+            miner = await self._discover(address)
+            if miner is None or isinstance(miner, UnknownMiner):
+                # Not worth keeping; try again next time
+                return miner
+            entry = _Entry(miner=miner, password=None)
+            with self._lock:
+                self._entries[address] = entry
+                self._distrusted.discard(address)
+
+        if entry.password != password:
+            if password:
+                entry.miner.pwd = password
+            entry.password = password
+
+        return entry.miner
+
+    def invalidate(self, address: str, distrust_hint: bool = False) -> None:
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry:
+                LOGGER.info("invalidating miner driver", address=address)
+                if entry.from_hint:
+                    distrust_hint = True
+            if distrust_hint:
+                self._distrusted.add(address)
+            self._forget(address)
+
+    def clear(self) -> None:
+        with self._lock:
+            for address in list(self._entries):
+                self._forget(address)
+
+    async def warm_up(
+        self, miners: Iterable[tuple[str, Optional[str], Optional[str]]]
+    ) -> None:
+        """
+        Get the drivers for all the given (address, password, miner_class) ready,
+        discovering them in parallel where needed
+        """
+        miners = list(miners)
+        LOGGER.info("warming up miner drivers", count=len(miners))
+        results = await asyncio.gather(
+            *(self.get(*miner) for miner in miners),
+            return_exceptions=True,
+        )
+        for (address, _, _), result in zip(miners, results, strict=True):
+            if result is None or isinstance(result, BaseException):
+                LOGGER.warning("could not discover miner", address=address, ex=result)
+
+    def _from_hint(self, address: str, miner_class: Optional[str]) -> Optional[_Entry]:
+        if not miner_class or address in self._distrusted:
+            return None
+
+        if self._classes is None:
+            self._classes = _miner_classes()
+        cls = self._classes.get(miner_class)
+        if cls is None:
+            LOGGER.info("unknown miner class", address=address, miner_class=miner_class)
+            return None
+
+        entry = _Entry(miner=cls(address), password=None, from_hint=True)
+        with self._lock:
+            self._entries[address] = entry
+        return entry
+
+    def _forget(self, address: str) -> None:
+        self._entries.pop(address, None)
+        miner_factory.cache.pop(address, None)
+
+    async def _discover(self, address: str) -> Optional[pyasic.AnyMiner]:
+        # Concurrent callers on the same loop share a single discovery
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._pending.get(address)
+            if task is None or task.get_loop() is not loop:
+                task = loop.create_task(self._detect(address))
+                self._pending[address] = task
+                task.add_done_callback(lambda t: self._discovered(address, t))
+        return await asyncio.shield(task)
+
+    def _discovered(
+        self, address: str, task: asyncio.Task[Optional[pyasic.AnyMiner]]
+    ) -> None:
+        with self._lock:
+            if self._pending.get(address) is task:
+                del self._pending[address]
+
+    async def _detect(self, address: str) -> Optional[pyasic.AnyMiner]:
+        LOGGER.info("discovering miner driver", address=address)
+        miner_factory.cache.pop(address, None)
+        started = monotonic()
+        miner: Optional[pyasic.AnyMiner] = await pyasic.get_miner(address)
+        LOGGER.info(
+            "discovered miner driver",
+            address=address,
+            miner=repr(miner),
+            elapsed=round(monotonic() - started, 3),
+        )
+        return miner
+
+
+MINERS = MinerRegistry()
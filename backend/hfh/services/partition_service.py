@@ -0,0 +1,132 @@
+import re
+from datetime import date, datetime
+from typing import Optional
+
+import structlog
+from sqlalchemy import text
+
+from ..app import APP
+from ..db import DB, DbSession
+
+LOGGER = structlog.get_logger(__name__)
+
+PARENT_TABLE = "performance_samples"
+PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """The month a partition holds, or None if it isn't one of ours"""
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+class PartitionService:
+    """
+    Looks after the monthly partitions of performance_samples (see the
+    "partition performance_samples by month" migration): creates them ahead of
+    time, so there is always one for the samples coming in, and drops whole
+    partitions once they are past the retention period.
+
+    Retention is SAMPLE_RETENTION_MONTHS full months before the current one;
+    0 (the default) keeps everything. Only postgres is partitioned; elsewhere
+    (e.g. sqlite in tests) this does nothing.
+    """
+
+    def __init__(
+        self,
+        months_ahead: Optional[int] = None,
+        retention_months: Optional[int] = None,
+        db_session: Optional[DbSession] = None,
+    ) -> None:
+        self.months_ahead = (
+            months_ahead
+            if months_ahead is not None
+            else int(APP.config.get("SAMPLE_PARTITION_MONTHS_AHEAD", 3))
+        )
+        self.retention_months = (
+            retention_months
+            if retention_months is not None
+            else int(APP.config.get("SAMPLE_RETENTION_MONTHS", 0))
+        )
+        self.db_session = db_session or DB.session
+
+    @property
+    def is_partitioned(self) -> bool:
+        return self.db_session.get_bind().dialect.name == "postgresql"
+
+    def maintain(self, now: Optional[datetime] = None) -> None:
+        if not self.is_partitioned:
+            return
+
+        now = now or datetime.now()
+        try:
+            self.ensure_partitions(now)
+            self.drop_expired(now)
+            self.db_session.commit()
+        except Exception:
+            self.db_session.rollback()
+            raise
+
+    def months_to_create(self, now: datetime) -> list[date]:
+        current = month_start(now)
+        return [add_months(current, n) for n in range(self.months_ahead + 1)]
+
+    def expires_before(self, now: datetime) -> Optional[date]:
+        """Partitions of months before this one are past retention"""
+        if self.retention_months <= 0:
+            return None
+        return add_months(month_start(now), -self.retention_months)
+
+    def ensure_partitions(self, now: datetime) -> None:
+        for month in self.months_to_create(now):
+            self.db_session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                    f"PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') "
+                    f"TO ('{add_months(month, 1).isoformat()}')"
+                )
+            )
+
+    def drop_expired(self, now: datetime) -> list[str]:
+        expires_before = self.expires_before(now)
+        if expires_before is None:
+            return []
+
+        expired = [
+            name
+            for name in self.partitions()
+            if (month := partition_month(name)) is not None and month < expires_before
+        ]
+        for name in expired:
+            LOGGER.info("dropping expired sample partition", partition=name)
+            self.db_session.execute(text(f"DROP TABLE {name}"))
+        return expired
+
+    def partitions(self) -> list[str]:
+        stmt = text(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :parent
+            ORDER BY child.relname
+            """
+        )
+        return list(self.db_session.scalars(stmt, {"parent": PARENT_TABLE}))
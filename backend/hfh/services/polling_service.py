@@ -0,0 +1,221 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+from enum import Enum
+from time import monotonic
+from typing import Any, Awaitable, Callable, Generic, Iterable, Optional, TypeVar
+
+import structlog
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+
+from ..app import APP
+from ..db import DB
+from ..models.asic import Asic
+
+LOGGER = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class PollOutcome(str, Enum):
+    ok = "ok"
+    failed = "failed"
+    timeout = "timeout"
+    skipped = "skipped"  # Not started / cancelled before the cycle deadline
+
+
+@dataclass
+class PollResult(Generic[T]):
+    asic: Asic
+    outcome: PollOutcome
+    value: Optional[T] = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0  # secs
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == PollOutcome.ok
+
+
+@dataclass
+class PollingService:
+    """
+    Runs a job against many asics concurrently.
+
+    - `concurrency` limits how many miners are being talked to at once
+    - `miner_timeout` bounds the time spent on any single miner
+    - `cycle_deadline` bounds the whole cycle; miners not finished by then are
+      cancelled and reported as skipped
+
+    The optional `on_result` callback is invoked as soon as each miner finishes,
+    without yielding to the event loop, e.g. to hand its result on before the
+    rest are done. The jobs share the caller's session, so committing is left
+    until they are all done (see `commit_polled`).
+    """
+
+    concurrency: int = field(
+        default_factory=lambda: int(APP.config.get("POLL_CONCURRENCY", 16))
+    )
+    miner_timeout: float = field(
+        default_factory=lambda: float(APP.config.get("POLL_MINER_TIMEOUT", 15))
+    )
+    cycle_deadline: float = field(
+        default_factory=lambda: float(APP.config.get("POLL_CYCLE_DEADLINE", 50))
+    )
+
+    async def poll(
+        self,
+        asics: Iterable[Asic],
+        job: Callable[[Asic], Awaitable[T]],
+        *,
+        on_result: Optional[Callable[[PollResult[T]], Any]] = None,
+    ) -> list[PollResult[T]]:
+        asics = list(asics)
+        if not asics:
+            return []
+
+        started = monotonic()
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def poll_one(asic: Asic) -> PollResult[T]:
+            async with semaphore:
+                t0 = monotonic()
+                try:
+                    value = await asyncio.wait_for(job(asic), timeout=self.miner_timeout)
+                    result = PollResult(asic, PollOutcome.ok, value=value)
+                except TimeoutError as ex:
+                    result = PollResult(asic, PollOutcome.timeout, error=ex)
+                except Exception as ex:
+                    result = PollResult(asic, PollOutcome.failed, error=ex)
+                result.elapsed = monotonic() - t0
+
+            self._report(result, on_result)
+            return result
+
+        tasks = {asyncio.create_task(poll_one(asic)): asic for asic in asics}
+        done, pending = await asyncio.wait(tasks, timeout=self.cycle_deadline)
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+        results: list[PollResult[T]] = []
+        for task, asic in tasks.items():
+            if task in done:
+                results.append(task.result())
+            else:
+                result = PollResult[T](asic, PollOutcome.skipped)
+                self._report(result, on_result)
+                results.append(result)
+
+        LOGGER.info(
+            "polled asics",
+            count=len(results),
+            ok=sum(1 for r in results if r.outcome == PollOutcome.ok),
+            failed=sum(1 for r in results if r.outcome == PollOutcome.failed),
+            timeout=sum(1 for r in results if r.outcome == PollOutcome.timeout),
+            skipped=sum(1 for r in results if r.outcome == PollOutcome.skipped),
+            elapsed=round(monotonic() - started, 3),
+        )
+        return results
+
+    def _report(
+        self,
+        result: PollResult[T],
+        on_result: Optional[Callable[[PollResult[T]], Any]],
+    ) -> None:
+        if result.outcome != PollOutcome.ok:
+            LOGGER.warning(
+                "asic poll did not complete",
+                asic=result.asic.name,
+                outcome=result.outcome,
+                error=repr(result.error) if result.error else None,
+                elapsed=round(result.elapsed, 3),
+            )
+        if on_result is None:
+            return
+        try:
+            on_result(result)
+        except Exception as ex:
+            LOGGER.exception(
+                "asic poll result handler failed",
+                asic=result.asic.name,
+                exception=ex,
+            )
+
+
+def commit_polled(results: list[PollResult[Any]]) -> None:
+    """
+    Commits what a cycle's polls changed, once they are all done.
+
+    The polls share one session, so each asic's changes (the asic itself, and
+    what was added for it, e.g. its transitions) are saved in a savepoint of their
+    own: one asic's failing to save rolls back only its changes, which the next
+    cycle reads from its miner again. What a poll changes is complete in itself
+    (e.g. a status is only updated once it has been read in full), so a failed
+    poll's changes are kept along with the rest.
+    """
+    session = DB.session()
+    # A savepoint flushes whatever is pending before it starts, so everything is
+    # taken out of the session first, then put back one asic at a time
+    changes = _take_changes(session)
+    for result in results:
+        if (asic_changes := changes.pop(result.asic.id, None)) is None:
+            continue
+        name = result.asic.name
+        try:
+            with session.begin_nested():
+                asic_changes.put_back(session)
+        except Exception as ex:
+            LOGGER.exception("Failed to save polled asic", asic=name, exception=ex)
+
+    # Anything else changed while polling goes in with the commit
+    for other_changes in changes.values():
+        other_changes.put_back(session)
+    try:
+        session.commit()
+    except Exception as ex:
+        LOGGER.exception(
+            "Failed to commit polled asics",
+            count=len(results),
+            failed=[r.asic.name for r in results if not r.ok],
+            exception=ex,
+        )
+        session.rollback()
+
+
+@dataclass
+class _Changes:
+    """Changes taken out of a session, as they were, to be put back later"""
+
+    added: list[Any] = field(default_factory=list)
+    modified: list[tuple[Any, list[str]]] = field(default_factory=list)
+
+    def take(self, session: Session, obj: Any) -> None:
+        if obj in session.new:
+            session.expunge(obj)
+            self.added.append(obj)
+            return
+        # Kept as they are, but no longer to be flushed
+        keys = [attr.key for attr in inspect(obj).attrs if attr.history.has_changes()]
+        for key in keys:
+            set_committed_value(obj, key, getattr(obj, key))
+        self.modified.append((obj, keys))
+
+    def put_back(self, session: Session) -> None:
+        session.add_all(self.added)
+        for obj, keys in self.modified:
+            for key in keys:
+                flag_modified(obj, key)
+
+
+def _take_changes(session: Session) -> dict[Optional[int], _Changes]:
+    """The session's new and changed objects, by the id of the asic they are of"""
+    changes: dict[Optional[int], _Changes] = defaultdict(_Changes)
+    for obj in (*session.new, *session.dirty):
+        asic_id = obj.id if isinstance(obj, Asic) else getattr(obj, "asic_id", None)
+        changes[asic_id].take(session, obj)
+    return changes
@@ -0,0 +1,168 @@
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Mapping, Optional
+
+import structlog
+from sqlalchemy import case, select
+
+from ..db import DB, DbSession
+from ..models.asic_rollup import AsicRollup, RollupPeriod
+from ..models.performance_sample import PerformanceSample
+from ..models.tariff import Tariff
+from ..utils.bulk import bulk_upsert
+
+LOGGER = structlog.get_logger(__name__)
+
+# W * secs --> Wh
+WH_PER_WATT_SEC = Decimal(1) / Decimal(3600)
+
+RollupKey = tuple[int, RollupPeriod, datetime]
+
+
+@dataclass
+class RollupTotals:
+    """What a batch of samples adds to one rollup"""
+
+    samples: int = 0
+    sampled_secs: int = 0
+    hashing_secs: int = 0
+    paused_secs: int = 0
+    offline_secs: int = 0
+    energy_wh: Decimal = Decimal(0)
+    cost_micro: int = 0
+    hash_rate_secs: int = 0
+    hash_rate_max: int = 0
+    temp_secs: int = 0
+    env_temp_secs: int = 0
+
+    def add(self, sample: Mapping[str, Any]) -> None:
+        """
+        Add a sample (the columns of performance_samples, with the tariff's
+        price_micro_per_kwh). A sample with is_online false stands for an
+        offline asic, of which only the interval_secs is used.
+        """
+        secs = sample["interval_secs"]
+        if not sample["is_online"]:
+            self.offline_secs += secs
+            return
+
+        self.samples += 1
+        self.sampled_secs += secs
+        if sample["is_hashing"]:
+            self.hashing_secs += secs
+        else:
+            self.paused_secs += secs
+
+        watt_secs = sample["power"] * secs
+        self.energy_wh += watt_secs * WH_PER_WATT_SEC
+        self.cost_micro += (
+            watt_secs * (sample["price_micro_per_kwh"] or 0)
+        ) // PerformanceSample.WATT_SECS_PER_KWH
+        self.hash_rate_secs += sample["hash_rate"] * secs
+        self.hash_rate_max = max(self.hash_rate_max, sample["hash_rate"])
+        self.temp_secs += sample["temp"] * secs
+        self.env_temp_secs += sample["env_temp"] * secs
+
+
+def accumulate(samples: Iterable[Mapping[str, Any]]) -> dict[RollupKey, RollupTotals]:
+    """The totals of the samples, by asic and hourly / daily period"""
+    totals: dict[RollupKey, RollupTotals] = {}
+    for sample in samples:
+        for period in RollupPeriod:
+            key = (sample["asic_id"], period, period.start_of(sample["timestamp"]))
+            if key not in totals:
+                totals[key] = RollupTotals()
+            totals[key].add(sample)
+    return totals
+
+
+def _rollup_rows(
+    totals: dict[RollupKey, RollupTotals], exclude: tuple[str, ...] = ()
+) -> list[dict[str, Any]]:
+    rows = []
+    for (asic_id, period, period_start), total in totals.items():
+        row = dict(asic_id=asic_id, period=period.value, period_start=period_start)
+        row.update((k, v) for k, v in asdict(total).items() if k not in exclude)
+        rows.append(row)
+    return rows
+
+
+def _add_to_existing(excluded: Any) -> dict[str, Any]:
+    """Adds to the totals already there, rather than replacing them"""
+    rollup = AsicRollup.__table__.c
+    values: dict[str, Any] = {
+        name: rollup[name] + excluded[name]
+        for name in RollupTotals.__dataclass_fields__
+        if name != "hash_rate_max"
+    }
+    values["hash_rate_max"] = case(
+        (excluded.hash_rate_max > rollup.hash_rate_max, excluded.hash_rate_max),
+        else_=rollup.hash_rate_max,
+    )
+    return values
+
+
+class RollupService:
+    KEY = ["asic_id", "period", "period_start"]
+
+    def __init__(self, db_session: Optional[DbSession] = None) -> None:
+        self.db_session = db_session or DB.session
+
+    def record(self, samples: Iterable[Mapping[str, Any]]) -> None:
+        """Add newly written samples to their rollups. Does not commit."""
+        rows = _rollup_rows(accumulate(samples))
+        bulk_upsert(
+            self.db_session,
+            AsicRollup.__table__,
+            rows,
+            key=self.KEY,
+            on_update=_add_to_existing,
+        )
+
+    def backfill(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        batch_size: int = 10000,
+    ) -> int:
+        """
+        Re-derive the rollups from the samples from [since, until), one asic at
+        a time, committing as it goes; since and until should be on day
+        boundaries. The rollups of periods with no samples are left alone, as
+        is the offline time, which the samples don't record. Returns the number
+        of rollups written.
+        """
+        asic_ids = select(PerformanceSample.asic_id).distinct()
+        asic_ids = self._in_range(asic_ids, since, until)
+
+        written = 0
+        for asic_id in list(self.db_session.scalars(asic_ids)):
+            stmt = (
+                select(*PerformanceSample.__table__.c, Tariff.price_micro_per_kwh)
+                .outerjoin(Tariff, Tariff.id == PerformanceSample.tariff_id)
+                .filter(PerformanceSample.asic_id == asic_id)
+            )
+            stmt = self._in_range(stmt, since, until)
+            samples = (
+                row._mapping
+                for row in self.db_session.execute(
+                    stmt, execution_options={"yield_per": batch_size}
+                )
+            )
+
+            rows = _rollup_rows(accumulate(samples), exclude=("offline_secs",))
+            bulk_upsert(self.db_session, AsicRollup.__table__, rows, key=self.KEY)
+            self.db_session.commit()
+
+            LOGGER.info("backfilled rollups", asic_id=asic_id, rollups=len(rows))
+            written += len(rows)
+        return written
+
+    @staticmethod
+    def _in_range(stmt: Any, since: Optional[datetime], until: Optional[datetime]) -> Any:
+        if since is not None:
+            stmt = stmt.filter(PerformanceSample.timestamp >= since)
+        if until is not None:
+            stmt = stmt.filter(PerformanceSample.timestamp < until)
+        return stmt
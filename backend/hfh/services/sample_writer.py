@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import threading
+from typing import Optional, Sequence
+
+import structlog
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from ..app import APP
+from ..db import DB
+from .sampling_service import AsicReading, write_readings
+
+LOGGER = structlog.get_logger(__name__)
+
+
+class SampleWriter:
+    """
+    Write-behind queue between the sampling cycle and the database.
+
+    The sampling cycle `submit`s its readings and moves on; a background thread
+    drains the queue and writes them to the database in batches. If the database
+    can't be reached (or the queue is full) the readings are appended to a local
+    spool file instead, and replayed in order, ahead of anything newer, once the
+    database is back. A batch the database refuses outright is retried a
+    reading at a time, and just the readings it still refuses are set aside in
+    a rejected file.
+
+    Until `start` is called (e.g. in the repl or in tests) `submit` writes
+    synchronously, in the caller's app context.
+    """
+
+    def __init__(
+        self,
+        spool_path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        retry_secs: Optional[float] = None,
+    ) -> None:
+        self.spool_path = spool_path or APP.config.get(
+            "SAMPLE_SPOOL_PATH", os.path.join(APP.instance_path, "sample_spool.jsonl")
+        )
+        self.batch_size = batch_size or int(APP.config.get("SAMPLE_BATCH_SIZE", 1000))
+        self.retry_secs = retry_secs or float(APP.config.get("SAMPLE_RETRY_SECS", 15))
+        self._queue: queue.Queue[list[AsicReading]] = queue.Queue(
+            maxsize=max_queued or int(APP.config.get("SAMPLE_MAX_QUEUED", 100))
+        )
+        self._spool_lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def replaying_path(self) -> str:
+        return f"{self.spool_path}.replaying"
+
+    @property
+    def rejected_path(self) -> str:
+        return f"{self.spool_path}.rejected"
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="hfh-sample-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def submit(self, readings: Sequence[AsicReading]) -> None:
+        if not readings:
+            return
+
+        self._queue_or_spool(list(readings))
+        if not self.is_running:
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Write out the spool and everything queued, in the calling thread.
+        Returns False if the database could not be reached.
+        """
+        ok = self._replay_spool()
+        while ok and (batch := self._drain()):
+            ok = self._write(batch)
+        if not ok:
+            self._spool_queued()
+        return ok
+
+    def _run(self) -> None:
+        LOGGER.info("sample writer started", spool=self.spool_path)
+        while not self._stopping.is_set():
+            try:
+                batch = self._queue.get(timeout=1)
+            except queue.Empty:
+                batch = []
+
+            with APP.app_context():
+                if not self._replay_spool():
+                    self._spool(batch)
+                    self._spool_queued()
+                    self._stopping.wait(self.retry_secs)
+                    continue
+
+                batch += self._drain()
+                if batch and not self._write(batch):
+                    self._stopping.wait(self.retry_secs)
+
+        with APP.app_context():
+            self.flush()
+        LOGGER.info("sample writer stopped")
+
+    def _queue_or_spool(self, readings: list[AsicReading]) -> None:
+        try:
+            self._queue.put_nowait(readings)
+        except queue.Full:
+            LOGGER.warning("sample queue full, spooling", count=len(readings))
+            self._spool(readings)
+
+    def _drain(self) -> list[AsicReading]:
+        """Take queued readings, up to a batch"""
+        readings: list[AsicReading] = []
+        while len(readings) < self.batch_size:
+            try:
+                readings += self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return readings
+
+    def _spool_queued(self) -> None:
+        """Spool everything queued, e.g. while the database can't be reached"""
+        while batch := self._drain():
+            self._spool(batch)
+
+    def _write(self, readings: list[AsicReading]) -> bool:
+        """Write readings, spooling them if the database is unreachable"""
+        try:
+            self._write_to_db(readings)
+        except (OperationalError, InterfaceError) as ex:
+            LOGGER.warning("database unavailable, spooling", count=len(readings), ex=ex)
+            self._spool(readings)
+            return False
+        except Exception as ex:
+            LOGGER.exception("Failed to write samples", count=len(readings), exception=ex)
+            written = self._write_each(readings)
+            if written < len(readings):
+                self._spool(readings[written:])
+                return False
+        return True
+
+    def _write_each(self, readings: list[AsicReading]) -> int:
+        """
+        Write the readings one at a time, so that any the database refuses are
+        set aside without taking the rest of their batch with them. Returns how
+        many were dealt with: fewer than all if the database became unreachable.
+        """
+        for n, reading in enumerate(readings):
+            try:
+                self._write_to_db([reading])
+            except (OperationalError, InterfaceError) as ex:
+                LOGGER.warning("database unavailable", ex=ex)
+                return n
+            except Exception as ex:
+                LOGGER.exception(
+                    "Failed to write sample", asic_id=reading.asic_id, exception=ex
+                )
+                self._reject([reading])
+        return len(readings)
+
+    def _write_to_db(self, readings: list[AsicReading]) -> None:
+        try:
+            for start in range(0, len(readings), self.batch_size):
+                write_readings(readings[start : start + self.batch_size])
+            DB.session.commit()
+        except Exception:
+            DB.session.rollback()
+            raise
+
+    def _spool(self, readings: list[AsicReading]) -> None:
+        self._append(self.spool_path, readings)
+
+    def _reject(self, readings: list[AsicReading]) -> None:
+        """Set aside readings the database refuses, to be looked into"""
+        if readings:
+            LOGGER.error("rejected samples", count=len(readings), path=self.rejected_path)
+        self._append(self.rejected_path, readings)
+
+    def _append(self, path: str, readings: list[AsicReading]) -> None:
+        if not readings:
+            return
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a") as f:
+                for reading in readings:
+                    f.write(json.dumps(reading.to_json()) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _replay_spool(self) -> bool:
+        """
+        Write out whatever was spooled, oldest first. Returns False if the
+        database still can't be reached, in which case the spool is kept.
+        """
+        with self._spool_lock:
+            while True:
+                if not os.path.exists(self.replaying_path):
+                    if not os.path.exists(self.spool_path):
+                        return True
+                    # Anything spooled from now on goes to a new file, after this one
+                    os.replace(self.spool_path, self.replaying_path)
+
+                with open(self.replaying_path) as f:
+                    readings = [AsicReading.from_json(json.loads(line)) for line in f]
+
+                LOGGER.info("replaying spooled samples", count=len(readings))
+                try:
+                    self._write_to_db(readings)
+                except (OperationalError, InterfaceError) as ex:
+                    LOGGER.warning("database still unavailable", ex=ex)
+                    return False
+                except Exception as ex:
+                    LOGGER.exception("Failed to replay spooled samples", exception=ex)
+                    written = self._write_each(readings)
+                    if written < len(readings):
+                        # Keep just what's left to replay
+                        remaining = f"{self.replaying_path}.remaining"
+                        if os.path.exists(remaining):
+                            os.remove(remaining)
+                        self._append(remaining, readings[written:])
+                        os.replace(remaining, self.replaying_path)
+                        return False
+
+                os.remove(self.replaying_path)
+
+
+WRITER = SampleWriter()
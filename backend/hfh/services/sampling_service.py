@@ -1,42 +1,450 @@
-from datetime import datetime, timedelta
+import asyncio
+from dataclasses import asdict, dataclass
+from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional, Self, Sequence
 
 import structlog
+from sqlalchemy import case, insert, select
 
-from ..db import DB
-from ..models.asic import Asic
+from ..app import APP
+from ..db import DB, DbSession
+from ..models.asic import Asic, AsicStatus
+from ..models.asic_current_state import AsicCurrentState
+from ..models.asic_transition import AsicTransition, TransitionKind
 from ..models.hashing_interval import HashingInterval
 from ..models.performance_sample import PerformanceSample
-from .asic_service import get_asic_data, update_status
+from ..models.tariff import Tariff
+from ..utils.bulk import bulk_update_by_id, bulk_upsert
+from .asic_service import MinerSnapshot, get_asic_snapshot
+from .cadence_service import CADENCE, CadenceService
+from .polling_service import PollingService, PollResult
+from .rollup_service import RollupService
 from .schedule_service import ScheduleService
 
+if TYPE_CHECKING:
+    from .sample_writer import SampleWriter
+
 LOGGER = structlog.get_logger(__name__)
 
+# The batches of due asics being sampled in the background, kept until done
+_BATCHES: set["asyncio.Task[None]"] = set()
+
+# The range of the samples' smallint columns; e.g. a miner reporting a tiny
+# hash rate while ramping up reports an efficiency (power_per_th) far beyond it
+SMALLINT_MIN, SMALLINT_MAX = -32768, 32767
+
+
+def _smallint(value: int) -> int:
+    return max(SMALLINT_MIN, min(value, SMALLINT_MAX))
+
+
+@dataclass
+class AsicReading:
+    """
+    One asic's status and (when online) performance, as read in one sampling
+    cycle. Readings are written for the whole fleet at once by `write_readings`.
+    """
+
+    asic_id: int
+    timestamp: datetime
+    is_online: bool
+    is_hashing: bool
+    is_stable: bool
+    interval_secs: int
+    hashing_interval_id: Optional[int] = None
+    hash_rate: int = 0
+    power: int = 0
+    power_limit: int = 0
+    power_per_th: int = 0
+    temp: int = 0
+    env_temp: int = 0
+    price_per_kwh: Decimal = Decimal(0)
+    interval_until: Optional[datetime] = None
+    # Set by `write_readings`, against the asic's previous reading: when the
+    # status last changed, the status it changed from (if it just did) and
+    # whether the asic moved to another interval
+    changed_at: Optional[datetime] = None
+    prev_status: Optional[str] = None
+    interval_changed: bool = False
+    prev_hashing_interval_id: Optional[int] = None
+
+    @property
+    def status(self) -> AsicStatus:
+        return AsicStatus.for_flags(self.is_online, self.is_hashing, self.is_stable)
+
+    def to_json(self) -> dict[str, Any]:
+        d = asdict(self)
+        d["timestamp"] = self.timestamp.isoformat()
+        d["changed_at"] = self.changed_at.isoformat() if self.changed_at else None
+        d["interval_until"] = (
+            self.interval_until.isoformat() if self.interval_until else None
+        )
+        d["price_per_kwh"] = str(self.price_per_kwh)
+        return d
+
+    @classmethod
+    def from_json(cls, d: dict[str, Any]) -> Self:
+        d = dict(d)
+        d["timestamp"] = datetime.fromisoformat(d["timestamp"])
+        for name in ("changed_at", "interval_until"):
+            if d.get(name):
+                d[name] = datetime.fromisoformat(d[name])
+        d["price_per_kwh"] = Decimal(d["price_per_kwh"])
+        return cls(**d)
+
+    def status_row(self) -> dict[str, Any]:
+        """Values for the asics table"""
+        return dict(
+            id=self.asic_id,
+            is_online=self.is_online,
+            is_hashing=self.is_hashing,
+            is_stable=self.is_stable,
+            updated_at=self.timestamp,
+            changed_at=self.changed_at,
+        )
+
+    @property
+    def price_micro_per_kwh(self) -> int:
+        return Tariff.to_micro(self.price_per_kwh)
+
+    def sample_row(self, tariff_id: Optional[int] = None) -> Optional[dict[str, Any]]:
+        """
+        Values for the performance_samples table, clamped to its columns; offline
+        asics aren't sampled
+        """
+        if not self.is_online:
+            return None
+        return dict(
+            asic_id=self.asic_id,
+            hashing_interval_id=self.hashing_interval_id,
+            timestamp=self.timestamp,
+            interval_secs=_smallint(self.interval_secs),
+            is_online=self.is_online,
+            is_hashing=self.is_hashing,
+            is_stable=self.is_stable,
+            hash_rate=_smallint(self.hash_rate),
+            power=_smallint(self.power),
+            power_limit=_smallint(self.power_limit),
+            power_per_th=_smallint(self.power_per_th),
+            temp=_smallint(self.temp),
+            env_temp=_smallint(self.env_temp),
+            tariff_id=tariff_id,
+        )
+
+    def rollup_row(self) -> dict[str, Any]:
+        """What the reading counts towards the asic's rollups"""
+        return dict(
+            asic_id=self.asic_id,
+            timestamp=self.timestamp,
+            interval_secs=self.interval_secs,
+            is_online=self.is_online,
+            is_hashing=self.is_hashing,
+            hash_rate=self.hash_rate,
+            power=self.power,
+            temp=self.temp,
+            env_temp=self.env_temp,
+            price_micro_per_kwh=self.price_micro_per_kwh,
+        )
+
+    def state_row(self) -> Optional[dict[str, Any]]:
+        """Values for the asic_current_state table; only sampled asics have one"""
+        if not self.is_online:
+            return None
+        return dict(
+            asic_id=self.asic_id,
+            sampled_at=self.timestamp,
+            hash_rate=self.hash_rate,
+            power=self.power,
+            power_limit=self.power_limit,
+            power_per_th=self.power_per_th,
+            temp=self.temp,
+            env_temp=self.env_temp,
+            price_per_kwh=self.price_per_kwh,
+            hashing_interval_id=self.hashing_interval_id,
+            interval_started_at=self.timestamp,
+            interval_until=self.interval_until,
+        )
+
+    def transition_rows(self) -> list[dict[str, Any]]:
+        """Values for the asic_transitions table, if anything changed"""
+        rows = []
+        if self.prev_status is not None:
+            rows.append(
+                dict(
+                    kind=TransitionKind.status.value,
+                    status=self.status.value,
+                    prev_status=self.prev_status,
+                    hashing_interval_id=None,
+                    prev_hashing_interval_id=None,
+                )
+            )
+        if self.interval_changed:
+            rows.append(
+                dict(
+                    kind=TransitionKind.interval.value,
+                    status=None,
+                    prev_status=None,
+                    hashing_interval_id=self.hashing_interval_id,
+                    prev_hashing_interval_id=self.prev_hashing_interval_id,
+                )
+            )
+        return [dict(asic_id=self.asic_id, timestamp=self.timestamp, **r) for r in rows]
+
+
+def _interval_started_at(excluded: Any) -> dict[str, Any]:
+    """Moves interval_started_at along when the asic changes to another interval"""
+    state = AsicCurrentState.__table__.c
+    return dict(
+        interval_started_at=case(
+            (
+                state.hashing_interval_id.is_distinct_from(excluded.hashing_interval_id),
+                excluded.sampled_at,
+            ),
+            else_=state.interval_started_at,
+        )
+    )
+
+
+def _mark_changes(readings: Sequence[AsicReading], db_session: DbSession) -> None:
+    """
+    Work out which of the readings (oldest first) changed their asic's status
+    or moved it to another interval: against the asic's previous reading, or
+    for its first one against its stored state. This is done when writing, not
+    when reading, as readings may be written behind (or replayed from the
+    spool) well after later ones were read.
+    """
+    asics = Asic.__table__.c
+    state = AsicCurrentState.__table__.c
+    stmt = (
+        select(
+            asics.id,
+            asics.is_online,
+            asics.is_hashing,
+            asics.is_stable,
+            asics.changed_at,
+            state.asic_id,
+            state.hashing_interval_id,
+        )
+        .outerjoin(AsicCurrentState.__table__, state.asic_id == asics.id)
+        .filter(asics.id.in_({r.asic_id for r in readings}))
+    )
+    statuses: dict[int, tuple[AsicStatus, Optional[datetime]]] = {}
+    intervals: dict[int, Optional[int]] = {}
+    for row in db_session.execute(stmt):
+        status = AsicStatus.for_flags(row.is_online, row.is_hashing, row.is_stable)
+        statuses[row.id] = (status, row.changed_at)
+        if row.asic_id is not None:
+            intervals[row.id] = row.hashing_interval_id
+
+    for reading in readings:
+        prev_status, changed_at = statuses.get(reading.asic_id, (None, None))
+        if reading.status != prev_status:
+            LOGGER.info(
+                "updated status",
+                asic_id=reading.asic_id,
+                status=reading.status,
+                prev_status=prev_status,
+            )
+            changed_at = reading.timestamp
+        reading.changed_at = changed_at
+        reading.prev_status = (
+            prev_status.value if prev_status and reading.status != prev_status else None
+        )
+        statuses[reading.asic_id] = (reading.status, changed_at)
+
+        if not reading.is_online:
+            continue
+        prev = intervals.get(reading.asic_id)
+        changed = reading.asic_id not in intervals or prev != reading.hashing_interval_id
+        reading.interval_changed = changed
+        reading.prev_hashing_interval_id = prev if changed else None
+        intervals[reading.asic_id] = reading.hashing_interval_id
+
+
+def _rounds(readings: Sequence[AsicReading]) -> list[list[AsicReading]]:
+    """
+    Split the readings (oldest first) into rounds that each have at most one
+    reading of any asic (there can be several when replaying a backlog).
+    """
+    rounds: list[list[AsicReading]] = []
+    seen: dict[int, int] = {}
+    for reading in readings:
+        n = seen.get(reading.asic_id, 0)
+        seen[reading.asic_id] = n + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(reading)
+    return rounds
+
+
+def write_readings(
+    readings: Sequence[AsicReading], db_session: Optional[DbSession] = None
+) -> None:
+    """
+    Write a whole cycle's readings with one multi-row insert into
+    performance_samples (and asic_transitions), one set-based update of the
+    asics' status columns and one upsert each of their current state and their
+    rollups. Does not commit.
+    """
+    db_session = db_session or DB.session
+
+    readings = sorted(readings, key=lambda r: r.timestamp)
+    _mark_changes(readings, db_session)
+
+    tariffs = Tariff.ids_for(
+        (r.price_micro_per_kwh for r in readings if r.is_online), db_session
+    )
+    samples = [
+        row
+        for r in readings
+        if (row := r.sample_row(tariffs.get(r.price_micro_per_kwh))) is not None
+    ]
+    latest_samples: dict[int, int] = {}
+    if samples:
+        inserted = db_session.execute(
+            insert(PerformanceSample).returning(
+                PerformanceSample.id,
+                PerformanceSample.asic_id,
+                sort_by_parameter_order=True,
+            ),
+            samples,
+        )
+        # Oldest first, so the latest sample of each asic wins
+        for sample_id, asic_id in inserted:
+            latest_samples[asic_id] = sample_id
+
+    transitions = [row for r in readings for row in r.transition_rows()]
+    if transitions:
+        db_session.execute(insert(AsicTransition), transitions)
+
+    for batch in _rounds(readings):
+        bulk_update_by_id(db_session, Asic.__table__, [r.status_row() for r in batch])
+        bulk_upsert(
+            db_session,
+            AsicCurrentState.__table__,
+            [row for r in batch if (row := r.state_row()) is not None],
+            key=["asic_id"],
+            on_update=_interval_started_at,
+        )
+
+    bulk_update_by_id(
+        db_session,
+        Asic.__table__,
+        [dict(id=a, latest_sample_id=s) for a, s in latest_samples.items()],
+    )
+
+    RollupService(db_session).record(r.rollup_row() for r in readings)
+
+    LOGGER.debug("wrote readings", asics=len(readings), samples=len(samples))
+
 
 class SamplingService:
-    def __init__(self, schedule_service: Optional[ScheduleService] = None) -> None:
+    def __init__(
+        self,
+        schedule_service: Optional[ScheduleService] = None,
+        polling_service: Optional[PollingService] = None,
+        writer: Optional["SampleWriter"] = None,
+        cadence: Optional[CadenceService] = None,
+    ) -> None:
+        from .sample_writer import WRITER
+
         self.schedule_service = schedule_service or ScheduleService()
+        self.polling_service = polling_service or PollingService()
+        self.writer = writer or WRITER
+        self.cadence = cadence or CADENCE
+
+    async def sample_due(self) -> Optional["asyncio.Task[None]"]:
+        """
+        Start sampling just the active asics that are due, per their cadence,
+        without waiting for them: a slow miner holds up neither the next tick nor
+        the other asics' next samples, and isn't due again until it's done.
+        """
+        asics = self.cadence.due(Asic.all_active())
+        if not asics:
+            return None
 
-    async def sample_all_active(self, interval: int) -> None:
+        LOGGER.debug("sampling due asics", count=len(asics))
+        asic_ids = [asic.id for asic in asics]
+        self.cadence.start(asic_ids)
+        batch = asyncio.create_task(self._sample_batch(asic_ids))
+        _BATCHES.add(batch)
+        batch.add_done_callback(_BATCHES.discard)
+        return batch
+
+    async def sample_all_active(self, interval: Optional[int] = None) -> None:
         LOGGER.info("sampling all active asics")
-        for asic in Asic.all_active():
+        await self._sample(Asic.all_active(), interval)
+
+    async def _sample_batch(self, asic_ids: list[int]) -> None:
+        # In an app context (so a session) of its own, as it outlives the tick
+        with APP.app_context():
+            asics: list[Asic] = []
             try:
-                await self.add_sample(asic, interval)
-                DB.session.commit()
-            except Exception as ex:
-                LOGGER.exception(
-                    "Failed to sample asic",
-                    asic=asic.name,
-                    exception=ex,
+                asics = list(
+                    DB.session.scalars(
+                        select(Asic).filter(Asic.id.in_(asic_ids)).order_by(Asic.name)
+                    )
                 )
-                DB.session.rollback()
+            finally:
+                # Any no longer there are done with now; the rest once each is read
+                self.cadence.finish(set(asic_ids) - {asic.id for asic in asics})
+            await self._sample(asics)
+
+    async def _sample(self, asics: list[Asic], interval: Optional[int] = None) -> None:
+        async def read(asic: Asic) -> AsicReading:
+            # The sample covers the time since this asic was last sampled
+            secs = self.cadence.mark_sampled(asic)
+            return await self.read_sample(asic, interval or secs)
+
+        def done(result: PollResult[AsicReading]) -> None:
+            # Written behind by the sample writer, so a slow or unreachable database
+            # doesn't hold up (or lose) the cycle; as soon as the asic is read, so
+            # its readings are written in order even if it's sampled again before
+            # the rest of the cycle is done. The poll reports every asic, however
+            # it went, so this is where each is done with.
+            try:
+                if result.ok and result.value is not None:
+                    self.writer.submit([result.value])
+            finally:
+                self.cadence.finish([result.asic.id])
+
+        await self.polling_service.poll(asics, read, on_result=done)
 
-    async def add_sample(self, asic: Asic, interval: int) -> None:
-        await update_status(asic)
-        data = await get_asic_data(asic)
+    async def add_sample(
+        self, asic: Asic, interval: int, snapshot: Optional[MinerSnapshot] = None
+    ) -> None:
+        """Sample a single asic, through the same path as the whole-fleet cycle"""
+        reading = await self.read_sample(asic, interval, snapshot)
+        write_readings([reading])
+        DB.session.expire(asic)
+
+    async def read_sample(
+        self, asic: Asic, interval: int, snapshot: Optional[MinerSnapshot] = None
+    ) -> AsicReading:
+        """Read the asic's status and performance, without writing anything"""
+        if snapshot is None:
+            snapshot = await get_asic_snapshot(asic)
 
         moment = asic.local_time()
+        is_online = snapshot.is_online
+        is_hashing = snapshot.is_hashing
+        is_stable = snapshot.is_stable(asic)
+
+        reading = AsicReading(
+            asic_id=asic.id,
+            timestamp=moment,
+            is_online=is_online,
+            is_hashing=is_hashing,
+            is_stable=is_stable,
+            interval_secs=interval,
+        )
+
+        data = snapshot.data
+        if data is None:
+            LOGGER.debug("Not sampling offline asic", asic=asic.name)
+            return reading
+
         temp = data.env_temp or 0
 
         current_schedule_interval = self.schedule_service.get_current_interval(
@@ -48,24 +456,23 @@ class SamplingService:
             current_schedule_interval.price_per_kwh if current_schedule_interval else None
         )
 
-        sample = PerformanceSample(
-            asic=asic,
-            hashing_interval=current_schedule_interval,
-            timestamp=moment,
-            interval_secs=interval,
-            is_online=asic.is_online,
-            is_hashing=asic.is_hashing,
-            is_stable=asic.is_stable,
-            temp=int(data.temperature_avg or 0),
-            env_temp=int(data.env_temp or 0),
-            hash_rate=int(data.hashrate or 0),
-            power=int(data.wattage or 0),
-            power_limit=int(data.wattage_limit or 0),
-            power_per_th=int(data.efficiency or 0),
-            price_per_kwh=current_price_per_kwh or Decimal(0),
+        reading.hashing_interval_id = (
+            current_schedule_interval.id if current_schedule_interval else None
+        )
+        reading.temp = int(data.temperature_avg or 0)
+        reading.env_temp = int(data.env_temp or 0)
+        reading.hash_rate = int(data.hashrate or 0)
+        reading.power = int(data.wattage or 0)
+        reading.power_limit = int(data.wattage_limit or 0)
+        reading.power_per_th = int(data.efficiency or 0)
+        reading.price_per_kwh = current_price_per_kwh or Decimal(0)
+        reading.interval_until = (
+            current_schedule_interval.next_end_time(moment)
+            if current_schedule_interval
+            else None
         )
 
-        DB.session.add(sample)
+        return reading
 
     def get_time_for_interval(
         self, asic: Asic, interval: Optional[HashingInterval]
@@ -74,9 +481,8 @@ class SamplingService:
         if not interval:
             return None
 
-        previous_interval = asic.latest_sample_before_interval(interval)
-        if not previous_interval:
+        when = AsicTransition.interval_started_at(asic, interval)
+        if not when:
             return None
 
-        when = previous_interval.timestamp
-        return when.astimezone(asic.timezone)
+        return asic.local_time(when)
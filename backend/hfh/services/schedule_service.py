@@ -1,4 +1,6 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Optional
 
 import structlog
@@ -7,35 +9,99 @@ from ..db import DB
 from ..models.asic import Asic, AsicStatus
 from ..models.hashing_interval import HashingInterval
 from ..models.hashing_schedule import HashingSchedule
-from ..models.scenario import Scenario
-from .asic_service import get_asic_data, set_hashing, set_power_limit
+from ..utils.loaded import kept_loaded
+from .asic_service import (
+    MinerSnapshot,
+    get_asic_data,
+    recent_snapshot,
+    set_hashing,
+    set_power_limit,
+)
+from .fleet_config import FLEET
+from .polling_service import PollingService, commit_polled
+from .transition_service import TransitionService
 
 LOGGER = structlog.get_logger(__name__)
 
+# How old a snapshot from the sampling pass may be for the schedule pass to use it
+SNAPSHOT_MAX_AGE = 90  # secs
+
+
+@dataclass
+class ScheduledChange:
+    """From `at`, the interval (if any) the asic's schedule has it under"""
+
+    at: datetime
+    interval: Optional[HashingInterval]
+    is_override: bool
+
+    @property
+    def hashing(self) -> Optional[bool]:
+        """None if no interval is in effect (the asic is left as it is)"""
+        return self.interval.hashing_enabled if self.interval else None
+
+    @property
+    def power_limit(self) -> Optional[int]:
+        if self.interval and self.interval.performance_limit:
+            return self.interval.performance_limit.power_limit
+        return None
+
+    @property
+    def price_per_kwh(self) -> Optional[Decimal]:
+        return self.interval.price_per_kwh if self.interval else None
+
 
 class ScheduleService:
+    def __init__(self, polling_service: Optional[PollingService] = None) -> None:
+        self.polling_service = polling_service or PollingService()
+
     async def update_all_active(self) -> None:
         LOGGER.info("updating all active asics according to schedule")
-        for asic in Asic.all_active():
-            try:
-                await self.update(asic)
-                DB.session.commit()
-            except Exception as ex:
-                LOGGER.exception(
-                    "Failed to update asic",
-                    asic=asic.name,
-                    exception=ex,
-                )
-                DB.session.rollback()
+        await self.update_asics(Asic.all_active_with_schedules())
+
+    async def update_temp_dependent(self) -> None:
+        """
+        Update just the asics whose schedule (or override) has intervals bounded
+        by temperature, as the transition plan can't foresee when those apply
+        """
+        asic_ids = FLEET.current().temp_dependent_ids
+        if not asic_ids:
+            return
 
-    async def update(self, asic: Asic) -> None:
+        asics = [a for a in Asic.all_active_with_schedules() if a.id in asic_ids]
+        LOGGER.debug("updating temperature dependent asics", count=len(asics))
+        await self.update_asics(asics)
+
+    async def update_asics(self, asics: list[Asic]) -> None:
+        """
+        Update the asics, which should have been loaded with their schedules
+        (see Asic.all_active_with_schedules). What's loaded is kept across the
+        commit, so the pass queries the same however many asics there are.
+
+        Nothing is flushed until all the asics are done, so no row is locked
+        while the miners are being talked to, and then it's all committed at once.
+        """
+        with kept_loaded(DB.session):
+            with DB.session.no_autoflush:
+                results = await self.polling_service.poll(asics, self.update)
+            commit_polled(results)
+
+    async def update(self, asic: Asic, snapshot: Optional[MinerSnapshot] = None) -> None:
         if not asic.is_online:
             LOGGER.debug("Ignoring offline", asic=asic.name)
             return
 
+        # Prefer what the sampling pass just read from the miner over the db
+        if snapshot is None:
+            snapshot = recent_snapshot(asic, max_age=SNAPSHOT_MAX_AGE)
+
         moment = asic.local_time()
-        sample = asic.latest_sample
-        temp = sample.env_temp if sample else None
+        temp: Optional[int]
+        if snapshot and snapshot.data:
+            temp = int(snapshot.data.env_temp or 0)
+        else:
+            sample = asic.latest_sample
+            temp = sample.env_temp if sample else None
 
         LOGGER.debug(
             "Updating asic operation by schedule constraints",
@@ -84,7 +150,7 @@ class ScheduleService:
         else:
             LOGGER.debug("should not be hashing", asic=asic.name)
             await self.ensure_not_hashing(asic)
-        await self.ensure_power_limit(asic, current_interval)
+        await self.ensure_power_limit(asic, current_interval, snapshot)
 
     def can_change_hashing(self, asic: Asic, moment: datetime) -> bool:
         """
@@ -115,39 +181,74 @@ class ScheduleService:
         temp: Optional[int] = None,
         ignore_override: Optional[bool] = False,
     ) -> Optional[HashingInterval]:
-        scenario = Scenario(
-            moment=moment,
-            temp=temp,
-        )
-
-        if not ignore_override:
-            if override := asic.override_interval:
-                if override.is_active_under(scenario):
-                    LOGGER.info(
-                        "Using override interval for now",
-                        asic=asic.name,
-                        until=override.next_end_time(moment),
-                    )
-                    return override
+        """
+        Looked up in the fleet's configuration snapshot when it has the asic as
+        it is (the interval then comes from the session, by id), else through
+        the asic's own relations
+        """
+        if (config := FLEET.config_of(asic)) is not None:
+            interval_id = config.interval_id_at(moment, temp, ignore_override)
+            interval = (
+                DB.session.get(HashingInterval, interval_id)
+                if interval_id is not None
+                else None
+            )
+        else:
+            override = None if ignore_override else asic.override_interval
+            interval = _interval_at(override, _schedule_of(asic), moment, temp)
 
-        schedule: Optional[HashingSchedule] = (
-            asic.profile.schedule if asic.profile and asic.profile.schedule else None
-        )
-        if not schedule:
-            return None
+        if interval is not None and not ignore_override:
+            if interval is asic.override_interval:
+                LOGGER.info(
+                    "Using override interval for now",
+                    asic=asic.name,
+                    until=interval.next_end_time(moment),
+                )
+        return interval
 
-        interval: HashingInterval
-        for interval in schedule.intervals:
-            if interval.is_active_under(scenario):
-                return interval
+    def timeline(
+        self,
+        asic: Asic,
+        since: datetime,
+        until: datetime,
+        temp: Optional[int] = None,
+    ) -> list[ScheduledChange]:
+        """
+        The interval in effect at `since`, followed by each change of interval
+        before `until`, in the asic's local time, taking the override into
+        account. Steps from one moment the interval could change to the next
+        (see CompiledSchedule.next_change), rather than looking at every
+        minute. Intervals that depend on the temperature apply whatever it is,
+        unless `temp` is given.
+        """
+        override = asic.override_interval
+        schedule = _schedule_of(asic)
 
-        return None
+        moment = asic.local_time(since)
+        until = asic.local_time(until)
+        changes: list[ScheduledChange] = []
+        while moment < until:
+            interval = _interval_at(override, schedule, moment, temp)
+            if not changes or interval is not changes[-1].interval:
+                changes.append(
+                    ScheduledChange(
+                        at=moment,
+                        interval=interval,
+                        is_override=interval is not None and interval is override,
+                    )
+                )
+            next_moment = TransitionService.next_transition(asic, moment)
+            if next_moment is None:
+                break
+            moment = next_moment
+        return changes
 
     def should_be_hashing(
         self, asic: Asic, current_interval: Optional[HashingInterval], moment: datetime
     ) -> bool:
         if current_interval:
-            return current_interval.is_hashing_at(moment)
+            # It is the interval in effect at the moment
+            return current_interval.hashing_enabled
         else:
             return asic.is_hashing
 
@@ -162,7 +263,10 @@ class ScheduleService:
             await set_hashing(asic, True)
 
     async def ensure_power_limit(
-        self, asic: Asic, interval: Optional[HashingInterval]
+        self,
+        asic: Asic,
+        interval: Optional[HashingInterval],
+        snapshot: Optional[MinerSnapshot] = None,
     ) -> None:
         if not (interval and interval.performance_limit):
             LOGGER.debug(
@@ -173,12 +277,10 @@ class ScheduleService:
             return
 
         expected_power_limit = interval.performance_limit.power_limit
-        try:
-            last_sample = asic.latest_sample
-            current_power_limit = last_sample.power_limit if last_sample else None
-        except Exception:
-            data = await get_asic_data(asic)
-            current_power_limit = data.wattage_limit
+        if snapshot and snapshot.data:
+            current_power_limit = snapshot.data.wattage_limit
+        else:
+            current_power_limit = await self._current_power_limit(asic)
 
         LOGGER.info(
             "Asic expected power_limit",
@@ -197,7 +299,31 @@ class ScheduleService:
             )
             await set_power_limit(asic, expected_power_limit)
 
+    async def _current_power_limit(self, asic: Asic) -> Optional[int]:
+        try:
+            last_sample = asic.latest_sample
+            return last_sample.power_limit if last_sample else None
+        except Exception:
+            data = await get_asic_data(asic)
+            return data.wattage_limit
+
     async def ensure_not_hashing(self, asic: Asic) -> None:
         if asic.is_hashing:
             LOGGER.info("Asic should not be hashing but is", asic=asic.name)
             await set_hashing(asic, False)
+
+
+def _schedule_of(asic: Asic) -> Optional[HashingSchedule]:
+    return asic.profile.schedule if asic.profile and asic.profile.schedule else None
+
+
+def _interval_at(
+    override: Optional[HashingInterval],
+    schedule: Optional[HashingSchedule],
+    moment: datetime,
+    temp: Optional[int],
+) -> Optional[HashingInterval]:
+    """The override while it is in effect, else the schedule's interval"""
+    if override and override.compiled.interval_at(moment, temp):
+        return override
+    return schedule.compiled.interval_at(moment, temp) if schedule else None
@@ -0,0 +1,254 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Self, Sequence
+
+import numpy as np
+import structlog
+from sqlalchemy import select
+
+from ..db import DB, DbSession
+from ..models.asic import Asic
+from ..models.compiled_schedule import IntervalWindows
+from ..models.hashing_schedule import HashingSchedule
+from ..models.performance_sample import PerformanceSample
+from ..models.tariff import MICRO, Tariff
+
+LOGGER = structlog.get_logger(__name__)
+
+# Days of a leap year before each month (see compiled_schedule.day_of_year)
+DAYS_BEFORE_MONTH = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+
+@dataclass
+class SampleHistory:
+    """An asic's samples over a period, as arrays with an element per sample"""
+
+    day_of_year: np.ndarray  # of a leap year, as in CompiledSchedule
+    time_of_day: np.ndarray  # micros
+    weekday: np.ndarray  # Monday is 0
+    secs: np.ndarray
+    env_temp: np.ndarray
+    is_hashing: np.ndarray
+    power: np.ndarray
+    hash_rate: np.ndarray
+    price_micro_per_kwh: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.secs)
+
+    @classmethod
+    def load(
+        cls,
+        asic: Asic,
+        since: datetime,
+        until: datetime,
+        db_session: Optional[DbSession] = None,
+    ) -> Self:
+        db_session = db_session or DB.session
+
+        # Samples are timestamped in the asic's local time
+        since = asic.local_time(since).replace(tzinfo=None)
+        until = asic.local_time(until).replace(tzinfo=None)
+        stmt = (
+            select(
+                PerformanceSample.timestamp,
+                PerformanceSample.interval_secs,
+                PerformanceSample.env_temp,
+                PerformanceSample.is_hashing,
+                PerformanceSample.power,
+                PerformanceSample.hash_rate,
+                Tariff.price_micro_per_kwh,
+            )
+            .outerjoin(Tariff, Tariff.id == PerformanceSample.tariff_id)
+            .filter(
+                PerformanceSample.asic_id == asic.id,
+                PerformanceSample.is_online,
+                PerformanceSample.timestamp >= since,
+                PerformanceSample.timestamp < until,
+            )
+            .order_by(PerformanceSample.timestamp)
+        )
+        rows = db_session.execute(stmt).all()
+        LOGGER.debug("loaded sample history", asic=asic.name, samples=len(rows))
+
+        columns = list(zip(*rows, strict=True)) if rows else [[]] * 7
+        timestamps, secs, env_temp, is_hashing, power, hash_rate, price = columns
+        return cls.from_timestamps(
+            np.array(timestamps, dtype="datetime64[us]"),
+            secs=np.array(secs, dtype=np.int64),
+            env_temp=np.array(env_temp, dtype=np.int64),
+            is_hashing=np.array(is_hashing, dtype=bool),
+            power=np.array(power, dtype=np.float64),
+            hash_rate=np.array(hash_rate, dtype=np.float64),
+            price_micro_per_kwh=np.array([p or 0 for p in price], dtype=np.float64),
+        )
+
+    @classmethod
+    def from_timestamps(cls, timestamps: np.ndarray, **columns: np.ndarray) -> Self:
+        days = timestamps.astype("datetime64[D]")
+        months = days.astype("datetime64[M]")
+        day_of_month = (days - months).astype(np.int64) + 1
+        return cls(
+            day_of_year=DAYS_BEFORE_MONTH[months.astype(np.int64) % 12] + day_of_month,
+            time_of_day=(timestamps - days).astype(np.int64),
+            # 1970-01-01 was a Thursday
+            weekday=(days.astype(np.int64) + 3) % 7,
+            **columns,
+        )
+
+
+@dataclass
+class SimulationResult:
+    name: str
+    samples: int
+    sampled_hours: float
+    hashing_hours: float
+    energy_kwh: float
+    cost: Decimal
+    hash_output_th: float  # TH/s * secs
+
+    @classmethod
+    def of(
+        cls,
+        name: str,
+        history: SampleHistory,
+        is_hashing: np.ndarray,
+        power: np.ndarray,
+        hash_rate: np.ndarray,
+        price_micro_per_kwh: np.ndarray,
+    ) -> Self:
+        per_kwh = PerformanceSample.WATT_SECS_PER_KWH
+        watt_secs = power * history.secs
+        cost_micro = float(np.sum(watt_secs * price_micro_per_kwh)) / per_kwh
+        return cls(
+            name=name,
+            samples=len(history),
+            sampled_hours=float(np.sum(history.secs)) / 3600,
+            hashing_hours=float(np.sum(history.secs[is_hashing])) / 3600,
+            energy_kwh=float(np.sum(watt_secs)) / per_kwh,
+            cost=Decimal(round(cost_micro)) / MICRO,
+            hash_output_th=float(np.sum(hash_rate * history.secs)),
+        )
+
+
+class SimulationService:
+    """
+    Works out what candidate schedules would have cost and produced over an
+    asic's sample history, with the whole history evaluated at once as arrays
+    rather than a sample (and an interval) at a time.
+
+    Where a schedule has the asic hashing when it wasn't, it is taken to draw
+    and produce what it typically did while hashing (and likewise while
+    paused). An interval's power limit scales down what was drawn and produced
+    above it, in proportion; an interval's price replaces the one paid. Where
+    no interval is in effect, the asic is left as it was, as the schedule pass
+    does.
+    """
+
+    def __init__(self, db_session: Optional[DbSession] = None) -> None:
+        self.db_session = db_session or DB.session
+
+    def compare(
+        self,
+        asic: Asic,
+        since: datetime,
+        until: datetime,
+        schedules: Sequence[tuple[str, HashingSchedule]],
+    ) -> list[SimulationResult]:
+        """What actually happened, followed by each of the (named) schedules"""
+        history = SampleHistory.load(asic, since, until, self.db_session)
+        return [self.actual(history)] + [
+            self.simulate(history, name, schedule) for name, schedule in schedules
+        ]
+
+    @staticmethod
+    def actual(history: SampleHistory) -> SimulationResult:
+        return SimulationResult.of(
+            "actual",
+            history,
+            history.is_hashing,
+            history.power,
+            np.where(history.is_hashing, history.hash_rate, 0),
+            history.price_micro_per_kwh,
+        )
+
+    @staticmethod
+    def in_effect(
+        history: SampleHistory, windows: Sequence[IntervalWindows]
+    ) -> np.ndarray:
+        """The index of the window in effect at each sample, or -1 if none"""
+        chosen = np.full(len(history), -1, dtype=np.int64)
+        for n, w in enumerate(windows):
+            matches = chosen < 0
+            matches &= _in_window(history.day_of_year, w.days)
+            matches &= _in_window(history.time_of_day, w.times)
+            matches &= ((w.weekdays >> history.weekday) & 1).astype(bool)
+            if w.temp_min is not None:
+                matches &= history.env_temp >= w.temp_min
+            if w.temp_max is not None:
+                matches &= history.env_temp <= w.temp_max
+            chosen[matches] = n
+        return chosen
+
+    def simulate(
+        self, history: SampleHistory, name: str, schedule: HashingSchedule
+    ) -> SimulationResult:
+        windows = schedule.compiled.windows
+        chosen = self.in_effect(history, windows)
+        none = chosen < 0
+
+        # Per window, with a last entry for "no window"
+        def per_window(values: list[float]) -> np.ndarray:
+            return np.array(values + [0], dtype=np.float64)[np.where(none, -1, chosen)]
+
+        intervals = [w.interval for w in windows]
+        is_hashing = np.where(
+            none,
+            history.is_hashing,
+            per_window([i.hashing_enabled for i in intervals]).astype(bool),
+        )
+        power_limit = per_window(
+            [
+                (i.performance_limit.power_limit or 0) if i.performance_limit else 0
+                for i in intervals
+            ]
+        )
+        price = per_window(
+            [
+                Tariff.to_micro(i.price_per_kwh) if i.price_per_kwh is not None else -1
+                for i in intervals
+            ]
+        )
+        price = np.where(none | (price < 0), history.price_micro_per_kwh, price)
+
+        hashed = history.is_hashing
+        hashing_power = np.where(hashed, history.power, _typical(history.power[hashed]))
+        hashing_rate = np.where(
+            hashed, history.hash_rate, _typical(history.hash_rate[hashed])
+        )
+        idle_power = np.where(~hashed, history.power, _typical(history.power[~hashed]))
+
+        limited = (power_limit > 0) & (hashing_power > power_limit)
+        scale = np.where(limited, power_limit / np.maximum(hashing_power, 1), 1.0)
+
+        return SimulationResult.of(
+            name,
+            history,
+            is_hashing,
+            np.where(is_hashing, hashing_power * scale, idle_power),
+            np.where(is_hashing, hashing_rate * scale, 0),
+            price,
+        )
+
+
+def _in_window(at: np.ndarray, window: tuple[int, int]) -> np.ndarray:
+    """Vectorized compiled_schedule.in_window"""
+    start, end = window
+    if start < end:
+        return (at >= start) & (at < end)
+    return (at >= start) | (at < end)
+
+
+def _typical(values: np.ndarray) -> float:
+    return float(np.median(values)) if len(values) else 0.0
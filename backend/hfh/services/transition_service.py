@@ -0,0 +1,170 @@
+import threading
+from datetime import UTC, datetime, timedelta
+from itertools import chain
+from typing import Any, Iterable, Optional
+
+import structlog
+from flask_apscheduler import APScheduler
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..app import APP
+from ..event_loop import LOOP
+from ..models.asic import Asic
+from ..models.asic_profile import AsicProfile
+from ..models.hashing_interval import HashingInterval
+from ..models.hashing_schedule import HashingSchedule
+from ..scheduled_tasks import SCHEDULER
+from .invalidation_bus import BUS
+
+LOGGER = structlog.get_logger(__name__)
+
+WAKE_JOB_ID = "schedule_transitions"
+PLAN_JOB_ID = "plan_schedule_transitions"
+
+# Changes to these mean the transitions have to be planned again
+PLANNED_FROM = (HashingSchedule, HashingInterval, AsicProfile)
+PLANNED_FROM_ASIC = ("is_active", "profile_id", "override_interval_id")
+TOPIC = "transitions"
+
+
+class TransitionService:
+    """
+    Runs the schedule pass for an asic right when its schedule (or override)
+    says it should change what it's doing, rather than up to a polling period
+    later.
+
+    `plan` works out, from each active asic's compiled schedule, the next
+    moment at which a different interval could be in effect, and sets a single
+    scheduler job to wake up at the first of them. When it does, the asics that
+    are due are updated, and the next wake up is planned. The periodic schedule
+    pass stays on as a safety net (e.g. for changes in temperature).
+
+    Committing changes to schedules, intervals, profiles or an asic's override
+    has the transitions planned again, straight away, whichever process (e.g.
+    an API worker) commits them (see InvalidationBus).
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[APScheduler] = None,
+        slack_secs: Optional[float] = None,
+    ) -> None:
+        self.scheduler = scheduler or SCHEDULER
+        self.slack = timedelta(
+            seconds=slack_secs or float(APP.config.get("TRANSITION_SLACK_SECS", 1))
+        )
+        self._planned: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def next_transition(
+        asic: Asic, moment: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """When the asic's schedule or override next could change, if it has either"""
+        moment = moment or asic.local_time()
+        changes = []
+        if asic.override_interval:
+            changes.append(asic.override_interval.compiled.next_change(moment))
+        if asic.profile and asic.profile.schedule:
+            changes.append(asic.profile.schedule.compiled.next_change(moment))
+        return min(changes, default=None)
+
+    def plan(self, asics: Optional[Iterable[Asic]] = None) -> Optional[datetime]:
+        """Work out when each asic next transitions, and wake up for the first"""
+        if asics is None:
+            asics = Asic.all_active_with_schedules()
+
+        planned = {
+            asic.id: at
+            for asic in asics
+            if (at := self.next_transition(asic)) is not None
+        }
+        with self._lock:
+            self._planned = planned
+
+        wake_at = min(planned.values(), default=None)
+        LOGGER.debug("planned schedule transitions", asics=len(planned), wake_at=wake_at)
+        self._wake_at(wake_at)
+        return wake_at
+
+    def due(self, now: Optional[datetime] = None) -> list[int]:
+        """The ids of the asics whose transition is (about) now"""
+        now = (now or datetime.now(tz=UTC)) + self.slack
+        with self._lock:
+            return [asic_id for asic_id, at in self._planned.items() if at <= now]
+
+    def run_due(self) -> None:
+        from .schedule_service import ScheduleService
+
+        with APP.app_context():
+            due = set(self.due())
+            if due:
+                asics = [a for a in Asic.all_active_with_schedules() if a.id in due]
+                LOGGER.info("schedule transition", asics=[a.name for a in asics])
+                LOOP.run(ScheduleService().update_asics(asics))
+            self.plan()
+
+    def request_plan(self) -> None:
+        """Have the transitions planned again, in the scheduler's thread"""
+        if not self.scheduler.running:
+            return
+        self.scheduler.add_job(
+            id=PLAN_JOB_ID,
+            func=self._plan_in_context,
+            trigger="date",
+            replace_existing=True,
+        )
+
+    def _plan_in_context(self) -> None:
+        with APP.app_context():
+            self.plan()
+
+    def _wake_at(self, at: Optional[datetime]) -> None:
+        if not self.scheduler.running:
+            return
+        if at is None:
+            if self.scheduler.get_job(WAKE_JOB_ID):
+                self.scheduler.remove_job(WAKE_JOB_ID)
+            return
+        self.scheduler.add_job(
+            id=WAKE_JOB_ID,
+            func=self.run_due,
+            trigger="date",
+            run_date=at,
+            replace_existing=True,
+            misfire_grace_time=None,
+        )
+
+
+TRANSITIONS = TransitionService()
+BUS.subscribe(TOPIC, TRANSITIONS.request_plan)
+
+
+def _changes_plan(obj: Any) -> bool:
+    if isinstance(obj, PLANNED_FROM):
+        return True
+    if isinstance(obj, Asic):
+        attrs = inspect(obj).attrs
+        return any(attrs[name].history.has_changes() for name in PLANNED_FROM_ASIC)
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _note_schedule_changes(session: Session, flush_context: Any) -> None:
+    if any(
+        _changes_plan(obj) for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info["replan_transitions"] = True
+        BUS.publish(session, TOPIC)
+
+
+@event.listens_for(Session, "after_commit")
+def _replan_after_commit(session: Session) -> None:
+    if session.info.pop("replan_transitions", False):
+        TRANSITIONS.request_plan()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_schedule_changes(session: Session) -> None:
+    session.info.pop("replan_transitions", None)
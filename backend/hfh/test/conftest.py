@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+# Set before any test imports the app/db modules, as the engine is made then
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+
+
+@pytest.fixture
+def app():
+    """Create and configure a test application instance."""
+    # Import models to ensure they are registered with SQLAlchemy
+    import hfh.models.all  # noqa: F401
+    from hfh.app import APP
+    from hfh.db import DB
+
+    APP.config["TESTING"] = True
+    APP.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+
+    with APP.app_context():
+        DB.create_all()
+        yield APP
+        DB.session.remove()
+        DB.drop_all()
+
+
+@pytest.fixture
+def count_queries(app):
+    """The SQL statements executed while the test runs"""
+    from sqlalchemy import event
+
+    from hfh.db import DB
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = DB.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def schedule(app):
+    """
+    A schedule in Denver time with "day" (06:00 to 18:00) and "night" intervals,
+    hashing all year. Not added to the session, so that tests can change it first.
+    """
+    from hfh.models.hashing_interval import HashingInterval
+    from hfh.models.hashing_schedule import HashingSchedule
+
+    schedule = HashingSchedule(name="fixture", timezone_name="America/Denver")
+    for name, start, end in (("day", "06:00", "18:00"), ("night", "18:00", "06:00")):
+        HashingInterval(
+            name=name,
+            schedule=schedule,
+            daytime_start_hhmm=start,
+            daytime_end_hhmm=end,
+            date_start_mmdd="01/01",
+            date_end_mmdd="12/31",
+            hashing_enabled=True,
+            weekdays_active="*",
+            is_active=True,
+        )
+    return schedule
@@ -0,0 +1,140 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeApi:
+    """Answers joined and single commands, recording each round trip"""
+
+    def __init__(self, joined_ok=True):
+        self.joined_ok = joined_ok
+        self.sent = []
+
+    def get_commands(self):
+        return ["summary", "devdetails", "devs", "status", "get_psu", "get_miner_info"]
+
+    async def multicommand(self, *commands):
+        # As pyasic answers when the miner rejects the joined command
+        self.sent.append("+".join(commands))
+        if not self.joined_ok:
+            return {cmd: [{}] for cmd in commands}
+        return {cmd: [{"cmd": cmd}] for cmd in commands} | {"multicommand": True}
+
+    def __getattr__(self, cmd):
+        if cmd not in self.get_commands():
+            raise AttributeError(cmd)
+
+        async def send():
+            self.sent.append(cmd)
+            return {"cmd": cmd}
+
+        return send
+
+
+@pytest.fixture
+def miner_api():
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+
+    from hfh.services.circuit_breaker import BREAKERS
+
+    api = FakeApi()
+
+    async def get_miner():
+        return SimpleNamespace(api=api)
+
+    asic = SimpleNamespace(name="asic-0", address="10.0.0.1", get_miner=get_miner)
+    yield asic, api
+    BREAKERS.reset(asic.address)
+
+
+class TestGetAsicDataExtended:
+    def test_joins_commands(self, miner_api):
+        """Test that the joinable commands go in one round trip, the rest separately"""
+        from hfh.services.asic_service import EXTENDED_COMMANDS, get_asic_data_extended
+
+        asic, api = miner_api
+        d = asyncio.run(get_asic_data_extended(asic))
+
+        assert list(d) == EXTENDED_COMMANDS
+        assert "summary+devdetails+devs" in api.sent
+        assert "summary" not in api.sent
+        assert d["summary"] == {"cmd": "summary"}
+        assert d["status"] == {"cmd": "status"}
+        assert "error" in d["get_error_code"]
+
+    def test_falls_back_to_single_commands(self, miner_api):
+        """Test that commands are sent one by one when joining isn't supported"""
+        from hfh.services.asic_service import get_asic_data_extended
+
+        asic, api = miner_api
+        api.joined_ok = False
+        d = asyncio.run(get_asic_data_extended(asic))
+
+        assert {"summary", "devdetails", "devs"} <= set(api.sent)
+        assert d["devs"] == {"cmd": "devs"}
+
+
+class FakeMiner:
+    """A hashing miner, counting each read of it"""
+
+    model = "S19"
+    fw_ver = "1.0"
+
+    def __init__(self):
+        self.reads = []
+        self.api = SimpleNamespace(summary=self.summary)
+
+    async def get_data(self):
+        self.reads.append("get_data")
+        return SimpleNamespace(is_mining=True, model=self.model, fw_ver=self.fw_ver)
+
+    async def summary(self):
+        self.reads.append("summary")
+        return {"SUMMARY": [{"Upfreq Complete": 1}]}
+
+
+class TestMinerSnapshot:
+    def test_status_shares_the_snapshots_fetch(self, app, monkeypatch):
+        """Test that the sample's snapshot updates the status without another fetch"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.services.asic_service import (
+            get_asic_snapshot,
+            recent_snapshot,
+            update_status,
+        )
+        from hfh.services.circuit_breaker import BREAKERS
+
+        asic = Asic(
+            name="asic-0",
+            address="10.0.0.1",
+            password="pw",
+            is_online=False,
+            is_hashing=False,
+            is_stable=False,
+        )
+        DB.session.add(asic)
+        DB.session.commit()
+
+        miner = FakeMiner()
+
+        async def get_miner():
+            return miner
+
+        monkeypatch.setattr(asic, "get_miner", get_miner)
+
+        async def sample_and_update():
+            snapshot = await get_asic_snapshot(asic)
+            await update_status(asic, snapshot)
+            return snapshot
+
+        try:
+            snapshot = asyncio.run(sample_and_update())
+        finally:
+            BREAKERS.reset(asic.address)
+
+        assert miner.reads == ["get_data", "summary"]
+        assert (asic.is_online, asic.is_hashing, asic.is_stable) == (True, True, True)
+        assert recent_snapshot(asic, max_age=90) is snapshot
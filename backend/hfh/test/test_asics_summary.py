@@ -0,0 +1,141 @@
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def fleet(schedule):
+    """Make a fleet of `count` asics on one schedule, each with a few samples"""
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+    from hfh.models.asic_profile import AsicProfile
+    from hfh.models.asic_transition import AsicTransition, TransitionKind
+    from hfh.models.performance_sample import PerformanceSample
+    from hfh.models.tariff import Tariff
+
+    tariff = Tariff(price_micro_per_kwh=100000)
+    day, night = schedule.intervals
+    profile = AsicProfile(name="fixture", schedule=schedule)
+    DB.session.add(profile)
+
+    def make(count, first=0):
+        start = datetime(2024, 1, 2, 17, 58, tzinfo=UTC)
+        for i in range(first, first + count):
+            asic = Asic(
+                name=f"asic-{i}",
+                address=f"10.0.0.{i}",
+                password="pw",
+                profile=profile,
+                is_active=True,
+                is_online=True,
+                is_hashing=True,
+                is_stable=True,
+                updated_at=start,
+            )
+            DB.session.add(asic)
+            for minute, interval in enumerate((day, day, night)):
+                DB.session.add(
+                    PerformanceSample(
+                        asic=asic,
+                        hashing_interval=interval,
+                        timestamp=start + timedelta(minutes=minute),
+                        interval_secs=60,
+                        is_online=True,
+                        is_hashing=True,
+                        is_stable=True,
+                        hash_rate=100 + minute,
+                        power=3000,
+                        power_limit=3100,
+                        power_per_th=30,
+                        temp=60,
+                        env_temp=10,
+                        tariff=tariff,
+                    )
+                )
+                if minute in (0, 2):
+                    DB.session.add(
+                        AsicTransition(
+                            asic=asic,
+                            kind=TransitionKind.interval.value,
+                            hashing_interval=interval,
+                            timestamp=start + timedelta(minutes=minute),
+                        )
+                    )
+        DB.session.commit()
+
+    return make
+
+
+class TestAsicsSummary:
+    def test_summary_of_whole_fleet(self, fleet):
+        """Test the fleet summary matches the per-asic summaries"""
+        from hfh.db import DB
+        from hfh.dtos.asics import AsicsSummaryDto, AsicSummaryDto
+        from hfh.models.asic import Asic
+
+        fleet(3)
+        DB.session.expunge_all()
+        summary = AsicsSummaryDto.for_all_active()
+
+        assert [s.name for s in summary.asics] == ["asic-0", "asic-1", "asic-2"]
+        for s in summary.asics:
+            assert s.hash_rate == 102
+            assert s.interval_name == "night"
+            assert s.interval_changed_at == datetime(2024, 1, 2, 18, 0, tzinfo=UTC)
+            assert s == AsicSummaryDto.from_asic(Asic.with_name(s.name))
+
+    def test_query_count_is_independent_of_fleet_size(self, fleet, count_queries):
+        """Test that the fleet summary doesn't query per asic"""
+        from hfh.db import DB
+        from hfh.dtos.asics import AsicsSummaryDto
+
+        fleet(2)
+        DB.session.expunge_all()
+        count_queries.clear()
+        AsicsSummaryDto.for_all_active()
+        small = len(count_queries)
+
+        fleet(4, first=2)
+        DB.session.expunge_all()
+        count_queries.clear()
+        summary = AsicsSummaryDto.for_all_active()
+
+        assert len(summary.asics) == 6
+        assert small <= 7
+        assert len(count_queries) == small
+
+    def test_summary_from_current_state(self, fleet, count_queries):
+        """Test that asics with a current state are summarized from it alone"""
+        from hfh.db import DB
+        from hfh.dtos.asics import AsicsSummaryDto
+        from hfh.models.asic import Asic
+        from hfh.models.asic_current_state import AsicCurrentState
+
+        fleet(2)
+        for asic in Asic.all_active():
+            DB.session.add(
+                AsicCurrentState(
+                    asic=asic,
+                    sampled_at=datetime(2024, 1, 2, 18, 5),
+                    hash_rate=90,
+                    power=3000,
+                    power_limit=3100,
+                    power_per_th=30,
+                    temp=60,
+                    env_temp=10,
+                    price_per_kwh=Decimal("0.1"),
+                    hashing_interval=asic.profile.schedule.intervals[1],
+                    interval_started_at=datetime(2024, 1, 2, 17, 59),
+                    interval_until=datetime(2024, 1, 3, 13, 0),
+                )
+            )
+        DB.session.commit()
+        DB.session.expunge_all()
+        count_queries.clear()
+
+        summary = AsicsSummaryDto.for_all_active()
+
+        assert {(s.hash_rate, s.interval_name) for s in summary.asics} == {(90, "night")}
+        assert summary.asics[0].interval_until == datetime(2024, 1, 3, 13, 0, tzinfo=UTC)
+        assert not any("performance_samples" in q for q in count_queries)
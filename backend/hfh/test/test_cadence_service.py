@@ -0,0 +1,133 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+
+@pytest.fixture
+def profile(schedule):
+    """A profile on the day / night schedule, sampled less often while paused"""
+    from hfh.db import DB
+    from hfh.models.asic_profile import AsicProfile
+
+    profile = AsicProfile(name="fixture", schedule=schedule, sample_secs_paused=600)
+    DB.session.add(profile)
+    DB.session.commit()
+    return profile
+
+
+DENVER = ZoneInfo("America/Denver")
+
+
+def make_asic(profile, **flags):
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+
+    count = DB.session.scalar(DB.select(DB.func.count(Asic.id)))
+    asic = Asic(
+        name=f"asic-{count}",
+        address="10.0.0.1",
+        password="pw",
+        profile=profile,
+        is_active=True,
+        **flags,
+    )
+    DB.session.add(asic)
+    DB.session.commit()
+    return asic
+
+
+class TestCadenceService:
+    def test_sample_secs_by_status(self, profile):
+        """Test the cadence follows the status, with the profile's overrides"""
+        from hfh.services.cadence_service import CadenceService
+
+        at = datetime(2024, 1, 2, 10, 0, tzinfo=DENVER)
+        cadence = CadenceService()
+
+        hashing = make_asic(profile, is_online=True, is_hashing=True, is_stable=True)
+        ramping = make_asic(profile, is_online=True, is_hashing=True, is_stable=False)
+        paused = make_asic(profile, is_online=True, is_hashing=False, is_stable=True)
+
+        assert cadence.sample_secs(hashing, at) == 60
+        assert cadence.sample_secs(ramping, at) == 5
+        assert cadence.sample_secs(paused, at) == 600
+
+    def test_sample_fast_near_boundary(self, profile):
+        """Test that asics are sampled fast around a schedule change"""
+        from hfh.services.cadence_service import CadenceService
+
+        cadence = CadenceService()
+        asic = make_asic(profile, is_online=True, is_hashing=True, is_stable=True)
+
+        def at(hour, minute):
+            return datetime(2024, 1, 2, hour, minute, tzinfo=DENVER)
+
+        assert cadence.sample_secs(asic, at(10, 0)) == 60
+        assert cadence.sample_secs(asic, at(17, 59)) == 5
+        assert cadence.sample_secs(asic, at(18, 1)) == 5
+        assert cadence.sample_secs(asic, at(18, 3)) == 60
+        # In another timezone
+        utc = at(17, 59).astimezone(ZoneInfo("UTC"))
+        assert CadenceService().sample_secs(asic, utc) == 5
+
+    def test_next_change_remembered_until_passed(self, profile, monkeypatch):
+        """Test that the schedule is only looked at again once its next change of
+        interval is past"""
+        from hfh.services.cadence_service import CadenceService
+
+        cadence = CadenceService()
+        asic = make_asic(profile, is_online=True, is_hashing=True, is_stable=True)
+
+        looked = []
+        next_change = CadenceService._next_change
+
+        def counted(config, since):
+            looked.append(since)
+            return next_change(config, since)
+
+        monkeypatch.setattr(CadenceService, "_next_change", staticmethod(counted))
+        for minute in range(0, 60, 5):
+            cadence.sample_secs(asic, datetime(2024, 1, 2, 17, minute, tzinfo=DENVER))
+        assert len(looked) == 1
+
+        cadence.sample_secs(asic, datetime(2024, 1, 2, 18, 3, tzinfo=DENVER))
+        assert len(looked) == 2
+
+    def test_due_and_actual_interval(self, profile):
+        """Test that only due asics are sampled, and the actual interval recorded"""
+        from hfh.services.cadence_service import CadenceService
+
+        cadence = CadenceService()
+        at = datetime(2024, 1, 2, 10, 0, tzinfo=DENVER)
+        asic = make_asic(profile, is_online=True, is_hashing=True, is_stable=True)
+
+        assert cadence.due([asic], now=1000, moment=at) == [asic]
+        assert cadence.mark_sampled(asic, now=1000) == 60
+
+        assert cadence.due([asic], now=1030, moment=at) == []
+        assert cadence.due([asic], now=1060, moment=at) == [asic]
+        assert cadence.mark_sampled(asic, now=1062) == 62
+
+    def test_profile_cadence_from_fleet_snapshot(self, profile, count_queries):
+        """Test that a tick doesn't load each asic's profile for its cadence"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.services.cadence_service import CadenceService
+        from hfh.services.fleet_config import FLEET
+
+        cadence = CadenceService()
+        for _ in range(3):
+            asic = make_asic(profile, is_online=True, is_hashing=False, is_stable=True)
+            cadence.mark_sampled(asic, now=1000)
+        FLEET.current()
+
+        # As each tick loads them
+        DB.session.expunge_all()
+        asics = Asic.all_active()
+        at = datetime(2024, 1, 2, 10, 0, tzinfo=DENVER)
+        del count_queries[:]
+
+        assert cadence.due(asics, now=1300, moment=at) == []
+        assert cadence.due(asics, now=1600, moment=at) == asics
+        assert not [q for q in count_queries if "asic_profiles" in q]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    """A registry whose clock is under the test's control"""
+    import hfh.services.circuit_breaker as circuit_breaker
+    from hfh.services.circuit_breaker import BreakerRegistry
+
+    clock = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "monotonic", lambda: clock[0])
+
+    registry = BreakerRegistry(threshold=2, min_backoff=30, max_backoff=100)
+    registry.clock = clock
+    return registry
+
+
+async def call(breakers, fail=False):
+    async with breakers.guard("10.0.0.1"):
+        if fail:
+            raise OSError("unreachable")
+        return "ok"
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, breakers):
+        """Test that the breaker opens after `threshold` failures and then fails fast"""
+        from hfh.services.circuit_breaker import BreakerState, CircuitOpenError
+
+        for _ in range(2):
+            with pytest.raises(OSError):
+                asyncio.run(call(breakers, fail=True))
+
+        assert breakers.state("10.0.0.1") == BreakerState.open
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(call(breakers))
+
+    def test_half_open_probe_backs_off_exponentially(self, breakers):
+        """Test that a failed probe re-opens with double the backoff, up to the max"""
+        from hfh.services.circuit_breaker import BreakerState, CircuitOpenError
+
+        for _ in range(2):
+            with pytest.raises(OSError):
+                asyncio.run(call(breakers, fail=True))
+        assert breakers.get("10.0.0.1").retry_in == 30
+
+        backoffs = []
+        for _ in range(3):
+            breakers.clock[0] += breakers.get("10.0.0.1").retry_in
+            with pytest.raises(OSError):
+                asyncio.run(call(breakers, fail=True))
+            backoffs.append(breakers.get("10.0.0.1").retry_in)
+            with pytest.raises(CircuitOpenError):
+                asyncio.run(call(breakers))
+        assert backoffs == [60, 100, 100]
+
+        breakers.clock[0] += 100
+        assert asyncio.run(call(breakers)) == "ok"
+        assert breakers.state("10.0.0.1") == BreakerState.closed
+
+    def test_timeout_counts_as_failure(self, breakers):
+        """Test that being cancelled by a timeout counts against the miner"""
+
+        async def slow():
+            async with breakers.guard("10.0.0.1"):
+                await asyncio.sleep(10)
+
+        for _ in range(2):
+            with pytest.raises(TimeoutError):
+                asyncio.run(asyncio.wait_for(slow(), timeout=0.01))
+
+        assert breakers.get("10.0.0.1").failures == 2
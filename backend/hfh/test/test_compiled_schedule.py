@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+MTN = ZoneInfo("America/Denver")
+
+
+@pytest.fixture
+def schedule(schedule):
+    """The shared schedule, with overlapping, wrapping and restricted intervals"""
+    from hfh.models.hashing_interval import HashingInterval
+
+    schedule.intervals = []
+    for n, (dates, times, weekdays, temps, is_active) in enumerate(
+        [
+            (("10/01", "06/01"), ("00:00", "14:00"), "MoTuWeTh", (None, None), True),
+            (("10/01", "06/01"), ("21:00", "06:00"), "*", (None, 5), True),
+            (("03/01", "06/01"), ("14:00", "19:00"), "", (None, None), True),
+            (("12/20", "01/05"), ("00:00", "00:00"), "SaSu", (-10, None), True),
+            (("07/01", "07/31"), ("08:00", "08:00"), "*", (None, None), True),
+            (("01/01", "01/01"), ("06:30", "22:15"), "Fr", (None, None), False),
+            (("01/01", "01/01"), ("00:00", "00:00"), "*", (None, 30), True),
+        ]
+    ):
+        HashingInterval(
+            name=f"interval-{n}",
+            schedule=schedule,
+            date_start_mmdd=dates[0],
+            date_end_mmdd=dates[1],
+            daytime_start_hhmm=times[0],
+            daytime_end_hhmm=times[1],
+            weekdays_active=weekdays,
+            temp_min=temps[0],
+            temp_max=temps[1],
+            hashing_enabled=n % 2 == 0,
+            is_active=is_active,
+        )
+    return schedule
+
+
+def linear(schedule, moment, temp):
+    """The interval in effect, the uncompiled way"""
+    from hfh.models.scenario import Scenario
+
+    for interval in schedule.intervals:
+        if interval.is_active_under(Scenario(moment=moment, temp=temp)):
+            return interval
+    return None
+
+
+class TestCompiledSchedule:
+    @pytest.mark.parametrize("temp", [None, -20, 0, 10, 40])
+    def test_same_as_checking_each_interval(self, schedule, temp):
+        moment = datetime(2024, 12, 25, 0, 0, tzinfo=MTN)
+        while moment < datetime(2026, 1, 10, tzinfo=MTN):
+            assert schedule.compiled.interval_at(moment, temp) is linear(
+                schedule, moment, temp
+            ), moment
+            moment += timedelta(hours=7, minutes=13)
+
+    def test_dates_before_the_start_are_not_in_the_window(self, schedule):
+        """Mar 1 - Jun 1 doesn't include the January before it"""
+        spring = schedule.intervals[2]
+        assert not spring.is_active_at(datetime(2025, 1, 15, 15, 0, tzinfo=MTN))
+        assert spring.is_active_at(datetime(2025, 3, 1, 15, 0, tzinfo=MTN))
+        assert spring.is_active_at(datetime(2025, 6, 1, 15, 0, tzinfo=MTN))
+        assert not spring.is_active_at(datetime(2025, 6, 2, 15, 0, tzinfo=MTN))
+
+    def test_next_change(self, schedule):
+        compiled = schedule.compiled
+        assert compiled.next_change(datetime(2025, 3, 3, 9, 0, tzinfo=MTN)) == datetime(
+            2025, 3, 3, 14, 0, tzinfo=MTN
+        )
+        assert compiled.next_change(datetime(2025, 3, 3, 14, 0, tzinfo=MTN)) == datetime(
+            2025, 3, 3, 19, 0, tzinfo=MTN
+        )
+        assert compiled.next_change(datetime(2025, 3, 3, 21, 30, tzinfo=MTN)) == datetime(
+            2025, 3, 4, 0, 0, tzinfo=MTN
+        )
+
+    def test_override_on_its_own(self, schedule):
+        override = schedule.intervals[1]
+        assert (
+            override.compiled.interval_at(datetime(2025, 1, 6, 23, 0, tzinfo=MTN))
+            is override
+        )
+        assert (
+            override.compiled.interval_at(
+                datetime(2025, 1, 6, 23, 0, tzinfo=MTN), temp=10
+            )
+            is None
+        )
+        assert (
+            override.compiled.interval_at(datetime(2025, 1, 6, 12, 0, tzinfo=MTN)) is None
+        )
@@ -0,0 +1,68 @@
+import asyncio
+import contextvars
+
+import pytest
+
+REQUEST_ID = contextvars.ContextVar("REQUEST_ID", default=None)
+
+
+@pytest.fixture
+def loop():
+    from hfh.event_loop import BackgroundLoop
+
+    background = BackgroundLoop()
+    yield background
+    background.stop()
+
+
+class TestBackgroundLoop:
+    def test_run_returns_result_from_one_loop(self, loop):
+        """Test that every call runs on the same long-lived loop"""
+
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        first = loop.run(running_loop())
+        second = loop.run(running_loop())
+        assert first is second
+        assert first is loop.loop
+
+    def test_run_sees_callers_context(self, loop):
+        """Test that the coroutine sees the caller's context variables"""
+
+        async def request_id():
+            return REQUEST_ID.get()
+
+        token = REQUEST_ID.set("abc")
+        try:
+            assert loop.run(request_id()) == "abc"
+        finally:
+            REQUEST_ID.reset(token)
+
+    def test_run_raises_coroutine_exception(self, loop):
+        """Test that an exception in the coroutine is raised to the caller"""
+
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            loop.run(fail())
+
+    def test_run_timeout_cancels_coroutine(self, loop):
+        """Test that timing out cancels the coroutine on the loop"""
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def was_cancelled():
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+            return cancelled.is_set()
+
+        with pytest.raises(TimeoutError):
+            loop.run(slow(), timeout=0.05)
+        assert loop.run(was_cancelled()) is True
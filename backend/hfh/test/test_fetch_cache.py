@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import hfh.services.fetch_cache as fetch_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(fetch_cache, "monotonic", lambda: now[0])
+    return now
+
+
+class Miner:
+    """Counts fetches, each answering with the fetch number"""
+
+    def __init__(self):
+        self.fetches = 0
+
+    async def fetch(self):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        return self.fetches
+
+
+class TestFetchCache:
+    def test_concurrent_callers_share_one_fetch(self, clock):
+        """Test that concurrent callers for the same key are coalesced"""
+        from hfh.services.fetch_cache import FetchCache
+
+        cache = FetchCache(ttl=5, max_stale=60)
+        miner = Miner()
+
+        async def many():
+            return await asyncio.gather(
+                *(cache.get("raw", miner.fetch) for _ in range(5))
+            )
+
+        results = asyncio.run(many())
+        assert [r.value for r in results] == [1] * 5
+        assert miner.fetches == 1
+
+    def test_stale_while_revalidate(self, clock):
+        """Test that stale data is served while a fresh copy is fetched"""
+        from hfh.services.fetch_cache import FetchCache
+
+        cache = FetchCache(ttl=5, max_stale=60)
+        miner = Miner()
+
+        async def scenario():
+            first = await cache.get("raw", miner.fetch)
+
+            clock[0] += 2
+            fresh = await cache.get("raw", miner.fetch)
+
+            clock[0] += 10
+            stale = await cache.get("raw", miner.fetch)
+            assert stale.age == 12
+            await asyncio.sleep(0.05)  # Let the background refresh finish
+            refreshed = await cache.get("raw", miner.fetch)
+            assert refreshed.age == 0
+
+            clock[0] += 100
+            expired = await cache.get("raw", miner.fetch)
+            return first, fresh, stale, refreshed, expired
+
+        first, fresh, stale, refreshed, expired = asyncio.run(scenario())
+        assert (first.value, fresh.value, stale.value) == (1, 1, 1)
+        assert refreshed.value == 2
+        assert expired.value == 3
+
+    def test_failures_are_not_cached(self, clock):
+        """Test that a failed fetch is raised to the callers and retried next time"""
+        from hfh.services.fetch_cache import FetchCache
+
+        cache = FetchCache(ttl=5, max_stale=60)
+        attempts = []
+
+        async def fetch():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError("unreachable")
+            return "ok"
+
+        with pytest.raises(OSError):
+            asyncio.run(cache.get("raw", fetch))
+        assert asyncio.run(cache.get("raw", fetch)).value == "ok"
@@ -0,0 +1,167 @@
+from datetime import UTC, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+MTN = ZoneInfo("America/Denver")
+
+
+@pytest.fixture
+def fleet(schedule):
+    """Two active asics on a day / night schedule, and an inactive one"""
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+    from hfh.models.asic_profile import AsicProfile
+
+    schedule.intervals[0].hashing_enabled = False  # Hashing at night only
+    profile = AsicProfile(name="fixture", schedule=schedule)
+    asics = [
+        Asic(name=f"asic-{i}", address=f"10.0.0.{i}", password="pw", is_active=i < 2)
+        for i in (1, 0, 2)
+    ]
+    for asic in asics:
+        asic.profile = profile
+    DB.session.add_all(asics)
+    DB.session.commit()
+    return asics
+
+
+def override(hashing):
+    from hfh.models.hashing_interval import HashingInterval
+
+    return HashingInterval(
+        name="override",
+        daytime_start_hhmm="00:00",
+        daytime_end_hhmm="00:00",
+        date_start_mmdd="01/01",
+        date_end_mmdd="01/01",
+        hashing_enabled=hashing,
+        weekdays_active="*",
+        is_active=True,
+    )
+
+
+class TestFleetConfig:
+    def test_snapshot_of_active_asics(self, fleet):
+        from hfh.services.fleet_config import FLEET
+
+        config = FLEET.current()
+        assert config.names == ["asic-0", "asic-1"]
+        asic = config.asics["asic-0"]
+        assert asic.timezone == MTN
+        assert asic.override is None
+
+        night = datetime(2025, 1, 6, 22, 0, tzinfo=MTN)
+        day = datetime(2025, 1, 6, 12, 0, tzinfo=MTN)
+        intervals = {i.name: i.id for i in fleet[0].profile.schedule.intervals}
+        assert asic.interval_id_at(night) == intervals["night"]
+        assert asic.interval_id_at(day) == intervals["day"]
+
+    def test_temp_dependent(self, fleet):
+        """Test that asics with an interval bounded by temperature are picked out"""
+        from hfh.db import DB
+        from hfh.services.fleet_config import FLEET
+
+        assert FLEET.current().temp_dependent_ids == frozenset()
+
+        cold = override(True)
+        cold.temp_max = 0
+        fleet[1].override_interval = cold
+        DB.session.commit()
+
+        config = FLEET.current()
+        assert config.temp_dependent_ids == {fleet[1].id}
+        assert config.by_id[fleet[1].id].depends_on_temp
+
+    def test_same_interval_as_through_relations(self, fleet, monkeypatch):
+        from hfh.services.fleet_config import FLEET
+        from hfh.services.schedule_service import ScheduleService
+
+        asic = fleet[1]
+        moment = datetime(2025, 1, 6, 22, 0, tzinfo=MTN)
+        from_snapshot = ScheduleService().get_current_interval(asic, moment)
+
+        monkeypatch.setattr(FLEET, "config_of", lambda _: None)
+        assert from_snapshot is ScheduleService().get_current_interval(asic, moment)
+        assert from_snapshot.name == "night"
+
+    def test_committed_changes_replace_the_snapshot(self, fleet):
+        from hfh.db import DB
+        from hfh.services.fleet_config import FLEET
+        from hfh.services.schedule_service import ScheduleService
+
+        asic = fleet[1]
+        moment = datetime(2025, 1, 6, 22, 0, tzinfo=MTN)
+        before = FLEET.current()
+
+        # Not configuration
+        asic.is_online = True
+        asic.updated_at = datetime.now(tz=UTC)
+        DB.session.commit()
+        assert FLEET.current() is before
+
+        # Uncommitted, the asic no longer matches its snapshot
+        asic.override_interval = override(hashing=False)
+        DB.session.flush()
+        assert FLEET.config_of(asic) is None
+        DB.session.commit()
+
+        after = FLEET.current()
+        assert after is not before
+        assert after.version > before.version
+        assert after.asics["asic-0"].override is not None
+        interval = ScheduleService().get_current_interval(asic, moment)
+        assert interval is asic.override_interval
+
+    def test_rolled_back_changes_replace_the_snapshot(self, fleet):
+        from hfh.db import DB
+        from hfh.services.fleet_config import FLEET
+
+        fleet[1].is_active = False
+        DB.session.flush()
+        assert FLEET.current().names == ["asic-1"]
+        DB.session.rollback()
+
+        assert FLEET.current().names == ["asic-0", "asic-1"]
+
+    def test_stale_after_ttl(self, fleet, monkeypatch):
+        from hfh.services import fleet_config
+        from hfh.services.fleet_config import FLEET
+
+        before = FLEET.current()
+        monkeypatch.setattr(
+            fleet_config, "monotonic", lambda: before.loaded_at + FLEET.ttl_secs + 1
+        )
+        assert FLEET.current() is not before
+
+    def test_lookups_from_the_session(self, fleet):
+        from sqlalchemy import event
+
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.services.fleet_config import FLEET
+        from hfh.services.schedule_service import ScheduleService
+
+        asic = Asic.with_name("asic-0")
+        intervals = asic.profile.schedule.intervals
+        FLEET.current()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(DB.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            assert Asic.with_name("asic-0") is asic
+            interval = ScheduleService().get_current_interval(
+                asic, datetime(2025, 1, 6, 12, 0, tzinfo=MTN)
+            )
+        finally:
+            event.remove(DB.engine, "before_cursor_execute", before_cursor_execute)
+
+        assert interval in intervals
+        assert statements == []
+
+        assert Asic.with_name("asic-2").is_active is False
+        assert Asic.with_name("nope") is None
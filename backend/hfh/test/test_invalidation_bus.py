@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def bus(app):
+    from hfh.services.invalidation_bus import InvalidationBus
+
+    return InvalidationBus(channel="test")
+
+
+class FakePostgresSession:
+    """Just enough of a session on postgres to publish through"""
+
+    def __init__(self):
+        self.info = {}
+        self.executed = []
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def connection(self):
+        return SimpleNamespace(execute=lambda stmt, params: self.executed.append(params))
+
+
+def message(topic, origin="elsewhere"):
+    return json.dumps({"topic": topic, "origin": origin})
+
+
+class TestInvalidationBus:
+    def test_publishes_each_topic_once_per_transaction(self, bus):
+        session = FakePostgresSession()
+        bus.publish(session, "fleet_config")
+        bus.publish(session, "fleet_config")
+        bus.publish(session, "transitions")
+
+        assert [(p["channel"], json.loads(p["payload"])) for p in session.executed] == [
+            ("test", {"topic": "fleet_config", "origin": bus.origin}),
+            ("test", {"topic": "transitions", "origin": bus.origin}),
+        ]
+
+    def test_nothing_published_without_postgres(self, bus):
+        from hfh.db import DB
+
+        bus.publish(DB.session(), "fleet_config")
+        assert "published_topics" not in DB.session().info
+        assert not bus.start()
+
+    def test_published_again_after_rollback(self, bus):
+        from hfh.services.invalidation_bus import _forget_published
+
+        session = FakePostgresSession()
+        bus.publish(session, "fleet_config")
+        _forget_published(session)
+        bus.publish(session, "fleet_config")
+        assert len(session.executed) == 2
+
+    def test_dispatches_to_the_topics_handlers(self, bus):
+        heard = []
+        bus.subscribe("fleet_config", lambda: heard.append("fleet_config"))
+        bus.subscribe("transitions", lambda: heard.append("transitions"))
+
+        bus.dispatch(message("fleet_config"))
+        bus.dispatch(message("unknown"))
+        assert heard == ["fleet_config"]
+
+    def test_ignores_its_own_and_bad_messages(self, bus):
+        heard = []
+        bus.subscribe("fleet_config", lambda: heard.append("fleet_config"))
+
+        bus.dispatch(message("fleet_config", origin=bus.origin))
+        bus.dispatch("not json")
+        bus.dispatch(json.dumps({"topic": "fleet_config"}))
+        assert heard == []
+
+    def test_a_failing_handler_doesnt_stop_the_others(self, bus):
+        heard = []
+
+        def fail():
+            raise RuntimeError("nope")
+
+        bus.subscribe("fleet_config", fail)
+        bus.subscribe("fleet_config", lambda: heard.append("fleet_config"))
+        bus.dispatch(message("fleet_config"))
+        assert heard == ["fleet_config"]
+
+    def test_fleet_config_invalidated_by_other_processes(self, app):
+        from hfh.services.fleet_config import FLEET
+        from hfh.services.invalidation_bus import BUS
+
+        version = FLEET.version
+        BUS.dispatch(message("fleet_config"))
+        assert FLEET.version == version + 1
@@ -0,0 +1,102 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).parents[2]
+
+# The migrations are written for postgres; this one gets a scratch database
+# to run them against, which is emptied before and after
+POSTGRES_URI = os.getenv("TEST_POSTGRES_URI")
+
+
+def alembic_config(url: str, output_buffer=None):
+    from alembic.config import Config
+
+    config = Config(output_buffer=output_buffer)
+    config.set_main_option("script_location", str(BACKEND / "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+class TestCompactSampleSchema:
+    def test_clamps_every_column_before_narrowing_it(self):
+        from alembic import command
+
+        buffer = io.StringIO()
+        config = alembic_config(
+            "postgresql://postgres:password@db:5432/hfh_dev", output_buffer=buffer
+        )
+        command.upgrade(config, "b6e3f0a1d84c:c8f2a5d17e93", sql=True)
+        sql = buffer.getvalue()
+
+        clamp = sql.index("UPDATE performance_samples SET interval_secs = LEAST(")
+        for name in [
+            "interval_secs",
+            "hash_rate",
+            "power",
+            "power_limit",
+            "power_per_th",
+            "temp",
+            "env_temp",
+        ]:
+            assert f"{name} = LEAST(GREATEST({name}, -32768), 32767)" in sql
+            narrow = sql.index(
+                f"ALTER TABLE performance_samples ALTER COLUMN {name} TYPE SMALLINT"
+            )
+            assert clamp < narrow
+
+    @pytest.mark.skipif(not POSTGRES_URI, reason="TEST_POSTGRES_URI is not set")
+    def test_upgrades_out_of_range_samples(self):
+        import sqlalchemy as sa
+
+        from alembic import command
+
+        engine = sa.create_engine(POSTGRES_URI)
+        reset = "DROP SCHEMA public CASCADE; CREATE SCHEMA public"
+        with engine.begin() as conn:
+            conn.execute(sa.text(reset))
+        config = alembic_config(POSTGRES_URI)
+
+        try:
+            command.upgrade(config, "b6e3f0a1d84c")
+            with engine.begin() as conn:
+                conn.execute(
+                    sa.text(
+                        """
+                        INSERT INTO asics (id, name, address, password)
+                        VALUES (1, 'a1', '10.0.0.1', 'root');
+                        INSERT INTO performance_samples (
+                            asic_id, "timestamp", interval_secs, is_online,
+                            is_hashing, is_stable, hash_rate, power, power_limit,
+                            power_per_th, temp, env_temp, price_per_kwh
+                        ) VALUES
+                            (1, now(), 90000, true, true, true, 40000, 3300,
+                             -40000, 70000, 65, 25, 0.12),
+                            (1, now(), 60, true, true, true, 140, 3300,
+                             3500, 23, 65, 25, 0.12)
+                        """
+                    )
+                )
+
+            command.upgrade(config, "c8f2a5d17e93")
+
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    sa.text(
+                        """
+                        SELECT interval_secs, hash_rate, power, power_limit,
+                            power_per_th, temp, env_temp
+                        FROM performance_samples ORDER BY id
+                        """
+                    )
+                ).all()
+            assert [tuple(row) for row in rows] == [
+                (32767, 32767, 3300, -32768, 32767, 65, 25),
+                (60, 140, 3300, 3500, 23, 65, 25),
+            ]
+        finally:
+            with engine.begin() as conn:
+                conn.execute(sa.text(reset))
+            engine.dispose()
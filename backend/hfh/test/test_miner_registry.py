@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def discovered(monkeypatch):
+    """Replace pyasic discovery with a fake that records each address asked for"""
+    import hfh.services.miner_registry as miner_registry
+
+    calls = []
+
+    async def get_miner(address):
+        calls.append(address)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(ip=address, pwd=None)
+
+    monkeypatch.setattr(miner_registry.pyasic, "get_miner", get_miner)
+    return calls
+
+
+class TestMinerRegistry:
+    def test_driver_is_reused(self, discovered):
+        """Test that a driver is discovered once and then shared"""
+        from hfh.services.miner_registry import MinerRegistry
+
+        registry = MinerRegistry(ttl=60)
+
+        async def run():
+            first = await registry.get("10.0.0.1", "secret")
+            second = await registry.get("10.0.0.1", "secret")
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first is second
+        assert first.pwd == "secret"
+        assert discovered == ["10.0.0.1"]
+
+    def test_concurrent_callers_share_discovery(self, discovered):
+        """Test that concurrent callers for one address share a single discovery"""
+        from hfh.services.miner_registry import MinerRegistry
+
+        registry = MinerRegistry(ttl=60)
+
+        async def run():
+            return await asyncio.gather(*(registry.get("10.0.0.1") for _ in range(5)))
+
+        miners = asyncio.run(run())
+        assert all(m is miners[0] for m in miners)
+        assert discovered == ["10.0.0.1"]
+
+    def test_invalidate_and_expiry(self, discovered):
+        """Test that invalidated or expired drivers are rediscovered"""
+        from hfh.services.miner_registry import MinerRegistry
+
+        registry = MinerRegistry(ttl=60)
+        asyncio.run(registry.get("10.0.0.1"))
+        registry.invalidate("10.0.0.1")
+        asyncio.run(registry.get("10.0.0.1"))
+        assert discovered == ["10.0.0.1", "10.0.0.1"]
+
+        registry.ttl = 0
+        asyncio.run(registry.get("10.0.0.1"))
+        assert len(discovered) == 3
+
+    def test_password_change_updates_driver(self, discovered):
+        """Test that a new password is applied to the existing driver"""
+        from hfh.services.miner_registry import MinerRegistry
+
+        registry = MinerRegistry(ttl=60)
+        asyncio.run(registry.get("10.0.0.1", "old"))
+        miner = asyncio.run(registry.get("10.0.0.1", "new"))
+        assert miner.pwd == "new"
+        assert discovered == ["10.0.0.1"]
+
+    def test_driver_built_from_known_class(self, discovered):
+        """Test that a known miner class skips discovery until it is distrusted"""
+        from hfh.services.miner_registry import (
+            MinerRegistry,
+            _miner_classes,
+            miner_class_name,
+        )
+
+        miner_class = next(iter(_miner_classes()))
+        registry = MinerRegistry(ttl=60)
+
+        miner = asyncio.run(registry.get("10.0.0.1", miner_class=miner_class))
+        assert miner_class_name(type(miner)) == miner_class
+        assert discovered == []
+
+        # A hinted driver that stops working is rediscovered
+        registry.invalidate("10.0.0.1")
+        asyncio.run(registry.get("10.0.0.1", miner_class=miner_class))
+        assert discovered == ["10.0.0.1"]
+
+    def test_classes_by_the_same_name_kept_apart(self, discovered):
+        """Test that driver classes are known by their full name, as pyasic has
+        different ones by the same name"""
+        from pyasic.miners.miner_factory import MINER_CLASSES
+
+        from hfh.services.miner_registry import _miner_classes, miner_class_name
+
+        classes = _miner_classes()
+        assert len(classes) == len(
+            {cls for c in MINER_CLASSES.values() for cls in c.values()}
+        )
+        for name, cls in classes.items():
+            assert miner_class_name(cls) == name
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+
+class TestPartitionNames:
+    def test_add_months(self, app):
+        from hfh.services.partition_service import add_months
+
+        assert add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+        assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+        assert add_months(date(2026, 3, 1), -15) == date(2024, 12, 1)
+
+    def test_partition_name_round_trips(self, app):
+        from hfh.services.partition_service import partition_month, partition_name
+
+        assert partition_name(date(2026, 3, 1)) == "performance_samples_y2026m03"
+        assert partition_month("performance_samples_y2026m03") == date(2026, 3, 1)
+        assert partition_month("performance_samples_old") is None
+
+
+class TestPartitionService:
+    def test_months_to_create(self, app):
+        from hfh.services.partition_service import PartitionService
+
+        service = PartitionService(months_ahead=2)
+        assert service.months_to_create(datetime(2026, 11, 20, 8)) == [
+            date(2026, 11, 1),
+            date(2026, 12, 1),
+            date(2027, 1, 1),
+        ]
+
+    def test_keeps_everything_by_default(self, app):
+        from hfh.services.partition_service import PartitionService
+
+        service = PartitionService(retention_months=0)
+        assert service.expires_before(datetime(2026, 11, 20)) is None
+        assert service.drop_expired(datetime(2026, 11, 20)) == []
+
+    def test_drops_partitions_past_retention(self, app, monkeypatch):
+        from hfh.services.partition_service import PartitionService
+
+        dropped = []
+        service = PartitionService(retention_months=2)
+        monkeypatch.setattr(
+            service,
+            "partitions",
+            lambda: [
+                "performance_samples_y2026m08",
+                "performance_samples_y2026m09",
+                "performance_samples_y2026m10",
+                "performance_samples_y2026m11",
+            ],
+        )
+        monkeypatch.setattr(
+            service.db_session, "execute", lambda stmt: dropped.append(str(stmt))
+        )
+
+        assert service.expires_before(datetime(2026, 11, 20)) == date(2026, 9, 1)
+        assert service.drop_expired(datetime(2026, 11, 20)) == [
+            "performance_samples_y2026m08"
+        ]
+        assert dropped == ["DROP TABLE performance_samples_y2026m08"]
+
+    def test_does_nothing_unpartitioned(self, app):
+        from hfh.services.partition_service import PartitionService
+
+        service = PartitionService(retention_months=1)
+        assert not service.is_partitioned
+        service.maintain(datetime(2026, 11, 20))
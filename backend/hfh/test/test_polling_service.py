@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+
+def make_asics(count):
+    return [SimpleNamespace(name=f"asic-{i}") for i in range(count)]
+
+
+class TestPollingService:
+    def test_polls_concurrently_up_to_limit(self):
+        """Test that no more than `concurrency` jobs run at once"""
+        from hfh.services.polling_service import PollingService, PollOutcome
+
+        running = 0
+        max_running = 0
+
+        async def job(asic):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return asic.name
+
+        service = PollingService(concurrency=3, miner_timeout=1, cycle_deadline=5)
+        results = asyncio.run(service.poll(make_asics(10), job))
+
+        assert max_running == 3
+        assert [r.value for r in results] == [f"asic-{i}" for i in range(10)]
+        assert all(r.outcome == PollOutcome.ok for r in results)
+
+    def test_slow_miner_times_out_without_blocking_others(self):
+        """Test that one slow miner only costs its own timeout"""
+        from hfh.services.polling_service import PollingService, PollOutcome
+
+        async def job(asic):
+            if asic.name == "asic-0":
+                await asyncio.sleep(10)
+            return asic.name
+
+        service = PollingService(concurrency=10, miner_timeout=0.05, cycle_deadline=5)
+        results = asyncio.run(service.poll(make_asics(5), job))
+
+        assert results[0].outcome == PollOutcome.timeout
+        assert all(r.outcome == PollOutcome.ok for r in results[1:])
+
+    def test_failure_is_reported_per_miner(self):
+        """Test that an exception is captured in that miner's result"""
+        from hfh.services.polling_service import PollingService, PollOutcome
+
+        async def job(asic):
+            if asic.name == "asic-1":
+                raise ConnectionError("unreachable")
+            return asic.name
+
+        handled = []
+        service = PollingService(concurrency=10, miner_timeout=1, cycle_deadline=5)
+        results = asyncio.run(
+            service.poll(make_asics(3), job, on_result=lambda r: handled.append(r))
+        )
+
+        assert [r.outcome for r in results] == [
+            PollOutcome.ok,
+            PollOutcome.failed,
+            PollOutcome.ok,
+        ]
+        assert isinstance(results[1].error, ConnectionError)
+        assert len(handled) == 3
+
+    def test_cycle_deadline_skips_unfinished(self):
+        """Test that miners still waiting at the cycle deadline are skipped"""
+        from hfh.services.polling_service import PollingService, PollOutcome
+
+        async def job(asic):
+            await asyncio.sleep(0.2)
+            return asic.name
+
+        service = PollingService(concurrency=1, miner_timeout=1, cycle_deadline=0.3)
+        results = asyncio.run(service.poll(make_asics(3), job))
+
+        assert results[0].outcome == PollOutcome.ok
+        assert results[2].outcome == PollOutcome.skipped
+
+
+class TestCommitPolled:
+    def test_failed_flush_only_loses_that_asics_changes(self, app):
+        """Test that one asic failing to save doesn't roll back the others"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.models.asic_transition import AsicTransition
+        from hfh.services.polling_service import PollOutcome, PollResult, commit_polled
+
+        asics = [
+            Asic(name=f"asic-{i}", address=f"10.0.0.{i}", password="pw", is_hashing=False)
+            for i in range(3)
+        ]
+        DB.session.add_all(asics)
+        DB.session.commit()
+
+        # As the polls change them, with nothing flushed until they're done
+        with DB.session.no_autoflush:
+            for asic in asics:
+                asic.is_hashing = True
+                DB.session.add(
+                    AsicTransition(
+                        asic_id=asic.id,
+                        timestamp=datetime(2026, 10, 18, 12),
+                        # Not nullable, so asic-1 fails to flush
+                        kind=None if asic.name == "asic-1" else "status",
+                        status="hashing",
+                    )
+                )
+        commit_polled([PollResult(asic, PollOutcome.ok) for asic in asics])
+
+        DB.session.expire_all()
+        assert [a.is_hashing for a in Asic.query.order_by(Asic.id)] == [
+            True,
+            False,
+            True,
+        ]
+        assert sorted(t.asic_id for t in AsicTransition.query) == [
+            asics[0].id,
+            asics[2].id,
+        ]
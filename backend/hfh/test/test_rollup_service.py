@@ -0,0 +1,122 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def asic(app):
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+
+    asic = Asic(
+        name="asic-0",
+        address="10.0.0.1",
+        password="pw",
+        is_active=True,
+        is_online=True,
+        is_hashing=True,
+        is_stable=True,
+    )
+    DB.session.add(asic)
+    DB.session.commit()
+    return asic
+
+
+def reading(asic, at, is_online=True, is_hashing=True, hash_rate=100):
+    from hfh.services.sampling_service import AsicReading
+
+    return AsicReading(
+        asic_id=asic.id,
+        timestamp=at,
+        is_online=is_online,
+        is_hashing=is_hashing,
+        is_stable=True,
+        interval_secs=60,
+        hash_rate=hash_rate,
+        power=3000,
+        power_limit=3100,
+        power_per_th=30,
+        temp=60,
+        env_temp=10,
+        price_per_kwh=Decimal("0.100"),
+    )
+
+
+def rollups(asic, period):
+    from hfh.models.asic_rollup import AsicRollup
+
+    return {r.period_start: r for r in AsicRollup.for_asic(asic, period)}
+
+
+class TestRollupService:
+    # Databases other than postgres and sqlite upsert without ON CONFLICT
+    @pytest.mark.parametrize("dialect", [None, "mysql"])
+    def test_written_with_the_samples(self, app, asic, dialect, monkeypatch):
+        """Test that each write adds to the hour's and the day's totals"""
+        from hfh.db import DB
+        from hfh.models.asic_rollup import RollupPeriod
+        from hfh.services.sampling_service import write_readings
+
+        if dialect:
+            monkeypatch.setattr(DB.engine.dialect, "name", dialect)
+
+        write_readings(
+            [
+                reading(asic, datetime(2026, 1, 1, 18, 0)),
+                reading(asic, datetime(2026, 1, 1, 18, 1), hash_rate=120),
+            ]
+        )
+        write_readings(
+            [
+                reading(asic, datetime(2026, 1, 1, 18, 2), is_hashing=False, hash_rate=0),
+                reading(asic, datetime(2026, 1, 1, 19, 0), is_online=False),
+            ]
+        )
+        DB.session.commit()
+
+        hours = rollups(asic, RollupPeriod.hour)
+        assert list(hours) == [datetime(2026, 1, 1, 18), datetime(2026, 1, 1, 19)]
+        hour = hours[datetime(2026, 1, 1, 18)]
+        assert hour.samples == 3
+        assert hour.sampled_secs == 180
+        assert (hour.hashing_secs, hour.paused_secs, hour.offline_secs) == (120, 60, 0)
+        assert hour.energy_wh == Decimal("150")  # 3 kW for 3 minutes
+        assert hour.cost == Decimal("0.015")
+        assert hour.hash_rate_max == 120
+        assert hour.avg_hash_rate == pytest.approx(220 / 3)
+        assert hour.avg_temp == 60
+        assert hours[datetime(2026, 1, 1, 19)].offline_secs == 60
+
+        (day,) = rollups(asic, RollupPeriod.day).values()
+        assert day.period_start == datetime(2026, 1, 1)
+        assert (day.samples, day.sampled_secs, day.offline_secs) == (3, 180, 60)
+        assert day.hash_rate_max == 120
+
+    def test_backfill_rederives_from_samples(self, app, asic):
+        """Test that a backfill replaces the totals, keeping the offline time"""
+        from hfh.db import DB
+        from hfh.models.asic_rollup import RollupPeriod
+        from hfh.services.rollup_service import RollupService
+        from hfh.services.sampling_service import write_readings
+
+        write_readings(
+            [
+                reading(asic, datetime(2026, 1, 1, 18, 0)),
+                reading(asic, datetime(2026, 1, 1, 18, 1), is_online=False),
+            ]
+        )
+        DB.session.commit()
+
+        (hour,) = rollups(asic, RollupPeriod.hour).values()
+        hour.samples = 99
+        hour.energy_wh = Decimal(0)
+        DB.session.commit()
+
+        assert RollupService().backfill() == 2
+        DB.session.expire_all()
+
+        (hour,) = rollups(asic, RollupPeriod.hour).values()
+        assert hour.samples == 1
+        assert hour.energy_wh == Decimal("50")
+        assert hour.offline_secs == 60
@@ -0,0 +1,282 @@
+import json
+import os
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def asic(app):
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+
+    asic = Asic(
+        name="asic-0",
+        address="10.0.0.1",
+        password="pw",
+        is_active=True,
+        is_online=False,
+        is_hashing=False,
+        is_stable=False,
+    )
+    DB.session.add(asic)
+    DB.session.commit()
+    return asic
+
+
+@pytest.fixture
+def writer(app, tmp_path):
+    from hfh.services.sample_writer import SampleWriter
+
+    return SampleWriter(spool_path=str(tmp_path / "spool.jsonl"), batch_size=2)
+
+
+def reading(asic, minute):
+    from hfh.services.sampling_service import AsicReading
+
+    return AsicReading(
+        asic_id=asic.id,
+        timestamp=datetime(2024, 1, 1, tzinfo=UTC) + timedelta(minutes=minute),
+        is_online=True,
+        is_hashing=True,
+        is_stable=True,
+        interval_secs=60,
+        hash_rate=minute,
+        power=3000,
+        power_limit=3100,
+        temp=60,
+    )
+
+
+class TestSampleWriter:
+    def test_submit_writes_synchronously_when_not_started(self, asic, writer):
+        """Test that without the background thread, submit writes straight away"""
+        from hfh.db import DB
+        from hfh.models.performance_sample import PerformanceSample
+
+        writer.submit([reading(asic, m) for m in range(3)])
+
+        samples = DB.session.scalars(DB.select(PerformanceSample)).all()
+        assert sorted(s.hash_rate for s in samples) == [0, 1, 2]
+        assert not os.path.exists(writer.spool_path)
+
+    def test_spools_while_database_down_and_replays_in_order(
+        self, asic, writer, monkeypatch
+    ):
+        """Test that readings are spooled while the database is down, then replayed
+        ahead of newer readings once it is back"""
+        from sqlalchemy.exc import OperationalError
+
+        import hfh.services.sample_writer as sample_writer
+        from hfh.db import DB
+        from hfh.models.performance_sample import PerformanceSample
+
+        write_readings = sample_writer.write_readings
+        written = []
+
+        def down(readings, db_session=None):
+            raise OperationalError("insert", {}, Exception("connection refused"))
+
+        def up(readings, db_session=None):
+            written.extend(r.hash_rate for r in readings)
+            write_readings(readings, db_session)
+
+        monkeypatch.setattr(sample_writer, "write_readings", down)
+        writer.submit([reading(asic, 0), reading(asic, 1)])
+        writer.submit([reading(asic, 2)])
+        assert os.path.exists(writer.spool_path)
+
+        monkeypatch.setattr(sample_writer, "write_readings", up)
+        writer.submit([reading(asic, 3)])
+
+        assert written == [0, 1, 2, 3]
+        assert not os.path.exists(writer.spool_path)
+        assert not os.path.exists(writer.replaying_path)
+        samples = DB.session.scalars(DB.select(PerformanceSample)).all()
+        assert len(samples) == 4
+
+    def test_replayed_backlog_records_each_interval_change_once(
+        self, asic, writer, monkeypatch
+    ):
+        """Test that a backlog spooled across an interval change is replayed with
+        one transition per change, and the interval starting at its first reading"""
+        from sqlalchemy.exc import OperationalError
+
+        import hfh.services.sample_writer as sample_writer
+        from hfh.db import DB
+        from hfh.models.asic_current_state import AsicCurrentState
+        from hfh.models.asic_transition import AsicTransition, TransitionKind
+        from hfh.models.hashing_interval import HashingInterval
+
+        day, night = (
+            HashingInterval(
+                name=name,
+                daytime_start_hhmm="00:00",
+                daytime_end_hhmm="00:00",
+                date_start_mmdd="01/01",
+                date_end_mmdd="12/31",
+                hashing_enabled=True,
+                weekdays_active="*",
+            )
+            for name in ("day", "night")
+        )
+        DB.session.add_all([day, night])
+        DB.session.commit()
+
+        def at(minute, interval):
+            r = reading(asic, minute)
+            r.hashing_interval_id = interval.id
+            return r
+
+        writer.submit([at(0, day)])
+
+        write_readings = sample_writer.write_readings
+
+        def down(readings, db_session=None):
+            raise OperationalError("insert", {}, Exception("connection refused"))
+
+        monkeypatch.setattr(sample_writer, "write_readings", down)
+        for minute in range(1, 4):
+            writer.submit([at(minute, day)])
+        for minute in range(4, 8):
+            writer.submit([at(minute, night)])
+
+        monkeypatch.setattr(sample_writer, "write_readings", write_readings)
+        writer.submit([at(8, night)])
+        assert not os.path.exists(writer.spool_path)
+
+        transitions = DB.session.scalars(
+            DB.select(AsicTransition)
+            .filter(AsicTransition.kind == TransitionKind.interval.value)
+            .order_by(AsicTransition.timestamp)
+        ).all()
+        assert [(t.hashing_interval_id, t.timestamp.minute) for t in transitions] == [
+            (day.id, 0),
+            (night.id, 4),
+        ]
+        assert transitions[1].prev_hashing_interval_id == day.id
+
+        state = DB.session.get(AsicCurrentState, asic.id)
+        assert state.hashing_interval_id == night.id
+        assert state.hash_rate == 8
+        assert state.interval_started_at.minute == 4
+
+    def test_status_changes_worked_out_against_the_previous_reading(self, asic, writer):
+        """Test that readings queued behind each other record each status change
+        once, when it happened, however late they are written"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic, AsicStatus
+        from hfh.models.asic_transition import AsicTransition, TransitionKind
+
+        def paused(minute):
+            r = reading(asic, minute)
+            r.is_hashing = False
+            return r
+
+        # Written as a single backlog, as after the database being down
+        writer.submit(
+            [reading(asic, 0), reading(asic, 1), paused(2), paused(3), reading(asic, 4)]
+        )
+
+        transitions = DB.session.scalars(
+            DB.select(AsicTransition)
+            .filter(AsicTransition.kind == TransitionKind.status.value)
+            .order_by(AsicTransition.timestamp)
+        ).all()
+        assert [(t.prev_status, t.status, t.timestamp.minute) for t in transitions] == [
+            ("offline", "hashing", 0),
+            ("hashing", "paused", 2),
+            ("paused", "hashing", 4),
+        ]
+
+        DB.session.expire_all()
+        asic = DB.session.get(Asic, asic.id)
+        assert AsicStatus.for_asic(asic) == AsicStatus.hashing
+        assert asic.changed_at.minute == 4
+
+    def test_flush_spools_everything_queued_while_database_down(
+        self, asic, writer, monkeypatch
+    ):
+        """Test that flushing (e.g. at shutdown) with the database down spools
+        the whole queue, not just a batch of it"""
+        from sqlalchemy.exc import OperationalError
+
+        import hfh.services.sample_writer as sample_writer
+
+        def down(readings, db_session=None):
+            raise OperationalError("insert", {}, Exception("connection refused"))
+
+        monkeypatch.setattr(sample_writer, "write_readings", down)
+        for minute in range(5):
+            writer._queue_or_spool([reading(asic, minute)])
+
+        assert not writer.flush()
+        with open(writer.spool_path) as f:
+            assert len(f.readlines()) == 5
+
+    def test_rejected_replays_are_all_kept(self, asic, writer, monkeypatch):
+        """Test that every spool the database refuses to replay is set aside,
+        rather than each one replacing the last"""
+        import hfh.services.sample_writer as sample_writer
+
+        def refuse(readings, db_session=None):
+            raise ValueError("refused")
+
+        monkeypatch.setattr(sample_writer, "write_readings", refuse)
+        for minute in range(2):
+            writer._spool([reading(asic, minute)])
+            assert writer._replay_spool()
+
+        assert not os.path.exists(writer.replaying_path)
+        with open(writer.rejected_path) as f:
+            assert [json.loads(line)["hash_rate"] for line in f] == [0, 1]
+
+    def test_refused_batch_written_reading_by_reading(self, asic, writer, monkeypatch):
+        """Test that a batch the database refuses only loses the readings it
+        refuses, whether written straight away or replayed"""
+        import hfh.services.sample_writer as sample_writer
+        from hfh.db import DB
+        from hfh.models.performance_sample import PerformanceSample
+
+        write_readings = sample_writer.write_readings
+
+        def refuse_odd(readings, db_session=None):
+            if any(r.hash_rate % 2 for r in readings):
+                raise ValueError("refused")
+            write_readings(readings, db_session)
+
+        monkeypatch.setattr(sample_writer, "write_readings", refuse_odd)
+        writer.submit([reading(asic, m) for m in range(4)])
+        writer._spool([reading(asic, m) for m in range(4, 7)])
+        assert writer._replay_spool()
+
+        samples = DB.session.scalars(DB.select(PerformanceSample)).all()
+        assert sorted(s.hash_rate for s in samples) == [0, 2, 4, 6]
+        with open(writer.rejected_path) as f:
+            assert [json.loads(line)["hash_rate"] for line in f] == [1, 3, 5]
+
+    def test_replay_keeps_what_is_left_when_database_goes_down(
+        self, asic, writer, monkeypatch
+    ):
+        """Test that a replay cut short by the database going away keeps just
+        the readings not yet written"""
+        from sqlalchemy.exc import OperationalError
+
+        import hfh.services.sample_writer as sample_writer
+
+        write_readings = sample_writer.write_readings
+
+        def refuse_then_go_down(readings, db_session=None):
+            if len(readings) > 1:
+                raise ValueError("refused")
+            if readings[0].hash_rate >= 2:
+                raise OperationalError("insert", {}, Exception("connection refused"))
+            write_readings(readings, db_session)
+
+        monkeypatch.setattr(sample_writer, "write_readings", refuse_then_go_down)
+        writer._spool([reading(asic, m) for m in range(4)])
+        assert not writer._replay_spool()
+
+        with open(writer.replaying_path) as f:
+            assert [json.loads(line)["hash_rate"] for line in f] == [2, 3]
+        assert not os.path.exists(writer.rejected_path)
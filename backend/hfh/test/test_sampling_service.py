@@ -0,0 +1,321 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def asics(app):
+    """Create a few active asics, one of which is offline."""
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+
+    asics = [
+        Asic(
+            name=f"asic-{i}",
+            address=f"10.0.0.{i}",
+            password="pw",
+            is_active=True,
+            is_online=False,
+            is_hashing=False,
+            is_stable=False,
+        )
+        for i in range(3)
+    ]
+    DB.session.add_all(asics)
+    DB.session.commit()
+    return asics
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    """Replace reading from the miners with canned snapshots, counting the fetches"""
+    import hfh.services.sampling_service as sampling_service
+    from hfh.services.asic_service import MinerSnapshot
+
+    fetched = []
+
+    async def get_asic_snapshot(asic):
+        fetched.append(asic.name)
+        if asic.name == "asic-2":
+            return MinerSnapshot(data=None)
+        data = SimpleNamespace(
+            is_mining=True,
+            env_temp=12.0,
+            temperature_avg=60,
+            hashrate=100.4,
+            wattage=3000,
+            wattage_limit=3100,
+            efficiency=30,
+        )
+        summary = {"SUMMARY": [{"Upfreq Complete": 1}]}
+        return MinerSnapshot(data=data, summary=summary)
+
+    monkeypatch.setattr(sampling_service, "get_asic_snapshot", get_asic_snapshot)
+    return fetched
+
+
+class TestSamplingService:
+    def test_sample_all_active(self, app, asics, snapshots):
+        """Test that a cycle fetches each miner once and writes every reading"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic, AsicStatus
+        from hfh.models.performance_sample import PerformanceSample
+        from hfh.services.sampling_service import SamplingService
+
+        asyncio.run(SamplingService().sample_all_active(interval=60))
+
+        assert sorted(snapshots) == ["asic-0", "asic-1", "asic-2"]
+
+        samples = DB.session.scalars(DB.select(PerformanceSample)).all()
+        assert sorted(s.asic_id for s in samples) == [asics[0].id, asics[1].id]
+        assert {s.hash_rate for s in samples} == {100}
+
+        latest = {a.name: a.latest_sample_id for a in Asic.all_active()}
+        assert latest == {
+            "asic-0": next(s.id for s in samples if s.asic_id == asics[0].id),
+            "asic-1": next(s.id for s in samples if s.asic_id == asics[1].id),
+            "asic-2": None,
+        }
+
+        statuses = {a.name: AsicStatus.for_asic(a) for a in Asic.all_active()}
+        assert statuses == {
+            "asic-0": AsicStatus.hashing,
+            "asic-1": AsicStatus.hashing,
+            "asic-2": AsicStatus.offline,
+        }
+
+    def test_status_change_sets_changed_at(self, app, asics, snapshots):
+        """Test that changed_at only moves, and transitions are only recorded, when
+        the status changes"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.models.asic_transition import AsicTransition
+        from hfh.services.sampling_service import SamplingService
+
+        asyncio.run(SamplingService().sample_all_active(interval=60))
+        changed_at = {a.name: a.changed_at for a in Asic.all_active()}
+        assert changed_at["asic-0"] is not None
+        assert changed_at["asic-2"] is None  # Was offline, still offline
+
+        DB.session.expire_all()
+        asyncio.run(SamplingService().sample_all_active(interval=60))
+        assert {a.name: a.changed_at for a in Asic.all_active()} == changed_at
+
+        transitions = DB.session.scalars(DB.select(AsicTransition)).all()
+        assert sorted((t.asic.name, t.kind, t.status) for t in transitions) == [
+            ("asic-0", "interval", None),
+            ("asic-0", "status", "hashing"),
+            ("asic-1", "interval", None),
+            ("asic-1", "status", "hashing"),
+        ]
+
+    def test_write_readings_keeps_current_state(self, app, asics):
+        """Test that the current state follows the readings, including when the
+        current interval started"""
+        from datetime import UTC, datetime, timedelta
+
+        from hfh.db import DB
+        from hfh.models.asic_current_state import AsicCurrentState
+        from hfh.models.asic_transition import AsicTransition, TransitionKind
+        from hfh.models.hashing_interval import HashingInterval
+        from hfh.services.sampling_service import AsicReading, write_readings
+
+        day, night = (
+            HashingInterval(
+                name=name,
+                daytime_start_hhmm="00:00",
+                daytime_end_hhmm="00:00",
+                date_start_mmdd="01/01",
+                date_end_mmdd="12/31",
+                hashing_enabled=True,
+                weekdays_active="*",
+            )
+            for name in ("day", "night")
+        )
+        DB.session.add_all([day, night])
+        DB.session.commit()
+
+        start = datetime(2024, 1, 2, 17, 58, tzinfo=UTC)
+
+        def reading(minute, interval):
+            return AsicReading(
+                asic_id=asics[0].id,
+                timestamp=start + timedelta(minutes=minute),
+                is_online=True,
+                is_hashing=True,
+                is_stable=True,
+                interval_secs=60,
+                hashing_interval_id=interval.id,
+                hash_rate=minute,
+            )
+
+        # Including several readings of the same asic in one write, as on replay
+        write_readings([reading(0, day), reading(1, day)])
+        write_readings([reading(2, night)])
+        write_readings([reading(3, night)])
+        DB.session.commit()
+
+        state = DB.session.get(AsicCurrentState, asics[0].id)
+        assert state.hash_rate == 3
+        assert state.hashing_interval_id == night.id
+        assert state.interval_started_at == datetime(2024, 1, 2, 18, 0)
+        assert DB.session.get(AsicCurrentState, asics[2].id) is None
+
+        transitions = DB.session.scalars(
+            DB.select(AsicTransition).filter(
+                AsicTransition.kind == TransitionKind.interval.value
+            )
+        ).all()
+        assert [(t.hashing_interval_id, t.timestamp.minute) for t in transitions] == [
+            (day.id, 58),
+            (night.id, 0),
+        ]
+
+    def test_write_readings_refers_to_tariffs(self, app, asics):
+        """Test that samples share a tariff per price, and cost in micro-dollars"""
+        from datetime import datetime
+        from decimal import Decimal
+
+        from hfh.db import DB
+        from hfh.models.performance_sample import PerformanceSample
+        from hfh.models.tariff import Tariff
+        from hfh.services.sampling_service import AsicReading, write_readings
+
+        def reading(asic, price):
+            return AsicReading(
+                asic_id=asic.id,
+                timestamp=datetime(2024, 1, 2, 18, 0),
+                is_online=True,
+                is_hashing=True,
+                is_stable=True,
+                interval_secs=60,
+                hash_rate=100,
+                power=3000,
+                price_per_kwh=Decimal(price),
+            )
+
+        write_readings([reading(asics[0], "0.1"), reading(asics[1], "0.1")])
+        write_readings([reading(asics[0], "0.125")])
+        DB.session.commit()
+
+        tariffs = DB.session.scalars(DB.select(Tariff)).all()
+        assert sorted(t.price_micro_per_kwh for t in tariffs) == [100000, 125000]
+
+        samples = DB.session.scalars(
+            DB.select(PerformanceSample).order_by(PerformanceSample.id)
+        ).all()
+        assert samples[0].tariff_id == samples[1].tariff_id
+        assert samples[0].price_per_kwh == Decimal("0.1")
+        assert samples[0].hash_cost_micro == 5000  # 3 kW for a minute at $0.10
+        assert samples[0].hash_cost == Decimal("0.005")
+        assert samples[2].hash_cost_micro == 6250
+
+    def test_sample_row_clamped_to_smallints(self, app, asics):
+        """Test that out-of-range readings, e.g. the efficiency of a miner barely
+        hashing, are written clamped rather than failing the whole cycle"""
+        from datetime import datetime
+
+        from hfh.db import DB
+        from hfh.models.performance_sample import PerformanceSample
+        from hfh.services.sampling_service import AsicReading, write_readings
+
+        write_readings(
+            [
+                AsicReading(
+                    asic_id=asics[0].id,
+                    timestamp=datetime(2024, 1, 2, 18, 0),
+                    is_online=True,
+                    is_hashing=True,
+                    is_stable=False,
+                    interval_secs=100_000,
+                    power=300,
+                    power_per_th=60_000,  # 300 W / 0.005 TH/s
+                    env_temp=-40_000,
+                )
+            ]
+        )
+        DB.session.commit()
+
+        [sample] = DB.session.scalars(DB.select(PerformanceSample)).all()
+        assert sample.interval_secs == 32767
+        assert sample.power == 300
+        assert sample.power_per_th == 32767
+        assert sample.env_temp == -32768
+
+    def test_sample_due_doesnt_wait_for_slow_miners(self, app, asics, monkeypatch):
+        """Test that a slow miner holds up neither the tick nor the other asics'
+        next samples, and isn't sampled again until it's done"""
+        import hfh.services.sampling_service as sampling_service
+        from hfh.services.asic_service import MinerSnapshot
+        from hfh.services.cadence_service import CadenceService
+        from hfh.services.sampling_service import SamplingService
+
+        fetched = []
+
+        async def get_asic_snapshot(asic):
+            fetched.append(asic.name)
+            if asic.name == "asic-1":
+                await slow.wait()
+            return MinerSnapshot(data=None)
+
+        monkeypatch.setattr(sampling_service, "get_asic_snapshot", get_asic_snapshot)
+        cadence = CadenceService()
+        service = SamplingService(cadence=cadence)
+
+        async def run():
+            first = await service.sample_due()
+            await asyncio.sleep(0.1)
+            assert not first.done()
+
+            # Everyone was just sampled; asic-0 falls due again while asic-1 is
+            # still being read, and only asic-0 is sampled
+            cadence.forget(asics[0])
+            cadence.forget(asics[1])
+            second = await service.sample_due()
+            await asyncio.wait_for(second, timeout=1)
+            assert not first.done()
+
+            slow.set()
+            await asyncio.wait_for(first, timeout=1)
+
+        slow = asyncio.Event()
+        asyncio.run(run())
+        assert sorted(fetched) == ["asic-0", "asic-0", "asic-1", "asic-2"]
+
+    def test_each_due_asic_is_done_with_once(self, app, asics, monkeypatch):
+        """Test that every asic of a batch is released once, whether it was read,
+        failed to be written, or was gone by the time the batch ran"""
+        from collections import Counter
+
+        import hfh.services.sampling_service as sampling_service
+        from hfh.db import DB
+        from hfh.services.asic_service import MinerSnapshot
+        from hfh.services.cadence_service import CadenceService
+        from hfh.services.sampling_service import SamplingService
+
+        async def get_asic_snapshot(asic):
+            return MinerSnapshot(data=None)
+
+        def submit(readings):
+            if readings[0].asic_id == asics[1].id:
+                raise RuntimeError("writer is full")
+
+        monkeypatch.setattr(sampling_service, "get_asic_snapshot", get_asic_snapshot)
+        cadence = CadenceService()
+        finished = Counter()
+        finish = cadence.finish
+        monkeypatch.setattr(
+            cadence, "finish", lambda ids: (finished.update(ids), finish(ids))
+        )
+        service = SamplingService(cadence=cadence, writer=SimpleNamespace(submit=submit))
+        ids = [asic.id for asic in asics]
+
+        async def run():
+            batch = await service.sample_due()
+            DB.session.delete(asics[2])
+            DB.session.commit()
+            await asyncio.wait_for(batch, timeout=1)
+
+        asyncio.run(run())
+        assert finished == Counter(ids)
@@ -0,0 +1,169 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def fleet(schedule):
+    """Make asics on a schedule with power limits; every other one overridden"""
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+    from hfh.models.asic_profile import AsicProfile
+    from hfh.models.hashing_interval import HashingInterval
+    from hfh.models.performance_limit import PerformanceLimit
+
+    def override():
+        return HashingInterval(
+            name="override",
+            daytime_start_hhmm="00:00",
+            daytime_end_hhmm="00:00",
+            date_start_mmdd="01/01",
+            date_end_mmdd="12/31",
+            hashing_enabled=True,
+            weekdays_active="*",
+            is_active=True,
+            performance_limit=PerformanceLimit(power_limit=3000),
+        )
+
+    for interval in schedule.intervals:
+        interval.performance_limit = PerformanceLimit(power_limit=3000)
+    profile = AsicProfile(name="fixture", schedule=schedule)
+    DB.session.add(profile)
+
+    def make(count, first=0):
+        for i in range(first, first + count):
+            DB.session.add(
+                Asic(
+                    name=f"asic-{i}",
+                    address=f"10.0.0.{i}",
+                    password="pw",
+                    profile=profile,
+                    override_interval=override() if i % 2 else None,
+                    is_active=True,
+                    is_online=True,
+                    is_hashing=True,
+                    is_stable=True,
+                )
+            )
+        DB.session.commit()
+
+    return make
+
+
+@pytest.fixture
+def miners(monkeypatch):
+    """Snapshots as if just sampled, and no talking to miners"""
+    from hfh.services import schedule_service
+    from hfh.services.asic_service import MinerSnapshot
+
+    snapshot = MinerSnapshot(data=SimpleNamespace(env_temp=10, wattage_limit=3000))
+    changes = []
+
+    async def record(asic, value):
+        changes.append((asic.name, value))
+
+    monkeypatch.setattr(schedule_service, "recent_snapshot", lambda *_, **__: snapshot)
+    monkeypatch.setattr(schedule_service, "set_hashing", record)
+    monkeypatch.setattr(schedule_service, "set_power_limit", record)
+    return changes
+
+
+class TestSchedulePass:
+    def test_query_count_is_independent_of_fleet_size(self, fleet, miners, count_queries):
+        """Test the schedule pass doesn't query per asic"""
+        from hfh.db import DB
+        from hfh.services.fleet_config import FLEET
+        from hfh.services.schedule_service import ScheduleService
+
+        fleet(2)
+        DB.session.expunge_all()
+        FLEET.current()  # Loaded once per change to the configuration
+        count_queries.clear()
+        asyncio.run(ScheduleService().update_all_active())
+        small = len(count_queries)
+
+        fleet(6, first=2)
+        DB.session.expunge_all()
+        FLEET.current()
+        count_queries.clear()
+        asyncio.run(ScheduleService().update_all_active())
+
+        assert small <= 8
+        assert len(count_queries) == small
+        assert miners == []
+
+    def test_commits_dont_expire_what_was_loaded(self, fleet, miners):
+        from sqlalchemy import inspect
+
+        from hfh.db import DB
+        from hfh.services.schedule_service import ScheduleService
+
+        fleet(2)
+        DB.session.expunge_all()
+        asyncio.run(ScheduleService().update_all_active())
+
+        for obj in DB.session.identity_map.values():
+            assert not inspect(obj).expired, obj
+        assert DB.session().expire_on_commit
+
+    def test_committed_once_all_are_done(self, fleet, miners, monkeypatch):
+        """Test that the pass commits once, after every asic is done, keeping
+        what the asics that failed changed too"""
+        from sqlalchemy import event
+
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.services.schedule_service import ScheduleService
+
+        fleet(3)
+        update = ScheduleService.update
+
+        async def update_or_fail(self, asic, snapshot=None):
+            asic.is_stable = False
+            if asic.name == "asic-1":
+                raise RuntimeError("unreachable")
+            await update(self, asic, snapshot)
+
+        monkeypatch.setattr(ScheduleService, "update", update_or_fail)
+        commits = []
+
+        # Each asic is saved in a savepoint, but there's just the one commit
+        def on_commit(conn):
+            commits.append(conn)
+
+        event.listen(DB.engine, "commit", on_commit)
+        try:
+            asyncio.run(ScheduleService().update_all_active())
+        finally:
+            event.remove(DB.engine, "commit", on_commit)
+
+        assert len(commits) == 1
+        DB.session.expire_all()
+        assert not any(a.is_stable for a in Asic.all_active())
+
+    def test_temp_dependent_asics_updated(self, fleet, miners, monkeypatch):
+        """Test that the temperature pass updates just the asics with an interval
+        bounded by temperature"""
+        from hfh.db import DB
+        from hfh.models.asic import Asic
+        from hfh.services.schedule_service import ScheduleService
+
+        fleet(4)
+        updated = []
+
+        async def update(self, asic, snapshot=None):
+            updated.append(asic.name)
+
+        monkeypatch.setattr(ScheduleService, "update", update)
+        asyncio.run(ScheduleService().update_temp_dependent())
+        assert updated == []
+
+        # The overridden asics' override only applies when it's cold
+        for asic in Asic.all_active():
+            if asic.override_interval:
+                asic.override_interval.temp_max = 0
+        DB.session.commit()
+
+        asyncio.run(ScheduleService().update_temp_dependent())
+        assert sorted(updated) == ["asic-1", "asic-3"]
@@ -0,0 +1,128 @@
+from datetime import UTC, datetime
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+
+MTN = ZoneInfo("America/Denver")
+
+
+def interval(name, times, hashing, dates=("01/01", "01/01"), weekdays="*", **kwargs):
+    from hfh.models.hashing_interval import HashingInterval
+
+    return HashingInterval(
+        name=name,
+        date_start_mmdd=dates[0],
+        date_end_mmdd=dates[1],
+        daytime_start_hhmm=times[0],
+        daytime_end_hhmm=times[1],
+        weekdays_active=weekdays,
+        hashing_enabled=hashing,
+        is_active=True,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def asic(schedule):
+    """An asic on a peak / off-peak schedule (weekdays only), in Denver"""
+    from hfh.models.asic import Asic
+    from hfh.models.asic_profile import AsicProfile
+    from hfh.models.performance_limit import PerformanceLimit
+
+    schedule.intervals = [
+        interval("peak", ("15:00", "19:00"), False, weekdays="MoTuWeThFr"),
+        interval(
+            "shoulder",
+            ("13:00", "21:00"),
+            True,
+            weekdays="MoTuWeThFr",
+            price_per_kwh=Decimal("0.150"),
+            performance_limit=PerformanceLimit(power_limit=2000),
+        ),
+        interval("off-peak", ("00:00", "00:00"), True),
+    ]
+    return Asic(
+        name="asic-0",
+        address="10.0.0.1",
+        is_active=True,
+        profile=AsicProfile(name="fixture", schedule=schedule),
+    )
+
+
+def summary(changes):
+    return [
+        (c.at.strftime("%a %H:%M"), c.interval.name if c.interval else None)
+        for c in changes
+    ]
+
+
+class TestScheduleTimeline:
+    def test_changes_over_a_weekend(self, asic):
+        from hfh.services.schedule_service import ScheduleService
+
+        changes = ScheduleService().timeline(
+            asic,
+            datetime(2025, 1, 3, 12, 0, tzinfo=MTN),
+            datetime(2025, 1, 7, 0, 0, tzinfo=MTN),
+        )
+
+        assert summary(changes) == [
+            ("Fri 12:00", "off-peak"),
+            ("Fri 13:00", "shoulder"),
+            ("Fri 15:00", "peak"),
+            ("Fri 19:00", "shoulder"),
+            ("Fri 21:00", "off-peak"),
+            ("Mon 13:00", "shoulder"),
+            ("Mon 15:00", "peak"),
+            ("Mon 19:00", "shoulder"),
+            ("Mon 21:00", "off-peak"),
+        ]
+        assert [c.hashing for c in changes[:3]] == [True, True, False]
+        assert changes[1].power_limit == 2000
+        assert changes[1].price_per_kwh == Decimal("0.150")
+        assert all(c.at.tzinfo is MTN for c in changes)
+
+    def test_in_the_asics_timezone(self, asic):
+        from hfh.services.schedule_service import ScheduleService
+
+        # 22:00 UTC is 15:00 in Denver
+        changes = ScheduleService().timeline(
+            asic,
+            datetime(2025, 1, 6, 22, 0, tzinfo=UTC),
+            datetime(2025, 1, 6, 23, 0, tzinfo=UTC),
+        )
+        assert summary(changes) == [("Mon 15:00", "peak")]
+
+    def test_override_takes_precedence(self, asic):
+        from hfh.services.schedule_service import ScheduleService
+
+        asic.override_interval = interval(
+            "override", ("14:00", "17:00"), True, dates=("01/06", "01/07")
+        )
+
+        changes = ScheduleService().timeline(
+            asic,
+            datetime(2025, 1, 6, 12, 0, tzinfo=MTN),
+            datetime(2025, 1, 6, 22, 0, tzinfo=MTN),
+        )
+        assert summary(changes) == [
+            ("Mon 12:00", "off-peak"),
+            ("Mon 13:00", "shoulder"),
+            ("Mon 14:00", "override"),
+            ("Mon 17:00", "peak"),
+            ("Mon 19:00", "shoulder"),
+            ("Mon 21:00", "off-peak"),
+        ]
+        assert [c.at.hour for c in changes if c.is_override] == [14]
+
+    def test_no_schedule(self, asic):
+        from hfh.services.schedule_service import ScheduleService
+
+        asic.profile = None
+        changes = ScheduleService().timeline(
+            asic,
+            datetime(2025, 1, 6, 12, 0, tzinfo=UTC),
+            datetime(2025, 1, 7, 12, 0, tzinfo=UTC),
+        )
+        assert [(c.interval, c.hashing) for c in changes] == [(None, None)]
@@ -0,0 +1,214 @@
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def asic(app):
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+
+    asic = Asic(
+        name="asic-0",
+        address="10.0.0.1",
+        password="pw",
+        is_active=True,
+        is_online=True,
+        is_hashing=True,
+        is_stable=True,
+    )
+    DB.session.add(asic)
+    DB.session.commit()
+    return asic
+
+
+def write_hours(asic, start, hours, is_hashing, price):
+    """A sample an hour, drawing 3000W (hashing at 100TH/s) or 100W (paused)"""
+    from hfh.db import DB
+    from hfh.models.performance_sample import PerformanceSample
+    from hfh.models.tariff import Tariff
+
+    [tariff_id] = Tariff.ids_for([Tariff.to_micro(price)], DB.session).values()
+    for n in range(hours):
+        DB.session.add(
+            PerformanceSample(
+                asic_id=asic.id,
+                timestamp=start + timedelta(hours=n),
+                is_online=True,
+                is_hashing=is_hashing,
+                is_stable=True,
+                interval_secs=3600,
+                hash_rate=100 if is_hashing else 0,
+                power=3000 if is_hashing else 100,
+                power_limit=3100,
+                power_per_th=30,
+                temp=60,
+                env_temp=20,
+                tariff_id=tariff_id,
+            )
+        )
+    DB.session.commit()
+
+
+def candidate(intervals):
+    import hfh.models.all  # noqa: F401
+    from hfh.dtos.simulations import CandidateIntervalDto, CandidateScheduleDto
+
+    return CandidateScheduleDto(
+        name="candidate",
+        intervals=[CandidateIntervalDto(**i) for i in intervals],
+    ).to_schedule()
+
+
+class TestSimulationService:
+    def test_same_intervals_as_compiled_lookup(self):
+        schedule = candidate(
+            [
+                dict(
+                    daytime_start_hhmm="21:00",
+                    daytime_end_hhmm="06:00",
+                    date_start_mmdd="10/01",
+                    date_end_mmdd="03/01",
+                    hashing_enabled=True,
+                    temp_max=5,
+                ),
+                dict(
+                    daytime_start_hhmm="00:00",
+                    daytime_end_hhmm="14:00",
+                    weekdays_active="MoTuWe",
+                    hashing_enabled=False,
+                ),
+                dict(
+                    daytime_start_hhmm="16:00",
+                    daytime_end_hhmm="00:00",
+                    date_start_mmdd="02/29",
+                    date_end_mmdd="07/01",
+                    hashing_enabled=True,
+                ),
+            ]
+        )
+        from hfh.services.simulation_service import SampleHistory, SimulationService
+
+        moments = [
+            datetime(2024, 1, 1) + timedelta(hours=n * 7, minutes=n * 13)
+            for n in range(1200)
+        ]
+        temps = np.array([(n * 7) % 30 - 10 for n in range(len(moments))])
+        zeros = np.zeros(len(moments))
+        history = SampleHistory.from_timestamps(
+            np.array(moments, dtype="datetime64[us]"),
+            secs=zeros,
+            env_temp=temps,
+            is_hashing=zeros.astype(bool),
+            power=zeros,
+            hash_rate=zeros,
+            price_micro_per_kwh=zeros,
+        )
+
+        windows = schedule.compiled.windows
+        chosen = SimulationService.in_effect(history, windows)
+        for moment, temp, n in zip(moments, temps, chosen, strict=True):
+            expected = schedule.compiled.interval_at(moment, int(temp))
+            assert (windows[n].interval if n >= 0 else None) is expected, moment
+
+    def test_compare_with_actual(self, asic):
+        from hfh.services.simulation_service import SimulationService
+
+        start = datetime(2024, 5, 1)
+        write_hours(asic, start, 12, is_hashing=False, price=Decimal("0.250"))
+        write_hours(
+            asic, start + timedelta(hours=12), 12, is_hashing=True, price=Decimal("0.100")
+        )
+
+        always = candidate(
+            [
+                dict(
+                    daytime_start_hhmm="00:00",
+                    daytime_end_hhmm="00:00",
+                    hashing_enabled=True,
+                )
+            ]
+        )
+        limited = candidate(
+            [
+                dict(
+                    daytime_start_hhmm="00:00",
+                    daytime_end_hhmm="00:00",
+                    hashing_enabled=True,
+                    power_limit=1500,
+                    price_per_kwh=Decimal("0.200"),
+                )
+            ]
+        )
+
+        actual, always, limited = SimulationService().compare(
+            asic,
+            start.replace(tzinfo=UTC),
+            (start + timedelta(days=1)).replace(tzinfo=UTC),
+            [("always", always), ("limited", limited)],
+        )
+
+        assert actual.samples == 24
+        assert actual.hashing_hours == 12
+        assert actual.energy_kwh == pytest.approx(12 * 0.1 + 12 * 3.0)
+        assert actual.cost == Decimal("0.3") + Decimal("3.6")
+        assert actual.hash_output_th == 12 * 3600 * 100
+
+        # Hashing while it was paused, as it typically did while hashing
+        assert always.hashing_hours == 24
+        assert always.energy_kwh == pytest.approx(24 * 3.0)
+        assert always.cost == Decimal("9.0") + Decimal("3.6")
+        assert always.hash_output_th == 24 * 3600 * 100
+
+        # Half the power, half the hash rate, at the interval's price
+        assert limited.energy_kwh == pytest.approx(24 * 1.5)
+        assert limited.cost == Decimal("7.2")
+        assert limited.hash_output_th == 24 * 3600 * 50
+
+    def test_no_samples(self, asic):
+        from hfh.services.simulation_service import SimulationService
+
+        since = datetime(2024, 5, 1, tzinfo=UTC)
+        [actual] = SimulationService().compare(asic, since, since + timedelta(days=1), [])
+        assert actual.samples == 0
+        assert actual.cost == 0
+
+
+class TestSimulateEndpoint:
+    def test_bad_candidate_is_rejected_with_field_errors(self, asic, monkeypatch):
+        import hfh.controllers  # noqa: F401
+        from hfh.app import APP
+        from hfh.services.auth_service import AuthService
+
+        monkeypatch.setattr(AuthService, "get_current_user", lambda: object())
+
+        response = APP.test_client().post(
+            f"/api/asic/{asic.name}/simulate",
+            json={
+                "since": "2024-05-01T00:00:00Z",
+                "until": "2024-05-02T00:00:00Z",
+                "schedules": [
+                    {
+                        "name": "bad",
+                        "intervals": [
+                            {
+                                "daytime_start_hhmm": "6am",
+                                "daytime_end_hhmm": "18:00",
+                                "date_end_mmdd": "02/30",
+                                "weekdays_active": "Mon,Tue",
+                                "hashing_enabled": True,
+                            }
+                        ],
+                    }
+                ],
+            },
+        )
+
+        assert response.status_code == 400
+        assert set(response.get_json()["errors"]) == {
+            "schedules.0.intervals.0.daytime_start_hhmm",
+            "schedules.0.intervals.0.date_end_mmdd",
+            "schedules.0.intervals.0.weekdays_active",
+        }
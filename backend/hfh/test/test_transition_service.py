@@ -0,0 +1,95 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+MTN = ZoneInfo("America/Denver")
+
+
+class FakeScheduler:
+    running = True
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, id, func, trigger, run_date=None, **kwargs):
+        self.jobs[id] = run_date
+
+    def get_job(self, id):
+        return self.jobs.get(id)
+
+    def remove_job(self, id):
+        del self.jobs[id]
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    from hfh.services import transition_service
+
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(transition_service.TRANSITIONS, "scheduler", scheduler)
+    return scheduler
+
+
+@pytest.fixture
+def asic(schedule):
+    """An asic on the day (06:00 to 18:00) / night schedule"""
+    from hfh.db import DB
+    from hfh.models.asic import Asic
+    from hfh.models.asic_profile import AsicProfile
+
+    asic = Asic(
+        name="asic-0",
+        address="10.0.0.1",
+        password="pw",
+        profile=AsicProfile(name="fixture", schedule=schedule),
+        is_active=True,
+        is_online=True,
+        is_hashing=True,
+        is_stable=True,
+    )
+    DB.session.add(asic)
+    DB.session.commit()
+    return asic
+
+
+class TestTransitionService:
+    def test_next_transition(self, asic):
+        from hfh.services.transition_service import TransitionService
+
+        assert TransitionService.next_transition(
+            asic, datetime(2025, 3, 3, 9, 0, tzinfo=MTN)
+        ) == datetime(2025, 3, 3, 18, 0, tzinfo=MTN)
+        assert TransitionService.next_transition(
+            asic, datetime(2025, 3, 3, 18, 0, tzinfo=MTN)
+        ) == datetime(2025, 3, 4, 0, 0, tzinfo=MTN)
+
+    def test_plan_wakes_up_for_the_first(self, asic, monkeypatch):
+        from hfh.services.transition_service import WAKE_JOB_ID, TransitionService
+
+        scheduler = FakeScheduler()
+        service = TransitionService(scheduler=scheduler)
+        monkeypatch.setattr(
+            asic, "local_time", lambda: datetime(2025, 3, 3, 5, 0, tzinfo=MTN)
+        )
+
+        wake_at = service.plan([asic])
+
+        assert wake_at == datetime(2025, 3, 3, 6, 0, tzinfo=MTN)
+        assert scheduler.jobs[WAKE_JOB_ID] == wake_at
+        assert service.due(datetime(2025, 3, 3, 12, 59, 58, tzinfo=ZoneInfo("UTC"))) == []
+        assert service.due(datetime(2025, 3, 3, 13, 0, tzinfo=ZoneInfo("UTC"))) == [
+            asic.id
+        ]
+
+    def test_schedule_changes_replan(self, asic, scheduler):
+        from hfh.db import DB
+        from hfh.services.transition_service import PLAN_JOB_ID
+
+        asic.is_hashing = False
+        DB.session.commit()
+        assert PLAN_JOB_ID not in scheduler.jobs
+
+        asic.profile.schedule.intervals[0].daytime_end_hhmm = "17:00"
+        DB.session.commit()
+        assert PLAN_JOB_ID in scheduler.jobs
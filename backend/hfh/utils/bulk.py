@@ -0,0 +1,117 @@
+from typing import Any, Callable, Optional, Sequence
+
+from sqlalchemy import Table, and_, bindparam, cast, column, insert, update, values
+
+from ..db import DbSession
+
+
+def bulk_update_by_id(
+    db_session: DbSession, table: Table, rows: Sequence[dict[str, Any]]
+) -> None:
+    """
+    Update many rows of `table`, each given as a dict of column values including
+    its `id`, in as few statements as the database allows.
+
+    On postgres this is a single `UPDATE ... FROM (VALUES ...)`; elsewhere (e.g.
+    sqlite in tests) it falls back to an executemany keyed by id.
+    """
+    if not rows:
+        return
+
+    names = [n for n in rows[0] if n != "id"]
+
+    if db_session.get_bind().dialect.name != "postgresql":
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values({n: bindparam(f"_{n}") for n in names})
+        )
+        db_session.execute(stmt, [{f"_{k}": v for k, v in row.items()} for row in rows])
+        return
+
+    data = values(
+        column("id", table.c.id.type),
+        *(column(n, table.c[n].type) for n in names),
+        name="v",
+    ).data([(row["id"], *(row[n] for n in names)) for row in rows])
+
+    db_session.execute(
+        update(table)
+        .where(table.c.id == data.c.id)
+        .values({n: cast(data.c[n], table.c[n].type) for n in names})
+    )
+
+
+def bulk_upsert(
+    db_session: DbSession,
+    table: Table,
+    rows: Sequence[dict[str, Any]],
+    *,
+    key: Sequence[str],
+    on_update: Optional[Callable[[Any], dict[str, Any]]] = None,
+) -> None:
+    """
+    Insert many rows of `table`, updating the existing row instead wherever one
+    with the same `key` columns already exists (`INSERT ... ON CONFLICT DO
+    UPDATE`). By default the existing row takes all the new values;
+    `on_update` is given the `excluded` (i.e. new) row and may return other
+    expressions for some of the columns.
+
+    Each key may appear only once in `rows`.
+
+    Databases without `ON CONFLICT` fall back to updating each row by its key,
+    and inserting it where there was none to update.
+    """
+    if not rows:
+        return
+
+    dialect = db_session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        _update_or_insert(db_session, table, rows, key=key, on_update=on_update)
+        return
+
+    stmt = upsert(table)
+    values = {n: stmt.excluded[n] for n in rows[0] if n not in key}
+    if on_update:
+        values.update(on_update(stmt.excluded))
+
+    db_session.execute(stmt.on_conflict_do_update(index_elements=key, set_=values), rows)
+
+
+class _Excluded(dict[str, Any]):
+    """The new row's values as bind parameters, standing in for `excluded`"""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _update_or_insert(
+    db_session: DbSession,
+    table: Table,
+    rows: Sequence[dict[str, Any]],
+    *,
+    key: Sequence[str],
+    on_update: Optional[Callable[[Any], dict[str, Any]]],
+) -> None:
+    """bulk_upsert one row at a time, for databases without `ON CONFLICT`"""
+    excluded = _Excluded((n, bindparam(f"_{n}", type_=table.c[n].type)) for n in rows[0])
+    values = {n: excluded[n] for n in rows[0] if n not in key}
+    if on_update:
+        values.update(on_update(excluded))
+
+    stmt = (
+        update(table)
+        .where(and_(*(table.c[n] == excluded[n] for n in key)))
+        .values(values)
+    )
+    for row in rows:
+        result = db_session.execute(stmt, {f"_{k}": v for k, v in row.items()})
+        if result.rowcount == 0:
+            db_session.execute(insert(table), row)
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from ..db import DbSession
+
+
+@contextmanager
+def kept_loaded(db_session: DbSession) -> Iterator[None]:
+    """
+    Commits made within don't expire what the session has loaded, so that what
+    was loaded up front (e.g. for a whole cycle) isn't then reloaded one object
+    at a time after each commit. A rollback still expires everything.
+    """
+    session = db_session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        yield
+    finally:
+        session.expire_on_commit = expire_on_commit
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Script to re-derive the hourly and daily rollups from the performance samples.
+
+Usage:
+    python scripts/backfill_rollups.py [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+
+Example:
+    python scripts/backfill_rollups.py --since 2026-01-01
+"""
+
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+
+import click
+import structlog
+
+# Add the parent directory to the path so we can import hfh
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hfh.models.all  # noqa: F401
+from hfh.app import APP
+from hfh.services.rollup_service import RollupService
+
+# Configure structlog
+structlog.configure(
+    processors=[
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.dev.ConsoleRenderer(),
+    ],
+)
+
+logger = structlog.get_logger()
+
+
+@click.command()
+@click.option(
+    "--since",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="First day to re-derive (default: the first sample)",
+)
+@click.option(
+    "--until",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Day to stop before (default: the last sample)",
+)
+@click.option(
+    "--batch-size",
+    default=10000,
+    help="Samples read at a time (default: 10000)",
+    type=int,
+)
+def backfill_rollups(
+    since: Optional[datetime], until: Optional[datetime], batch_size: int
+):
+    """Re-derive the hourly and daily rollups from the performance samples.
+
+    Rollups of days with no samples (e.g. past the sample retention) are left
+    as they are.
+
+    \b
+    Example:
+        python scripts/backfill_rollups.py --since 2026-01-01 --until 2026-02-01
+    """
+    logger.info("Starting rollup backfill", since=since, until=until)
+
+    with APP.app_context():
+        try:
+            written = RollupService().backfill(since, until, batch_size=batch_size)
+        except Exception as e:
+            logger.error("Failed to backfill rollups", error=str(e))
+            click.echo(click.style(f"Error: Failed to backfill rollups: {e}", fg="red"))
+            sys.exit(1)
+
+    click.echo(click.style(f"✓ Backfilled {written} rollups", fg="green"))
+
+
+if __name__ == "__main__":
+    backfill_rollups()
@@ -2,8 +2,26 @@ import hfh.controllers  # noqa: F401
 import hfh.db
 import hfh.models.all  # noqa: F401
 from hfh.app import APP
+from hfh.event_loop import LOOP
 from hfh.scheduled_tasks import SCHEDULER
+from hfh.services.asic_service import warm_up_miners
+from hfh.services.invalidation_bus import BUS
+from hfh.services.partition_service import PartitionService
+from hfh.services.sample_writer import WRITER
+from hfh.services.transition_service import TRANSITIONS
+
+
+async def warm_up() -> None:
+    with APP.app_context():
+        await warm_up_miners()
+
 
 if __name__ == "__main__":
+    with APP.app_context():
+        PartitionService().maintain()
+    LOOP.submit(warm_up())
+    WRITER.start()
     SCHEDULER.start()
+    TRANSITIONS.request_plan()
+    BUS.start()
     APP.run(host="0.0.0.0", port=5000)
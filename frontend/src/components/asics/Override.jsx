@@ -17,7 +17,7 @@ export default function Override() {
         body: formData
       }),
     onSuccess: (data) => {
-      queryClient.invalidateQueries(["asic/summary", params.name]);
+      queryClient.invalidateQueries({ queryKey: ["asic/summary"] });
     },
     onError: (error) => {
       console.error("Error submitting override:", error);
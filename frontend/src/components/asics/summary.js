@@ -8,21 +8,21 @@ import API from '../../api';
 const api = new API();
 
 export default function Summary() {
-    const {isLoading, data: active_data} = useQuery({
-        queryKey: ['asic/active'],
-        queryFn: () => api.GET({ path:`/asic/active`}).then((data) => data),
+    const {isLoading, isFetching, data: summary_data} = useQuery({
+        queryKey: ['asic/summary'],
+        queryFn: () => api.GET({ path:`/asic/summary`}).then((data) => data),
         refetchInterval: 60_000
     })
     
-    function renderSummary(active_data) {
+    function renderSummary(summary_data) {
         return (<ul>
-            {active_data.asics.map((name) => <><SummaryCard key={name} name={name} /><br/></>)}
+            {summary_data.asics.map((asic_summary) => <><SummaryCard key={asic_summary.name} asic_summary={asic_summary} isFetching={isFetching} /><br/></>)}
         </ul>);
     }
 
     return (
       <div>
-        {isLoading? "Loading..." : renderSummary(active_data)}
+        {isLoading? "Loading..." : renderSummary(summary_data)}
       </div>
     )
   }
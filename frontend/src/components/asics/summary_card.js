@@ -1,7 +1,4 @@
 import React from "react";
-import { useQuery } from "@tanstack/react-query";
-
-import API from "../../api";
 
 import { Link, Card } from "@mui/material";
 import { styled } from "@mui/material/styles";
@@ -11,8 +8,6 @@ import Grid from "@mui/material/Unstable_Grid2";
 import DualTempField from "../temps/dual_temp_field";
 import { to_locale_string } from "../../utils/times";
 
-const api = new API();
-
 const Item = styled(Card)(({ theme, align }) => ({
   //backgroundColor: theme.palette.mode === 'dark' ? '#1A2027' : '#fff',
   ...theme.typography.body2,
@@ -24,22 +19,7 @@ const Item = styled(Card)(({ theme, align }) => ({
       : theme.palette.text.primary,
 }));
 
-export default function SummaryCard({ name }) {
-  const {
-    isLoading,
-    isFetching,
-    data: asic_summary,
-  } = useQuery({
-    queryKey: ["asic/summary", name],
-    queryFn: () =>
-      api.GET({ path: `/asic/${name}/summary` }).then((data) => data),
-    refetchInterval: 60_000,
-  });
-
-  if (isLoading) {
-    return <h2>Loading {name}</h2>;
-  }
-
+export default function SummaryCard({ asic_summary, isFetching }) {
   return (
     <Box
       sx={{ flexGrow: 1 }}